@@ -0,0 +1,30 @@
+"""Index image columns for blob reference counting
+
+Revision ID: 3b9d2f61c4a7
+Revises: 772f237d5ed7
+Create Date: 2026-10-18 09:12:40.518233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9d2f61c4a7'
+down_revision: Union[str, None] = '772f237d5ed7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_diagnosa_image'), 'diagnosa', ['image'], unique=False)
+    op.create_index(op.f('ix_users_image'), 'users', ['image'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_image'), table_name='users')
+    op.drop_index(op.f('ix_diagnosa_image'), table_name='diagnosa')
@@ -0,0 +1,38 @@
+"""Index diagnosa history for keyset pagination
+
+Revision ID: 5e1a7c93d2b8
+Revises: 3b9d2f61c4a7
+Create Date: 2026-10-18 11:20:07.391452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1a7c93d2b8'
+down_revision: Union[str, None] = '3b9d2f61c4a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Baris lama tanpa create_date diisi dari tanggal diagnosa agar ikut terurut di histori
+    op.execute(
+        "UPDATE diagnosa SET create_date = COALESCE(CAST(tanggal AS TIMESTAMP), CURRENT_TIMESTAMP) "
+        "WHERE create_date IS NULL"
+    )
+    op.create_index(
+        'ix_diagnosa_user_history',
+        'diagnosa',
+        ['id_user', sa.text('create_date DESC'), sa.text('id_diagnosa DESC')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_diagnosa_user_history', table_name='diagnosa')
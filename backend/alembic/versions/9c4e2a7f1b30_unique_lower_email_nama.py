@@ -0,0 +1,39 @@
+"""Unique case-insensitive indexes on users email and nama
+
+Revision ID: 9c4e2a7f1b30
+Revises: 5e1a7c93d2b8
+Create Date: 2026-10-18 11:41:52.804317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e2a7f1b30'
+down_revision: Union[str, None] = '5e1a7c93d2b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Duplikat yang hanya beda huruf besar/kecil harus dibereskan manual sebelum index dibuat
+    conn = op.get_bind()
+    for column in ('email', 'nama'):
+        duplicates = conn.execute(sa.text(
+            f"SELECT lower({column}) FROM users GROUP BY lower({column}) HAVING count(*) > 1"
+        )).scalars().all()
+        if duplicates:
+            raise RuntimeError(f"Kolom users.{column} memiliki duplikat (case-insensitive): {duplicates}")
+
+    op.create_index('ux_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+    op.create_index('ux_users_nama_lower', 'users', [sa.text('lower(nama)')], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_users_nama_lower', table_name='users')
+    op.drop_index('ux_users_email_lower', table_name='users')
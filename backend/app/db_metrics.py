@@ -0,0 +1,208 @@
+# app/db_metrics.py
+import contextvars
+import heapq
+import logging
+import time
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import SQL_SLOW_QUERY_MS, SQL_REPEAT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Statistik query milik request yang sedang berjalan (None di luar request HTTP)
+_current_request = contextvars.ContextVar("sql_request_stats", default=None)
+
+# Panjang maksimum teks statement yang disimpan/ditampilkan
+STATEMENT_PREVIEW_CHARS = 300
+
+
+def _preview(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > STATEMENT_PREVIEW_CHARS:
+        return statement[:STATEMENT_PREVIEW_CHARS] + "..."
+    return statement
+
+
+class RequestQueryStats:
+    """Jumlah query, total waktu DB dan statement per request."""
+
+    __slots__ = ("count", "total_seconds", "statements", "slowest")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        # Teks statement sudah berparameter (?, $1, %(x)s), jadi query yang sama
+        # dengan parameter berbeda (pola N+1) terhitung sebagai statement yang sama
+        self.statements = Counter()
+        self.slowest = (0.0, None)
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.statements[statement] += 1
+        if seconds > self.slowest[0]:
+            self.slowest = (seconds, statement)
+
+    def repeated(self, threshold: int) -> dict:
+        return {statement: n for statement, n in self.statements.items() if n >= threshold}
+
+
+class SQLMetrics:
+    """
+    Instrumentasi query SQLAlchemy per request: jumlah query, total waktu DB, statement
+    paling lambat dan statement identik yang berulang dalam satu request (indikasi N+1
+    atau round-trip yang terbuang). Agregat disimpan per route.
+    """
+
+    def __init__(self, slow_query_ms: float, repeat_threshold: int, slowest_kept: int = 20):
+        self.slow_query_seconds = slow_query_ms / 1000.0
+        self.repeat_threshold = max(2, repeat_threshold)
+        self.slowest_kept = slowest_kept
+        self.routes = {}
+        self._slowest = []  # min-heap (detik, urutan, statement, route)
+        self._sequence = 0
+        self.slow_queries = 0
+
+    def install(self, engine):
+        """Memasang event listener pada engine (AsyncEngine memakai sync_engine-nya)."""
+        target = getattr(engine, "sync_engine", engine)
+        event.listen(target, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(target, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(target, "handle_error", self._handle_error)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._record(statement, time.perf_counter() - conn.info["query_start_time"].pop())
+
+    def _handle_error(self, exception_context):
+        # Statement yang gagal (mis. pelanggaran index unik) tidak memicu after_cursor_execute
+        conn = exception_context.connection
+        starts = conn.info.get("query_start_time") if conn is not None else None
+        if starts and exception_context.statement is not None:
+            self._record(exception_context.statement, time.perf_counter() - starts.pop())
+
+    def _record(self, statement: str, elapsed: float):
+        stats = _current_request.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+        if elapsed >= self.slow_query_seconds:
+            self.slow_queries += 1
+            logger.warning(f"Query lambat ({elapsed * 1000:.1f} ms): {_preview(statement)}")
+
+    def begin_request(self):
+        stats = RequestQueryStats()
+        return stats, _current_request.set(stats)
+
+    def end_request(self, route: str, stats: RequestQueryStats, token):
+        _current_request.reset(token)
+        if stats.count == 0 and route is None:
+            return
+        route = route or "<unmatched>"
+
+        aggregate = self.routes.get(route)
+        if aggregate is None:
+            aggregate = self.routes[route] = {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "db_seconds": 0.0,
+                "max_db_seconds": 0.0,
+                "requests_with_repeats": 0,
+                "repeated_statements": Counter(),
+            }
+        aggregate["requests"] += 1
+        aggregate["queries"] += stats.count
+        aggregate["max_queries"] = max(aggregate["max_queries"], stats.count)
+        aggregate["db_seconds"] += stats.total_seconds
+        aggregate["max_db_seconds"] = max(aggregate["max_db_seconds"], stats.total_seconds)
+
+        repeated = stats.repeated(self.repeat_threshold)
+        if repeated:
+            aggregate["requests_with_repeats"] += 1
+            for statement, n in repeated.items():
+                preview = _preview(statement)
+                aggregate["repeated_statements"][preview] = max(aggregate["repeated_statements"][preview], n)
+                logger.warning(f"{route}: statement identik dijalankan {n}x dalam satu request: {preview}")
+
+        seconds, statement = stats.slowest
+        if statement is not None:
+            self._sequence += 1
+            entry = (seconds, self._sequence, _preview(statement), route)
+            if len(self._slowest) < self.slowest_kept:
+                heapq.heappush(self._slowest, entry)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def stats(self) -> dict:
+        routes = {}
+        for route, aggregate in sorted(self.routes.items()):
+            requests = aggregate["requests"]
+            routes[route] = {
+                "requests": requests,
+                "avg_queries": aggregate["queries"] / requests,
+                "max_queries": aggregate["max_queries"],
+                "avg_db_ms": aggregate["db_seconds"] / requests * 1000.0,
+                "max_db_ms": aggregate["max_db_seconds"] * 1000.0,
+                "requests_with_repeats": aggregate["requests_with_repeats"],
+                "repeated_statements": dict(aggregate["repeated_statements"].most_common(5)),
+            }
+        return {
+            "slow_query_ms": self.slow_query_seconds * 1000.0,
+            "repeat_threshold": self.repeat_threshold,
+            "slow_queries": self.slow_queries,
+            "routes": routes,
+            "slowest_statements": [
+                {"ms": seconds * 1000.0, "route": route, "statement": statement}
+                for seconds, _, statement, route in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+
+sql_metrics = SQLMetrics(SQL_SLOW_QUERY_MS, SQL_REPEAT_THRESHOLD)
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Middleware ASGI yang membuka RequestQueryStats untuk setiap request HTTP dan mencatatnya
+    ke SQLMetrics per route (method + template path). Jumlah query dan waktu DB juga dikirim
+    ke klien lewat header Server-Timing.
+    """
+
+    def __init__(self, app, metrics: SQLMetrics = sql_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = self.metrics.begin_request()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and stats.count:
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={stats.total_seconds * 1000:.1f};desc="{stats.count} queries"'.encode("latin-1"),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.metrics.end_request(_route_name(scope), stats, token)
+
+
+def _route_name(scope) -> Optional[str]:
+    route = scope.get("route")
+    if route is None:
+        return None
+    return f"{scope['method']} {route.path}"
@@ -0,0 +1,70 @@
+# app/db_pool.py
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool koneksi async yang mencatat berapa lama setiap checkout menunggu koneksi tersedia
+    dan berapa kali checkout gagal karena pool penuh (timeout).
+    Saturasi = koneksi terpakai / (pool_size + max_overflow).
+    """
+
+    # Checkout yang menunggu lebih lama dari ini dihitung sebagai "slow"
+    slow_checkout_seconds = 0.05
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.checkout_timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.peak_checked_out = 0
+
+    def recreate(self):
+        # Dipanggil saat engine.dispose(); statistik dibawa ke pool baru
+        new_pool = super().recreate()
+        for name in ("checkouts", "slow_checkouts", "checkout_timeouts", "total_wait_seconds",
+                     "max_wait_seconds", "peak_checked_out"):
+            setattr(new_pool, name, getattr(self, name))
+        return new_pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        self.checkouts += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited >= self.slow_checkout_seconds:
+            self.slow_checkouts += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+    def stats(self) -> dict:
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "peak_checked_out": self.peak_checked_out,
+            "saturation": (checked_out / capacity) if capacity > 0 else 0.0,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": (self.total_wait_seconds / self.checkouts * 1000.0) if self.checkouts else 0.0,
+            "max_wait_ms": self.max_wait_seconds * 1000.0,
+            "slow_checkouts": self.slow_checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+        }
@@ -0,0 +1,96 @@
+# app/executors.py
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_MAX_PENDING, IO_EXECUTOR_WORKERS, IO_EXECUTOR_MAX_PENDING,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor:
+    """
+    ThreadPoolExecutor dengan batas jumlah pekerjaan yang boleh menunggu.
+    Dipakai untuk menjalankan fungsi blocking dari endpoint async tanpa menahan event loop.
+    Jika batas max_pending tercapai, pemanggil menunggu (backpressure) alih-alih menumpuk antrian.
+    Waktu antri (sejak run() dipanggil sampai fungsi mulai jalan di thread) dan waktu eksekusi dicatat.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._pending = 0
+
+        # Statistik
+        self.completed = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    async def run(self, func, *args, **kwargs):
+        """Menjalankan func(*args, **kwargs) di thread pool dan menunggu hasilnya."""
+        submitted = time.perf_counter()
+        started = []
+
+        def call():
+            started.append(time.perf_counter())
+            return func(*args, **kwargs)
+
+        async with self._slots:
+            self._pending += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+            finally:
+                self._pending -= 1
+                if started:
+                    self._record(started[0] - submitted, time.perf_counter() - started[0])
+
+    def _record(self, queue_seconds: float, run_seconds: float):
+        self.completed += 1
+        self.queue_seconds += queue_seconds
+        self.max_queue_seconds = max(self.max_queue_seconds, queue_seconds)
+        self.run_seconds += run_seconds
+        self.max_run_seconds = max(self.max_run_seconds, run_seconds)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "avg_queue_ms": (self.queue_seconds / self.completed * 1000.0) if self.completed else 0.0,
+            "max_queue_ms": self.max_queue_seconds * 1000.0,
+            "avg_run_ms": (self.run_seconds / self.completed * 1000.0) if self.completed else 0.0,
+            "max_run_ms": self.max_run_seconds * 1000.0,
+        }
+
+
+# Tahap CPU-bound: decoding PIL, ekstraksi fitur CNN, SVM
+cpu_executor = BoundedExecutor("cpu", CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_MAX_PENDING)
+
+# I/O file blocking: penulisan upload, commit/hapus blob, hash file dan cache prediksi di disk
+# (database memakai SQLAlchemy async, tidak lewat executor ini)
+io_executor = BoundedExecutor("io", IO_EXECUTOR_WORKERS, IO_EXECUTOR_MAX_PENDING)
+
+# Hashing/verifikasi bcrypt untuk register dan login; dipisah dari cpu_executor agar lonjakan
+# login tidak mengantri di depan prediksi (dan sebaliknya)
+password_executor = BoundedExecutor("bcrypt", PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+
+def shutdown_executors():
+    """Mematikan semua executor saat aplikasi berhenti."""
+    logger.info("Mematikan executor CPU, I/O dan bcrypt...")
+    cpu_executor.shutdown(wait=False)
+    io_executor.shutdown(wait=False)
+    password_executor.shutdown(wait=False)
@@ -0,0 +1,119 @@
+# app/logging_setup.py
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+import orjson
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_MAX, LOG_TIMING_SAMPLE_RATE
+
+# Atribut bawaan LogRecord; sisanya (dari extra=...) ikut ditulis sebagai field JSON
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+LOG_FORMATS = ("json", "text")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Satu baris JSON ringkas per record: ts, level, logger, msg, field extra, dan exc jika ada."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode("utf-8")
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler yang tidak memformat record di thread pemanggil: pesan %-style baru dirangkai
+    oleh formatter di thread listener. Jika antrian penuh, record dibuang dan dihitung
+    (logging tidak boleh menahan event loop).
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT):
+    """
+    Memasang pipeline logging untuk proses ini: semua logger menulis ke antrian (murah, tanpa I/O),
+    dan satu thread QueueListener memformat lalu menulis ke stderr. Aman dipanggil berulang.
+    """
+    global _listener
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"LOG_FORMAT tidak dikenal: {log_format}")
+    shutdown_logging()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    log_queue = queue.Queue(maxsize=max(1, LOG_QUEUE_MAX))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Menghentikan thread listener setelah semua record di antrian ditulis."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def timing_sampled() -> bool:
+    """True untuk sebagian (LOG_TIMING_SAMPLE_RATE) pemanggilan; dipakai untuk log durasi per request."""
+    return LOG_TIMING_SAMPLE_RATE >= 1.0 or (LOG_TIMING_SAMPLE_RATE > 0.0 and random.random() < LOG_TIMING_SAMPLE_RATE)
+
+
+def log_timing(logger: logging.Logger, stage: str, start: float, **fields):
+    """
+    Menulis durasi sebuah tahap (sejak perf_counter() = start) jika pemanggilan ini tersampel.
+    Durasi dan field tambahan dikirim sebagai field terstruktur, bukan dirangkai ke pesan.
+    """
+    if not logger.isEnabledFor(logging.INFO) or not timing_sampled():
+        return
+    duration_ms = (time.perf_counter() - start) * 1000.0
+    logger.info("%s selesai dalam %.2f ms", stage, duration_ms, extra={"stage": stage, "duration_ms": round(duration_ms, 3), **fields})
+
+
+def dropped_records() -> int:
+    """Jumlah record yang dibuang karena antrian logging penuh."""
+    return sum(getattr(handler, "dropped", 0) for handler in logging.getLogger().handlers)
@@ -0,0 +1,125 @@
+# app/machine_learning/backends.py
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureBackend:
+    """
+    Antarmuka engine ekstraksi fitur CNN.
+    extract() menerima batch gambar uint8 (N, 128, 128, 3) bernilai 0-255,
+    melakukan normalisasi /255 sendiri, dan mengembalikan fitur (N, D) untuk SVM.
+    """
+
+    name = "base"
+
+    def extract(self, img_batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Opsional: menyiapkan engine sebelum melayani trafik."""
+
+
+class KerasBackend(FeatureBackend):
+    """
+    Engine default: sub-model Keras hingga layer fitur, dikompilasi sebagai tf.function
+    dengan signature tetap untuk setiap bucket ukuran batch. Input uint8 di-cast dan
+    dinormalisasi di dalam graph, sehingga setiap panggilan langsung mengeksekusi
+    concrete function tanpa mesin data-adapter/callback Model.predict.
+    Batch dipad ke bucket terdekat; batch yang lebih besar dari bucket terbesar dipecah.
+    """
+
+    name = "keras"
+
+    def __init__(self, feature_extractor, batch_buckets=(1, 2, 4, 8, 16)):
+        import tensorflow as tf
+
+        self.feature_extractor = feature_extractor
+        self.batch_buckets = sorted(set(int(b) for b in batch_buckets if int(b) > 0))
+        self.input_shape = tuple(feature_extractor.input_shape[1:])
+
+        @tf.function
+        def forward(images):
+            x = tf.cast(images, tf.float32) / 255.0
+            return feature_extractor(x, training=False)
+
+        # Tracing dilakukan sekarang (saat load), bukan pada request pertama
+        self._functions = {
+            bucket: forward.get_concrete_function(tf.TensorSpec((bucket,) + self.input_shape, tf.uint8))
+            for bucket in self.batch_buckets
+        }
+        self._tf = tf
+
+    def _bucket_for(self, batch_size: int) -> int:
+        for bucket in self.batch_buckets:
+            if bucket >= batch_size:
+                return bucket
+        return self.batch_buckets[-1]
+
+    def _run_bucket(self, chunk: np.ndarray) -> np.ndarray:
+        bucket = self._bucket_for(len(chunk))
+        if len(chunk) < bucket:
+            padded = np.zeros((bucket,) + self.input_shape, dtype=np.uint8)
+            padded[:len(chunk)] = chunk
+            chunk_input = padded
+        else:
+            chunk_input = chunk
+        outputs = self._functions[bucket](self._tf.constant(chunk_input))
+        return outputs.numpy()[:len(chunk)]
+
+    def extract(self, img_batch: np.ndarray) -> np.ndarray:
+        img_batch = np.ascontiguousarray(img_batch, dtype=np.uint8)
+        max_bucket = self.batch_buckets[-1]
+        if len(img_batch) <= max_bucket:
+            return self._run_bucket(img_batch)
+        return np.concatenate([
+            self._run_bucket(img_batch[start:start + max_bucket])
+            for start in range(0, len(img_batch), max_bucket)
+        ])
+
+    def warm_up(self):
+        for bucket in self.batch_buckets:
+            self._functions[bucket](self._tf.zeros((bucket,) + self.input_shape, dtype=self._tf.uint8))
+
+
+class TFLiteBackend(FeatureBackend):
+    """
+    Engine TFLite (float atau int8 hasil post-training quantization).
+    Model dikonversi dengan input/output float32; input uint8 dinormalisasi /255 di sini.
+    Interpreter TFLite tidak thread-safe, jadi setiap pemanggilan dikunci.
+    """
+
+    def __init__(self, model_path: str, name: str = "tflite", num_threads: int = None):
+        import tensorflow as tf
+
+        self.name = name
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input_detail = self.interpreter.get_input_details()[0]
+        self._output_detail = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input_detail["shape"][0])
+        self._lock = threading.Lock()
+        logger.info(
+            f"TFLite engine '{name}' dimuat dari {model_path}. "
+            f"Input: {self._input_detail['shape']} {self._input_detail['dtype'].__name__}"
+        )
+
+    def _resize(self, batch_size: int):
+        input_shape = list(self._input_detail["shape"])
+        input_shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self._input_detail["index"], input_shape)
+        self.interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def extract(self, img_batch: np.ndarray) -> np.ndarray:
+        img_batch = np.multiply(img_batch, 1.0 / 255.0, dtype=self._input_detail["dtype"])
+        with self._lock:
+            if len(img_batch) != self._batch_size:
+                self._resize(len(img_batch))
+            self.interpreter.set_tensor(self._input_detail["index"], img_batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output_detail["index"]).copy()
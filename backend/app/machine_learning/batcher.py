@@ -0,0 +1,182 @@
+# app/machine_learning/batcher.py
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from app.executors import cpu_executor
+from config import INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBatcher:
+    """
+    Scheduler inferensi dengan micro-batching.
+    Permintaan prediksi yang datang bersamaan dikumpulkan di antrian, lalu dikirim
+    sekaligus sebagai satu batch ke CNN + SVM saat jumlahnya mencapai max_batch_size
+    atau saat jendela tunggu max_wait_ms habis. Setiap pemanggil menerima hasilnya sendiri.
+    """
+
+    def __init__(self, classify_fn, max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+                 max_wait_ms: float = INFERENCE_MAX_WAIT_MS, max_concurrent_batches: int = 1,
+                 executor=cpu_executor):
+        # classify_fn menerima array (N, H, W, C) dan mengembalikan list hasil sepanjang N.
+        # Elemen hasil berupa Exception dianggap gagal hanya untuk item tersebut.
+        self.classify_fn = classify_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+        # Batch dijalankan di executor CPU agar event loop tetap bebas
+        self.executor = executor
+
+        self._queue = None
+        self._slots = None
+        self._worker = None
+        self._in_flight = 0
+        # Buffer batch (max_batch_size, H, W, C) yang dipakai ulang antar batch, paling banyak
+        # max_concurrent_batches buah, supaya setiap batch tidak mengalokasikan np.stack baru.
+        self._free_buffers = []
+
+        # Statistik
+        self.batches_total = 0
+        self.items_total = 0
+        self.last_batch_size = 0
+        self.largest_batch_size = 0
+        self.last_batch_seconds = 0.0
+
+    def start(self):
+        """Menjalankan worker pengumpul batch pada event loop yang sedang berjalan."""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"Inference scheduler dimulai (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait_ms}, max_concurrent_batches={self.max_concurrent_batches})"
+        )
+
+    async def stop(self):
+        """Menghentikan worker dan menggagalkan permintaan yang masih mengantri."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference scheduler dihentikan."))
+
+    async def submit(self, img_array: np.ndarray):
+        """Memasukkan satu gambar (H, W, C) ke antrian dan menunggu hasil prediksinya."""
+        if self._worker is None or self._worker.done():
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((img_array, future))
+        return await future
+
+    async def submit_many(self, img_arrays) -> list:
+        """
+        Memasukkan banyak gambar sekaligus ke antrian, sehingga worker langsung mengambilnya
+        sebagai batch penuh. Mengembalikan hasil per gambar sesuai urutan; gambar yang gagal
+        berisi Exception (tidak menggagalkan gambar lain).
+        """
+        if self._worker is None or self._worker.done():
+            self.start()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for img_array in img_arrays:
+            future = loop.create_future()
+            self._queue.put_nowait((img_array, future))
+            futures.append(future)
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        max_wait = self.max_wait_ms / 1000.0
+        while True:
+            # Tunggu slot kosong dulu, supaya selama batch sebelumnya masih berjalan
+            # antrian terus terisi dan batch berikutnya bisa langsung penuh.
+            await self._slots.acquire()
+            try:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + max_wait
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                raise
+            self._in_flight += 1
+            asyncio.create_task(self._flush(batch))
+
+    def _acquire_buffer(self, item: np.ndarray) -> np.ndarray:
+        shape = (self.max_batch_size,) + item.shape
+        while self._free_buffers:
+            buffer = self._free_buffers.pop()
+            if buffer.shape == shape and buffer.dtype == item.dtype:
+                return buffer
+        return np.empty(shape, dtype=item.dtype)
+
+    async def _flush(self, batch):
+        start_time = time.perf_counter()
+        buffer = None
+        try:
+            buffer = self._acquire_buffer(batch[0][0])
+            for i, (img_array, _) in enumerate(batch):
+                buffer[i] = img_array
+            inputs = buffer[:len(batch)]
+            results = await self.executor.run(self.classify_fn, inputs)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(f"Batch inferensi ({len(batch)} gambar) gagal: {str(e)}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            if buffer is not None:
+                self._free_buffers.append(buffer)
+            self._in_flight -= 1
+            self._slots.release()
+            self.batches_total += 1
+            self.items_total += len(batch)
+            self.last_batch_size = len(batch)
+            self.largest_batch_size = max(self.largest_batch_size, len(batch))
+            self.last_batch_seconds = time.perf_counter() - start_time
+
+    def stats(self) -> dict:
+        """Statistik antrian dan ukuran batch yang tercapai."""
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_batches": self._in_flight,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "avg_batch_size": (self.items_total / self.batches_total) if self.batches_total else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "largest_batch_size": self.largest_batch_size,
+            "last_batch_seconds": self.last_batch_seconds,
+        }
@@ -0,0 +1,135 @@
+# app/machine_learning/convert.py
+"""
+Konversi feature extractor Keras ke engine TFLite dan validasi hasilnya.
+
+Pemakaian (dari folder backend):
+    python -m app.machine_learning.convert                  # konversi float + int8, lalu validasi
+    python -m app.machine_learning.convert --validate-only  # hanya validasi file .tflite yang ada
+    python -m app.machine_learning.convert --samples uploads --min-agreement 0.98
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+
+import numpy as np
+
+from app.machine_learning import model_loader, predictor
+from app.machine_learning.backends import KerasBackend, TFLiteBackend
+from config import KERAS_BATCH_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+def load_sample_set(samples_dir: str, limit: int) -> np.ndarray:
+    """Membaca gambar contoh dari folder dan mengembalikan batch uint8 hasil preprocess_image."""
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(samples_dir, "**", pattern), recursive=True))
+    paths = sorted(paths)[:limit]
+    if not paths:
+        raise FileNotFoundError(f"Tidak ada gambar contoh di: {samples_dir}")
+
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(predictor.preprocess_image(f.read())[0])
+    logger.info(f"{len(images)} gambar contoh dimuat dari {samples_dir}")
+    return np.stack(images)
+
+
+def convert(feature_extractor, samples: np.ndarray, skip_int8: bool = False):
+    """Menulis feature_extractor.tflite (float) dan feature_extractor_int8.tflite (int8 PTQ)."""
+    import tensorflow as tf
+
+    logger.info("Konversi ke TFLite float...")
+    converter = tf.lite.TFLiteConverter.from_keras_model(feature_extractor)
+    with open(model_loader.TFLITE_MODEL_PATHS["tflite"], "wb") as f:
+        f.write(converter.convert())
+    logger.info(f"Disimpan: {model_loader.TFLITE_MODEL_PATHS['tflite']}")
+
+    if skip_int8:
+        return
+
+    def representative_dataset():
+        for img in samples:
+            yield [(img[np.newaxis, ...] / 255.0).astype(np.float32)]
+
+    logger.info("Konversi ke TFLite int8 (post-training quantization)...")
+    converter = tf.lite.TFLiteConverter.from_keras_model(feature_extractor)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Input/output tetap float32 agar antarmukanya sama dengan engine Keras
+    with open(model_loader.TFLITE_MODEL_PATHS["tflite_int8"], "wb") as f:
+        f.write(converter.convert())
+    logger.info(f"Disimpan: {model_loader.TFLITE_MODEL_PATHS['tflite_int8']}")
+
+
+def validate(reference, candidates, svm_model, samples: np.ndarray, min_agreement: float) -> bool:
+    """
+    Membandingkan fitur dan label SVM tiap engine dengan engine referensi (Keras).
+    Mengembalikan False jika ada engine dengan kecocokan label di bawah min_agreement.
+    """
+    ref_features = reference.extract(samples).reshape(len(samples), -1)
+    ref_labels = svm_model.predict(ref_features)
+    ref_proba = svm_model.predict_proba(ref_features)
+
+    ok = True
+    for backend in candidates:
+        features = backend.extract(samples).reshape(len(samples), -1)
+        labels = svm_model.predict(features)
+        proba = svm_model.predict_proba(features)
+
+        cosine = np.sum(features * ref_features, axis=1) / (
+            np.linalg.norm(features, axis=1) * np.linalg.norm(ref_features, axis=1) + 1e-12
+        )
+        agreement = float(np.mean(labels == ref_labels))
+        print(
+            f"[{backend.name}] label agreement: {agreement * 100:.2f}% | "
+            f"max |fitur - keras|: {np.max(np.abs(features - ref_features)):.5f} | "
+            f"cosine min/mean: {cosine.min():.5f}/{cosine.mean():.5f} | "
+            f"max |proba - keras|: {np.max(np.abs(proba - ref_proba)):.5f}"
+        )
+        if agreement < min_agreement:
+            print(f"[{backend.name}] GAGAL: agreement di bawah {min_agreement * 100:.2f}%")
+            ok = False
+    return ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Konversi & validasi engine TFLite untuk feature extractor CNN.")
+    parser.add_argument("--samples", default="uploads", help="Folder gambar contoh untuk kalibrasi int8 dan validasi.")
+    parser.add_argument("--limit", type=int, default=200, help="Jumlah maksimal gambar contoh.")
+    parser.add_argument("--skip-int8", action="store_true", help="Hanya buat engine TFLite float.")
+    parser.add_argument("--validate-only", action="store_true", help="Lewati konversi, hanya validasi file yang ada.")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="Batas minimal kecocokan label dengan Keras.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    samples = load_sample_set(args.samples, args.limit)
+    _, feature_extractor = model_loader.load_keras_feature_extractor()
+    reference = KerasBackend(feature_extractor, KERAS_BATCH_BUCKETS)
+    svm_model = model_loader.load_svm_model()
+
+    if not args.validate_only:
+        convert(feature_extractor, samples, skip_int8=args.skip_int8)
+
+    candidates = [
+        TFLiteBackend(path, name=name)
+        for name, path in model_loader.TFLITE_MODEL_PATHS.items()
+        if os.path.exists(path)
+    ]
+    if not candidates:
+        print("Tidak ada model TFLite untuk divalidasi.")
+        return 1
+
+    return 0 if validate(reference, candidates, svm_model, samples, args.min_agreement) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,119 @@
 # app/machine_learning/model_loader.py (Tambahkan debugging GPU)
 import os
+import hashlib
 import logging
-from tensorflow.keras.models import load_model, Model
-import joblib
-import tensorflow as tf # PENTING: Pastikan ini diimpor jika menggunakan tf.config
+import time
+# TensorFlow, Keras dan joblib diimpor di dalam fungsi pemuatan supaya import modul ini
+# (dan router yang memakainya) tetap ringan; TF baru dimuat saat load_models() berjalan.
+from app.machine_learning.backends import KerasBackend, TFLiteBackend
+from app.machine_learning.svm_head import build_svm_head
+from config import MODEL_VERSION, INFERENCE_BACKEND, TFLITE_NUM_THREADS, KERAS_BATCH_BUCKETS
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 cnn_model = None
 feature_extractor = None
+feature_backend = None
 svm_model = None
+svm_head = None
+model_version = None
+
+# Status pemuatan model untuk endpoint readiness
+LOAD_STATES = ("pending", "loading", "loaded", "warming_up", "ready", "failed")
+
+load_state = {
+    "state": "pending",
+    "progress": 0.0,
+    "detail": None,
+    "error": None,
+    "updated_at": None,
+}
+
+
+def set_load_state(state: str, progress: float, detail: str = None, error: str = None):
+    """Memperbarui status pemuatan model (pending, loading, warming_up, ready, failed)."""
+    load_state.update(state=state, progress=progress, detail=detail, error=error, updated_at=time.time())
+    logger.info(f"Status model: {state} ({progress * 100:.0f}%){f' - {detail}' if detail else ''}")
+
+
+def is_ready() -> bool:
+    return load_state["state"] == "ready"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CNN_MODEL_PATH = os.path.join(BASE_DIR, "BestModel.h5")
+SVM_MODEL_PATH = os.path.join(BASE_DIR, "svm_model.pkl")
+
+# File model TFLite hasil `python -m app.machine_learning.convert`
+TFLITE_MODEL_PATHS = {
+    "tflite": os.path.join(BASE_DIR, "feature_extractor.tflite"),
+    "tflite_int8": os.path.join(BASE_DIR, "feature_extractor_int8.tflite"),
+}
+
+
+def build_feature_extractor(model):
+    """Membuat sub-model dari input CNN hingga layer fitur (dense terakhir sebelum output)."""
+    from tensorflow.keras.models import Model
+
+    feature_layer_name = None
+    for layer in reversed(model.layers):
+        if 'dense' in layer.name.lower() and layer != model.layers[-1]:
+            feature_layer_name = layer.name
+            break
+
+    if feature_layer_name is None:
+        if len(model.layers) >= 2:
+            feature_layer_name = model.layers[-2].name
+        else:
+            raise ValueError("Tidak dapat menemukan layer ekstraksi fitur yang cocok.")
+
+    logger.info(f"Menggunakan layer fitur: {feature_layer_name}")
+
+    return Model(
+        inputs=model.inputs,
+        outputs=model.get_layer(feature_layer_name).output
+    )
+
+
+def load_keras_feature_extractor():
+    """Memuat CNN Keras dari BestModel.h5 dan mengembalikan (cnn_model, feature_extractor)."""
+    if not os.path.exists(CNN_MODEL_PATH):
+        logger.error(f"CNN model tidak ditemukan di: {CNN_MODEL_PATH}")
+        raise FileNotFoundError(f"CNN model tidak ditemukan di: {CNN_MODEL_PATH}")
+
+    from tensorflow.keras.models import load_model
+
+    logger.info("Loading CNN model...")
+    model = load_model(CNN_MODEL_PATH, compile=False)
+    logger.info(f"CNN model loaded. Input shape: {model.input_shape}")
+    return model, build_feature_extractor(model)
+
+
+def load_svm_model():
+    """Memuat model SVM dari svm_model.pkl."""
+    if not os.path.exists(SVM_MODEL_PATH):
+        logger.error(f"SVM model tidak ditemukan di: {SVM_MODEL_PATH}")
+        raise FileNotFoundError(f"SVM model tidak ditemukan di: {SVM_MODEL_PATH}")
+
+    import joblib
+
+    logger.info("Loading SVM model...")
+    model = joblib.load(SVM_MODEL_PATH)
+    logger.info(f"SVM model loaded. Classes: {model.classes_}")
+    return model
+
+
+def load_models(backend: str = INFERENCE_BACKEND):
+    """
+    Memuat engine ekstraksi fitur CNN dan model SVM dari file.
+    Engine dipilih lewat INFERENCE_BACKEND: "keras" memuat BestModel.h5 penuh,
+    "tflite"/"tflite_int8" hanya memuat file .tflite hasil konversi (tanpa Keras).
+    """
+    global cnn_model, feature_extractor, feature_backend, svm_model, svm_head
 
-def load_models():
-    """Memuat model CNN dan SVM dari file."""
-    global cnn_model, feature_extractor, svm_model
-    
     try:
+        set_load_state("loading", 0.05, "Mengimpor TensorFlow")
+        import tensorflow as tf
+
         # Debugging GPU
         gpus = tf.config.list_physical_devices('GPU')
         if gpus:
@@ -28,55 +124,69 @@ def load_models():
         else:
             logger.info("Tidak ada GPU terdeteksi, TensorFlow akan menggunakan CPU.")
 
-        # Path ke model
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        cnn_model_path = os.path.join(base_dir, "BestModel.h5")
-        svm_model_path = os.path.join(base_dir, "svm_model.pkl")
-        
-        if not os.path.exists(cnn_model_path):
-            logger.error(f"CNN model tidak ditemukan di: {cnn_model_path}")
-            raise FileNotFoundError(f"CNN model tidak ditemukan di: {cnn_model_path}")
-        if not os.path.exists(svm_model_path):
-            logger.error(f"SVM model tidak ditemukan di: {svm_model_path}")
-            raise FileNotFoundError(f"SVM model tidak ditemukan di: {svm_model_path}")
-        
-        # Load CNN model
-        logger.info("Loading CNN model...")
-        cnn_model = load_model(cnn_model_path, compile=False)
-        logger.info(f"CNN model loaded. Input shape: {cnn_model.input_shape}")
-        
-        feature_layer_name = None
-        for layer in reversed(cnn_model.layers):
-            if 'dense' in layer.name.lower() and layer != cnn_model.layers[-1]:
-                feature_layer_name = layer.name
-                break
-        
-        if feature_layer_name is None:
-            if len(cnn_model.layers) >= 2:
-                feature_layer_name = cnn_model.layers[-2].name
-            else:
-                raise ValueError("Tidak dapat menemukan layer ekstraksi fitur yang cocok.")
-            
-        logger.info(f"Menggunakan layer fitur: {feature_layer_name}")
-        
-        feature_extractor = Model(
-            inputs=cnn_model.inputs,
-            outputs=cnn_model.get_layer(feature_layer_name).output
-        )
-        
-        # Load SVM model
-        logger.info("Loading SVM model...")
-        svm_model = joblib.load(svm_model_path)
-        logger.info(f"SVM model loaded. Classes: {svm_model.classes_}")
-        
+        logger.info(f"Menggunakan inference backend: {backend}")
+        set_load_state("loading", 0.3, f"Memuat feature extractor ({backend})")
+        if backend == "keras":
+            cnn_model, feature_extractor = load_keras_feature_extractor()
+            set_load_state("loading", 0.5, f"Mengompilasi jalur inferensi untuk batch {KERAS_BATCH_BUCKETS}")
+            feature_backend = KerasBackend(feature_extractor, KERAS_BATCH_BUCKETS)
+        elif backend in TFLITE_MODEL_PATHS:
+            tflite_path = TFLITE_MODEL_PATHS[backend]
+            if not os.path.exists(tflite_path):
+                logger.error(f"Model TFLite tidak ditemukan di: {tflite_path}")
+                raise FileNotFoundError(
+                    f"Model TFLite tidak ditemukan di: {tflite_path}. "
+                    "Jalankan `python -m app.machine_learning.convert` terlebih dahulu."
+                )
+            feature_backend = TFLiteBackend(tflite_path, name=backend, num_threads=TFLITE_NUM_THREADS)
+        else:
+            raise ValueError(f"INFERENCE_BACKEND tidak dikenal: {backend}")
+
+        feature_backend.warm_up()
+
+        set_load_state("loading", 0.7, "Memuat model SVM")
+        svm_model = load_svm_model()
+        # Head NumPy satu-pass (keputusan + probabilitas), divalidasi terhadap svm_model
+        svm_head = build_svm_head(svm_model)
+        logger.info(f"SVM head: {svm_head.name}")
+
+        set_load_state("loaded", 0.8, "Semua model dimuat")
         logger.info("Semua model berhasil dimuat!")
-        
+
     except Exception as e:
         logger.error(f"Error memuat model: {str(e)}", exc_info=True)
+        set_load_state("failed", load_state["progress"], "Gagal memuat model", error=str(e))
         raise
 
 def get_models():
-    """Mengembalikan model yang sudah dimuat. Memastikan model sudah dimuat terlebih dahulu."""
-    if cnn_model is None or feature_extractor is None or svm_model is None:
+    """
+    Mengembalikan (feature_backend, svm_head) yang sudah dimuat.
+    Memastikan model sudah dimuat terlebih dahulu.
+    """
+    if feature_backend is None or svm_head is None:
         raise RuntimeError("Model belum dimuat. Panggil load_models() terlebih dahulu.")
-    return cnn_model, feature_extractor, svm_model
\ No newline at end of file
+    return feature_backend, svm_head
+
+def get_model_version() -> str:
+    """
+    Mengembalikan versi model untuk kunci cache prediksi.
+    Memakai MODEL_VERSION dari konfigurasi jika diisi, jika tidak dihitung dari hash isi file model
+    yang dipakai engine aktif. Tidak memerlukan model dimuat, sehingga juga berlaku dalam mode multi-proses.
+    """
+    global model_version
+    if model_version is None:
+        if MODEL_VERSION:
+            model_version = MODEL_VERSION
+        else:
+            cnn_path = TFLITE_MODEL_PATHS.get(INFERENCE_BACKEND, CNN_MODEL_PATH)
+            digest = hashlib.sha256(INFERENCE_BACKEND.encode())
+            for path in (cnn_path, SVM_MODEL_PATH):
+                if not os.path.exists(path):
+                    continue
+                digest.update(os.path.basename(path).encode())
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            model_version = digest.hexdigest()[:16]
+        logger.info(f"Versi model: {model_version}")
+    return model_version
@@ -0,0 +1,215 @@
+# app/machine_learning/prediction_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.executors import io_executor
+
+logger = logging.getLogger(__name__)
+
+
+class _LeaderCancelled(Exception):
+    """Pemanggil yang menjalankan compute() dibatalkan; pemanggil yang menunggu mengulang get_or_compute."""
+
+
+class PredictionCache:
+    """
+    Cache hasil prediksi yang dikunci dengan hash isi gambar + versi model.
+    Terdiri dari tier memori (LRU dengan batas jumlah entri dan TTL) dan tier disk opsional.
+    Permintaan identik yang sedang diproses bersamaan digabung (single-flight),
+    sehingga hanya satu inferensi yang dijalankan.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, disk_dir: Optional[str] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir or None
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._in_flight = {}  # key -> asyncio.Future
+
+        # Statistik
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_writes = 0
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash: str, model_version: str) -> str:
+        return f"{model_version}:{content_hash}"
+
+    async def get_or_compute(self, key: str, compute):
+        """
+        Mengembalikan hasil dari cache, atau menjalankan coroutine compute() sekali
+        untuk semua pemanggil dengan kunci yang sama lalu menyimpan hasilnya.
+        Jika pemanggil yang menjalankan compute() dibatalkan, pemanggil lain yang menunggu
+        tidak ikut batal: salah satunya mengambil alih perhitungan.
+        """
+        while True:
+            result = self._get_memory(key)
+            if result is not None:
+                self.hits += 1
+                return dict(result)
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                return await self._compute(key, compute)
+            self.coalesced += 1
+            try:
+                return dict(await asyncio.shield(in_flight))
+            except _LeaderCancelled:
+                continue
+
+    async def _compute(self, key: str, compute) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._get_disk(key) if self.disk_dir else None
+            if result is not None:
+                self.disk_hits += 1
+                self._put_memory(key, result)
+            else:
+                self.misses += 1
+                result = await compute()
+                self._put_memory(key, result)
+                if self.disk_dir:
+                    await self._put_disk(key, result)
+            future.set_result(result)
+            return dict(result)
+        except asyncio.CancelledError:
+            # Pembatalan hanya milik pemanggil ini; yang menunggu diberi error yang bisa diulang
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # tandai sudah dibaca jika tidak ada pemanggil lain yang menunggu
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Hasil tersimpan (memori lalu disk) tanpa menghitung ulang; None jika belum ada."""
+        result = self._get_memory(key)
+        if result is not None:
+            self.hits += 1
+            return dict(result)
+        if self.disk_dir:
+            result = await self._get_disk(key)
+            if result is not None:
+                self.disk_hits += 1
+                self._put_memory(key, result)
+                return dict(result)
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, result: dict):
+        """Menyimpan hasil yang dihitung di luar get_or_compute (mis. prediksi batch)."""
+        self._put_memory(key, result)
+        if self.disk_dir:
+            await self._put_disk(key, result)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _get_memory(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _put_memory(self, key: str, result: dict):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        model_version, content_hash = key.split(":", 1)
+        return os.path.join(self.disk_dir, model_version, content_hash[:2], f"{content_hash}.json")
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                self.expirations += 1
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entri cache disk {path} tidak bisa dibaca: {e}")
+            return None
+
+    def _write_disk(self, key: str, result: dict):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        self.disk_writes += 1
+
+    async def _get_disk(self, key: str) -> Optional[dict]:
+        return await io_executor.run(self._read_disk, key)
+
+    async def _put_disk(self, key: str, result: dict):
+        try:
+            await io_executor.run(self._write_disk, key, result)
+        except OSError as e:
+            logger.warning(f"Gagal menulis entri cache disk: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_dir": self.disk_dir,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_writes": self.disk_writes,
+            "hit_ratio": ((self.hits + self.disk_hits + self.coalesced) / lookups) if lookups else 0.0,
+        }
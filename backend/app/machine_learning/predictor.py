@@ -1,122 +1,287 @@
 import numpy as np
+import asyncio
 import io
 from PIL import Image
+from typing import List
 import logging
-import tensorflow as tf
 import time 
 
-from app.machine_learning import model_loader
+from app.executors import cpu_executor, io_executor
+from app.logging_setup import log_timing
+from app.machine_learning import model_loader, worker_pool
+from app import metrics
+from app.machine_learning.batcher import InferenceBatcher
+from app.machine_learning.prediction_cache import PredictionCache
 from app.machine_learning.label_info import disease_info, category_mapping
+from config import (
+    INFERENCE_WORKERS,
+    PREDICTION_CACHE_ENABLED,
+    PREDICTION_CACHE_MAX_ENTRIES,
+    PREDICTION_CACHE_TTL_SECONDS,
+    PREDICTION_CACHE_DIR,
+    PREPROCESS_ENGINE,
+    MAX_IMAGE_PIXELS,
+)
 
 logger = logging.getLogger(__name__)
 
 label_mapping = ['keriting', 'kuning', 'sehat'] 
 
 
-def preprocess_image(img_content: bytes, target_size=(128, 128)):
+PREPROCESS_ENGINES = ("fast", "legacy")
+
+
+def _decode_legacy(img, target_size):
+    """Decode penuh pada resolusi asli (perilaku awal); resize dilakukan terpisah."""
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    img.load()
+    return img
+
+
+def _decode_fast(img, target_size):
     """
-    Memproses konten gambar (bytes) menjadi array NumPy yang siap untuk model ML.
-    Melakukan konversi ke RGB, resize, dan normalisasi.
+    Decode JPEG langsung pada skala terkecil (1/2, 1/4, 1/8) yang masih >= target_size
+    lewat mode draft decoder, sehingga foto 12MP tidak pernah didecode penuh.
+    Format lain diperkecil dengan reduce() bertahap saat resize (RESIZE_OPTIONS).
     """
-    start_time_preprocess = time.time() # <<< MULAI WAKTU UNTUK PREPROCESSING
+    img.draft('RGB', target_size)
+    return _decode_legacy(img, target_size)
+
+
+# Argumen resize() per engine setelah decode
+RESIZE_OPTIONS = {"fast": {"reducing_gap": 2.0}, "legacy": {}}
+
+
+def preprocess_image(img_content, target_size=(128, 128), engine: str = None, out: np.ndarray = None):
+    """
+    Memproses konten gambar (bytes, atau path file yang dibaca bertahap oleh decoder) menjadi array NumPy uint8 (1, 128, 128, 3) yang siap untuk model ML.
+    Melakukan konversi ke RGB dan resize; normalisasi /255 dilakukan di dalam engine inferensi.
+    engine memilih decoder ("fast" atau "legacy", default PREPROCESS_ENGINE).
+    Jika out diberikan (mis. satu slot buffer batch), piksel ditulis langsung ke sana dan out dikembalikan.
+    Dimensi gambar diperiksa dari header sebelum decode untuk menolak decompression bomb.
+    """
+    start_time_preprocess = time.perf_counter() # <<< MULAI WAKTU UNTUK PREPROCESSING
+    engine = engine or PREPROCESS_ENGINE
     try:
-        logger.info(f"preprocess_image dipanggil. Ukuran konten: {len(img_content)} bytes.")
-        
-        img_open_start = time.time()
-        img = Image.open(io.BytesIO(img_content))
-        logger.info(f"Gambar dibuka (PIL.Image.open) dalam: {time.time() - img_open_start:.4f} detik. Mode awal: {img.mode}, Ukuran: {img.size}")
-        
-        if img.mode != 'RGB':
-            img_convert_start = time.time()
-            logger.info(f"Mengkonversi gambar dari mode {img.mode} ke RGB.")
-            img = img.convert('RGB')
-            logger.info(f"Konversi mode dalam: {time.time() - img_convert_start:.4f} detik. Mode setelah konversi: {img.mode}")
-        
-        img_resize_start = time.time()
-        img = img.resize(target_size)
-        logger.info(f"Resize gambar dalam: {time.time() - img_resize_start:.4f} detik.")
-        
-        img_array_start = time.time()
-        img_array = np.array(img) / 255.0
-        logger.info(f"Konversi ke array dan normalisasi dalam: {time.time() - img_array_start:.4f} detik.")
-        
-        img_expand_start = time.time()
-        img_array = np.expand_dims(img_array, axis=0)
-        logger.info(f"Menambah dimensi batch dalam: {time.time() - img_expand_start:.4f} detik.")
-        
-        logger.info(f"Preprocessing total memakan: {time.time() - start_time_preprocess:.4f} detik. Shape akhir: {img_array.shape}, Dtype: {img_array.dtype}") # <<< LOG TOTAL PREPROCESSING
-        return img_array
-        
+        if engine not in PREPROCESS_ENGINES:
+            raise ValueError(f"Engine preprocessing tidak dikenal: {engine}")
+
+        source = io.BytesIO(img_content) if isinstance(img_content, (bytes, bytearray)) else img_content
+        with Image.open(source) as original:
+            width, height = original.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise ValueError(f"Dimensi gambar terlalu besar ({width}x{height}). Maksimal {MAX_IMAGE_PIXELS} piksel.")
+
+            if engine == "fast":
+                img = _decode_fast(original, target_size)
+            else:
+                img = _decode_legacy(original, target_size)
+            metrics.DECODE.observe_since(start_time_preprocess)
+
+            resize_start = time.perf_counter()
+            img = img.resize(target_size, **RESIZE_OPTIONS[engine])
+
+        if out is None:
+            out = np.empty((1, target_size[1], target_size[0], 3), dtype=np.uint8)
+        out[...] = np.asarray(img, dtype=np.uint8)
+        metrics.RESIZE.observe_since(resize_start)
+
+        log_timing(logger, "preprocess", start_time_preprocess, engine=engine, width=width, height=height)
+        return out
+
     except Exception as e:
         logger.error(f"Error dalam preprocessing gambar: {str(e)}", exc_info=True)
         raise ValueError(f"Gagal memproses gambar: {str(e)}")
 
 
-async def predict_image(file_bytes: bytes):
+def _build_result(predicted_class_idx, probabilities) -> dict:
+    """Menyusun dict hasil prediksi dari indeks kelas SVM dan probabilitasnya."""
+    confidence = float(np.max(probabilities)) * 100
+
+    if predicted_class_idx < len(label_mapping):
+        predicted_label = label_mapping[predicted_class_idx]
+    else:
+        raise ValueError(f"Indeks prediksi SVM tidak valid: {predicted_class_idx}. Diluar batas label_mapping.")
+
+    if predicted_label not in disease_info:
+        raise ValueError(f"Label '{predicted_label}' tidak dikenal dalam disease_info.")
+
+    return {
+        "prediksi": predicted_label,
+        "nama_penyakit": disease_info[predicted_label]['nama_penyakit'],
+        "rekomendasi": disease_info[predicted_label]['rekomendasi'],
+        "kategori": category_mapping[predicted_label],
+        "akurasi": confidence
+    }
+
+
+def run_models(img_batch: np.ndarray):
+    """
+    Menjalankan CNN (ekstraksi fitur) dan SVM pada satu batch gambar di proses ini.
+    Mengembalikan (predictions, probabilities) dari SVM.
+    """
+    feature_backend, svm_head = model_loader.get_models()
+
+    # Ekstrak fitur menggunakan CNN (engine Keras atau TFLite sesuai INFERENCE_BACKEND)
+    extract_features_start = time.perf_counter() # <<< MULAI WAKTU UNTUK EKSTRAKSI FITUR CNN
+    features = feature_backend.extract(img_batch)
+    metrics.CNN.observe_since(extract_features_start)
+    log_timing(logger, "cnn", extract_features_start, backend=feature_backend.name, batch_size=len(img_batch))
+
+    if features.ndim > 2:
+        features = features.reshape(features.shape[0], -1)
+
+    # Prediksi menggunakan SVM: label dan probabilitas dalam satu pass
+    svm_predict_start = time.perf_counter() # <<< MULAI WAKTU UNTUK PREDIKSI SVM
+    predictions, probabilities = svm_head.predict_with_proba(features)
+    metrics.SVM.observe_since(svm_predict_start)
+    log_timing(logger, "svm", svm_predict_start, head=svm_head.name, batch_size=len(img_batch))
+
+    return predictions, probabilities
+
+
+def classify_batch(img_batch: np.ndarray) -> list:
     """
-    Melakukan prediksi penyakit daun dari konten gambar (bytes).
+    Mengklasifikasikan satu batch gambar (N, 128, 128, 3) sekaligus.
+    CNN dipanggil sekali untuk seluruh batch, lalu SVM untuk seluruh fitur; dalam mode
+    multi-proses batch dikirim ke salah satu worker inferensi lewat shared memory.
+    Mengembalikan list hasil sepanjang N; item yang gagal berisi Exception.
+    """
+    if worker_pool.is_enabled():
+        predictions, probabilities = worker_pool.get_pool().run_batch(img_batch)
+    else:
+        predictions, probabilities = run_models(img_batch)
+
+    results = []
+    for predicted_class_idx, proba in zip(predictions, probabilities):
+        try:
+            results.append(_build_result(predicted_class_idx, proba))
+        except ValueError as e:
+            results.append(e)
+    return results
+
+
+def warm_up():
+    """Menjalankan satu inferensi dummy agar graph/engine sudah siap sebelum melayani trafik."""
+    start_time = time.time()
+    results = classify_batch(np.zeros((1, 128, 128, 3), dtype=np.uint8))
+    if isinstance(results[0], Exception):
+        raise results[0]
+    logger.info(f"Warm-up inferensi selesai dalam: {time.time() - start_time:.4f} detik.")
+
+
+def ensure_models_ready():
+    """Memastikan model (lokal atau di pool worker) sudah siap dipakai."""
+    if worker_pool.is_enabled():
+        worker_pool.get_pool()
+    else:
+        model_loader.get_models()
+
+
+# Scheduler micro-batching: permintaan bersamaan digabung menjadi satu batch CNN + SVM.
+# Dalam mode multi-proses, setiap worker bisa memproses satu batch secara bersamaan.
+inference_scheduler = InferenceBatcher(classify_batch, max_concurrent_batches=max(1, INFERENCE_WORKERS))
+
+
+# Cache hasil prediksi untuk unggahan ulang gambar yang sama
+prediction_cache = PredictionCache(
+    max_entries=PREDICTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+    disk_dir=PREDICTION_CACHE_DIR,
+    enabled=PREDICTION_CACHE_ENABLED,
+)
+
+
+async def _predict_uncached(image_source, engine: str) -> dict:
+    """Preprocessing di executor CPU lalu klasifikasi lewat inference_scheduler."""
+    img_array = await cpu_executor.run(preprocess_image, image_source, engine=engine)
+    return await inference_scheduler.submit(img_array[0])
+
+
+async def predict_image(image_source, preprocess_engine: str = None, content_hash: str = None):
+    """
+    Melakukan prediksi penyakit daun dari konten gambar (bytes) atau path file gambar.
+    Untuk upload yang sudah di-ingest, kirim path beserta content_hash yang dihitung saat streaming
+    sehingga file tidak perlu dibaca ulang ke memori maupun di-hash dua kali.
     Menggunakan CNN untuk ekstraksi fitur dan SVM untuk klasifikasi akhir.
+    Gambar diklasifikasikan lewat inference_scheduler bersama permintaan lain yang datang bersamaan.
+    Decoding dan inferensi berjalan di executor CPU, sehingga event loop tidak tertahan.
+    Gambar yang sama (hash isi + versi model + engine preprocessing) dilayani dari prediction_cache.
+    preprocess_engine memilih engine preprocessing per permintaan (default PREPROCESS_ENGINE).
     """
-    total_predict_time_start = time.time() # <<< MULAI WAKTU UNTUK FUNGSI PREDICT_IMAGE TOTAL
+    total_predict_time_start = time.perf_counter() # <<< MULAI WAKTU UNTUK FUNGSI PREDICT_IMAGE TOTAL
     try:
-        logger.info(f"predict_image dipanggil. Tipe file_bytes: {type(file_bytes)}, Ukuran: {len(file_bytes)} bytes.")
-        
-        cnn_model, feature_extractor, svm_model = model_loader.get_models()
-        
-        # Preprocess gambar
-        img_array = preprocess_image(file_bytes)
-        
-        # Ekstrak fitur menggunakan CNN
-        extract_features_start = time.time() # <<< MULAI WAKTU UNTUK EKSTRAKSI FITUR CNN
-        logger.info("Mengekstrak fitur dengan CNN...")
-        features = feature_extractor.predict(img_array, verbose=0)
-        logger.info(f"Ekstraksi fitur CNN selesai dalam: {time.time() - extract_features_start:.4f} detik. Shape awal: {features.shape}") # <<< LOG EKSTRAKSI FITUR CNN
-        
-        if features.ndim > 2:
-            features_flatten_start = time.time()
-            features = features.reshape(features.shape[0], -1)
-            logger.info(f"Fitur diratakan untuk SVM dalam: {time.time() - features_flatten_start:.4f} detik. Shape: {features.shape}")
-
-        # Prediksi menggunakan SVM
-        svm_predict_start = time.time() # <<< MULAI WAKTU UNTUK PREDIKSI SVM
-        logger.info("Melakukan prediksi dengan SVM...")
-        prediction = svm_model.predict(features)
-        
-        # Penting: Jika SVM dilatih tanpa probability=True, predict_proba akan gagal.
-        # Atau jika tidak ingin probabilitas, gunakan hanya svm_model.predict(features).
-        probabilities = svm_model.predict_proba(features) 
-        
-        logger.info(f"Prediksi SVM selesai dalam: {time.time() - svm_predict_start:.4f} detik.") # <<< LOG PREDIKSI SVM
-        
-        predicted_class_idx = prediction[0]
-        confidence = float(np.max(probabilities)) * 100 
-        
-        logger.info(f"Indeks Prediksi SVM: {predicted_class_idx}, Confidence: {confidence:.2f}%")
-        
-        if predicted_class_idx < len(label_mapping):
-            predicted_label = label_mapping[predicted_class_idx]
+
+        # Pastikan model sudah dimuat sebelum masuk antrian
+        ensure_models_ready()
+        engine = preprocess_engine or PREPROCESS_ENGINE
+
+        if prediction_cache.enabled:
+            if content_hash is None:
+                if isinstance(image_source, str):
+                    content_hash = await io_executor.run(PredictionCache.file_hash, image_source)
+                else:
+                    content_hash = await cpu_executor.run(PredictionCache.content_hash, image_source)
+            cache_key = PredictionCache.make_key(content_hash, f"{model_loader.get_model_version()}-{engine}")
+            result = await prediction_cache.get_or_compute(cache_key, lambda: _predict_uncached(image_source, engine))
         else:
-            raise ValueError(f"Indeks prediksi SVM tidak valid: {predicted_class_idx}. Diluar batas label_mapping.")
-        
-        if predicted_label not in disease_info:
-            raise ValueError(f"Label '{predicted_label}' tidak dikenal dalam disease_info.")
-            
-        disease_name = disease_info[predicted_label]['nama_penyakit']
-        recommendation = disease_info[predicted_label]['rekomendasi']
-        category = category_mapping[predicted_label]
-        
-        result = {
-            "prediksi": predicted_label,
-            "nama_penyakit": disease_name,
-            "rekomendasi": recommendation,
-            "kategori": category,
-            "akurasi": confidence
-        }
-        
-        logger.info(f"Hasil prediksi akhir: {result}")
-        logger.info(f"Total predict_image function took: {time.time() - total_predict_time_start:.4f} seconds") # <<< LOG TOTAL WAKTU FUNGSI
+            result = await _predict_uncached(image_source, engine)
+
+        logger.debug("Hasil prediksi akhir: %s", result)
+        log_timing(logger, "predict_image", total_predict_time_start, prediksi=result["prediksi"]) # <<< LOG TOTAL WAKTU FUNGSI
         return result
-        
+
     except Exception as e:
         logger.error(f"Error dalam fungsi prediksi: {str(e)}", exc_info=True)
-        raise ValueError(f"Gagal melakukan prediksi gambar: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Gagal melakukan prediksi gambar: {str(e)}")
+
+
+async def predict_images(image_paths: List[str], content_hashes: List[str], preprocess_engine: str = None) -> list:
+    """
+    Prediksi banyak gambar sekaligus (endpoint batch) dari path file hasil ingest beserta hash isinya.
+    Mengembalikan list sepanjang input berisi dict hasil atau Exception untuk gambar yang gagal.
+    Gambar yang sudah ada di prediction_cache tidak diproses ulang, dan gambar identik dalam satu
+    batch hanya diproses sekali. Preprocessing berjalan paralel di executor CPU, lalu semua gambar
+    dikirim sekaligus ke inference_scheduler sehingga CNN + SVM menerima batch penuh.
+    """
+    start_time = time.perf_counter()
+    ensure_models_ready()
+    engine = preprocess_engine or PREPROCESS_ENGINE
+    version = f"{model_loader.get_model_version()}-{engine}"
+    keys = [PredictionCache.make_key(content_hash, version) for content_hash in content_hashes]
+
+    sources = {}  # key -> path, satu per isi gambar
+    for key, path in zip(keys, image_paths):
+        sources.setdefault(key, path)
+
+    results = {}  # key -> dict | Exception
+    if prediction_cache.enabled:
+        cached = await asyncio.gather(*(prediction_cache.get(key) for key in sources))
+        for key, result in zip(list(sources), cached):
+            if result is not None:
+                results[key] = result
+
+    pending = [key for key in sources if key not in results]
+    if pending:
+        buffer = np.empty((len(pending), 128, 128, 3), dtype=np.uint8)
+        decoded = await asyncio.gather(
+            *(cpu_executor.run(preprocess_image, sources[key], engine=engine, out=buffer[i]) for i, key in enumerate(pending)),
+            return_exceptions=True,
+        )
+        ready = []
+        for i, (key, outcome) in enumerate(zip(pending, decoded)):
+            if isinstance(outcome, Exception):
+                results[key] = outcome
+            else:
+                ready.append(i)
+
+        if ready:
+            classified = await inference_scheduler.submit_many([buffer[i] for i in ready])
+            for i, outcome in zip(ready, classified):
+                results[pending[i]] = outcome
+                if prediction_cache.enabled and not isinstance(outcome, Exception):
+                    await prediction_cache.put(pending[i], outcome)
+
+    log_timing(logger, "predict_images", start_time, images=len(keys), unique=len(sources), uncached=len(pending))
+    return [dict(results[key]) if isinstance(results[key], dict) else results[key] for key in keys]
@@ -0,0 +1,195 @@
+# app/machine_learning/svm_head.py
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Konstanta yang sama dengan libsvm (svm_predict_probability / multiclass_probability)
+_MIN_PROB = 1e-7
+
+
+class SklearnSVMHead:
+    """Head klasifikasi yang langsung memakai SVC hasil joblib (predict + predict_proba)."""
+
+    name = "sklearn"
+
+    def __init__(self, svm_model):
+        self.svm_model = svm_model
+        self.classes_ = svm_model.classes_
+
+    def predict_with_proba(self, features: np.ndarray):
+        return self.svm_model.predict(features), self.svm_model.predict_proba(features)
+
+
+class SVMHead:
+    """
+    Head klasifikasi SVM one-vs-one yang menghitung nilai keputusan dan probabilitas
+    terkalibrasi (Platt + pairwise coupling libsvm) dalam satu pass NumPy per batch.
+
+    Support vector dan koefisien disusun ulang saat load menjadi array float32 contiguous:
+    matriks koefisien per pasangan kelas (n_SV, n_pairs), sehingga seluruh nilai keputusan
+    satu batch dihitung dengan satu perkalian matriks. Untuk kernel linear, support vector
+    dan koefisien dilipat menjadi bobot (n_features, n_pairs).
+    Label mengikuti voting libsvm (svm_model.predict), probabilitas mengikuti predict_proba.
+    """
+
+    name = "numpy"
+
+    def __init__(self, svm_model):
+        if svm_model.kernel not in ("linear", "rbf", "poly", "sigmoid"):
+            raise ValueError(f"Kernel SVM tidak didukung: {svm_model.kernel}")
+        if not getattr(svm_model, "probability", False):
+            raise ValueError("SVM harus dilatih dengan probability=True.")
+
+        self.classes_ = np.asarray(svm_model.classes_)
+        self.kernel = svm_model.kernel
+        self.gamma = float(svm_model._gamma)
+        self.coef0 = float(svm_model.coef0)
+        self.degree = int(svm_model.degree)
+
+        n_class = len(self.classes_)
+        n_support = np.asarray(svm_model._n_support)
+        starts = np.concatenate([[0], np.cumsum(n_support)])
+        dual_coef = np.asarray(svm_model._dual_coef_, dtype=np.float64)
+        support_vectors = np.asarray(svm_model.support_vectors_, dtype=np.float64)
+
+        # Koefisien per pasangan (i, j) dengan urutan yang sama seperti libsvm
+        pairs = [(i, j) for i in range(n_class) for j in range(i + 1, n_class)]
+        coef = np.zeros((len(support_vectors), len(pairs)), dtype=np.float64)
+        for p, (i, j) in enumerate(pairs):
+            coef[starts[i]:starts[i + 1], p] = dual_coef[j - 1, starts[i]:starts[i + 1]]
+            coef[starts[j]:starts[j + 1], p] = dual_coef[i, starts[j]:starts[j + 1]]
+
+        self.n_class = n_class
+        self.pair_i = np.array([i for i, _ in pairs], dtype=np.intp)
+        self.pair_j = np.array([j for _, j in pairs], dtype=np.intp)
+        self.intercept = np.asarray(svm_model._intercept_, dtype=np.float64)
+        self.prob_a = np.asarray(svm_model._probA, dtype=np.float64)
+        self.prob_b = np.asarray(svm_model._probB, dtype=np.float64)
+
+        if self.kernel == "linear":
+            self.weights = np.ascontiguousarray(support_vectors.T @ coef, dtype=np.float32)
+            self.support_vectors = None
+            self.coef = None
+        else:
+            self.weights = None
+            self.support_vectors = np.ascontiguousarray(support_vectors, dtype=np.float32)
+            self.sv_sq_norms = np.einsum("ij,ij->i", self.support_vectors, self.support_vectors)
+            self.coef = np.ascontiguousarray(coef, dtype=np.float32)
+
+    def decision_values(self, features: np.ndarray) -> np.ndarray:
+        """Nilai keputusan one-vs-one (N, n_pairs), setara decision_function libsvm."""
+        x = np.ascontiguousarray(features, dtype=np.float32)
+        if self.kernel == "linear":
+            return (x @ self.weights).astype(np.float64) + self.intercept
+
+        dot = x @ self.support_vectors.T
+        if self.kernel == "rbf":
+            x_sq = np.einsum("ij,ij->i", x, x)
+            sq_dist = np.maximum(x_sq[:, None] + self.sv_sq_norms[None, :] - 2.0 * dot, 0.0)
+            kernel = np.exp(-self.gamma * sq_dist)
+        elif self.kernel == "poly":
+            kernel = (self.gamma * dot + self.coef0) ** self.degree
+        else:
+            kernel = np.tanh(self.gamma * dot + self.coef0)
+        return (kernel @ self.coef).astype(np.float64) + self.intercept
+
+    def _predict_from_decision(self, dec: np.ndarray) -> np.ndarray:
+        # Voting libsvm: dec > 0 memilih kelas i, selain itu kelas j; seri -> indeks terkecil
+        votes = np.zeros((len(dec), self.n_class), dtype=np.intp)
+        positive = dec > 0
+        for p in range(dec.shape[1]):
+            votes[:, self.pair_i[p]] += positive[:, p]
+            votes[:, self.pair_j[p]] += ~positive[:, p]
+        return np.argmax(votes, axis=1)
+
+    def _pairwise_probabilities(self, dec: np.ndarray) -> np.ndarray:
+        # Platt scaling per pasangan: 1 / (1 + exp(dec * A + B)), dijepit seperti libsvm
+        f_apb = dec * self.prob_a + self.prob_b
+        pairwise = np.exp(-np.logaddexp(0.0, f_apb))
+        pairwise = np.clip(pairwise, _MIN_PROB, 1.0 - _MIN_PROB)
+
+        r = np.zeros((len(dec), self.n_class, self.n_class), dtype=np.float64)
+        r[:, self.pair_i, self.pair_j] = pairwise
+        r[:, self.pair_j, self.pair_i] = 1.0 - pairwise
+        return r
+
+    def _multiclass_probability(self, r: np.ndarray) -> np.ndarray:
+        """Pairwise coupling (Wu, Lin & Weng) seperti multiclass_probability libsvm, per batch."""
+        n, k = r.shape[0], self.n_class
+        if k == 2:
+            return np.stack([r[:, 0, 1], r[:, 1, 0]], axis=1)
+
+        q = -r.transpose(0, 2, 1) * r
+        diag = np.einsum("bjt,bjt->bt", r, r) - np.einsum("btt,btt->bt", r, r)
+        idx = np.arange(k)
+        q[:, idx, idx] = diag
+
+        p = np.full((n, k), 1.0 / k)
+        q_diag = np.ascontiguousarray(q[:, idx, idx].T)
+        q_rows = np.ascontiguousarray(q.transpose(1, 0, 2))
+        active = np.ones(n, dtype=np.float64)
+        eps = 0.005 / k
+        for _ in range(max(100, k)):
+            qp = np.matmul(q, p[:, :, None])[:, :, 0]
+            pqp = np.einsum("bi,bi->b", p, qp)
+            # Baris yang sudah konvergen dibekukan (diff = 0), sama dengan break per sampel di libsvm
+            active *= np.max(np.abs(qp - pqp[:, None]), axis=1) >= eps
+            if not active.any():
+                break
+
+            for t in range(k):
+                diff = (pqp - qp[:, t]) / q_diag[t] * active
+                p[:, t] += diff
+                scale = 1.0 + diff
+                pqp = (pqp + diff * (diff * q_diag[t] + 2.0 * qp[:, t])) / (scale * scale)
+                qp += diff[:, None] * q_rows[t]
+                qp /= scale[:, None]
+                p /= scale[:, None]
+        return p
+
+    def predict_with_proba(self, features: np.ndarray):
+        """Mengembalikan (labels, probabilities) untuk seluruh batch fitur (N, D)."""
+        dec = self.decision_values(features)
+        labels = self.classes_[self._predict_from_decision(dec)]
+        probabilities = self._multiclass_probability(self._pairwise_probabilities(dec))
+        return labels, probabilities
+
+
+def build_svm_head(svm_model, n_samples: int = 256, atol: float = 1e-4):
+    """
+    Membangun SVMHead lalu memvalidasinya terhadap svm_model (predict dan predict_proba)
+    pada support vector dan titik acak di sekitarnya. Jika hasilnya tidak cocok dalam
+    toleransi, kembali memakai SklearnSVMHead.
+    """
+    try:
+        head = SVMHead(svm_model)
+
+        rng = np.random.default_rng(0)
+        support_vectors = np.asarray(svm_model.support_vectors_, dtype=np.float32)
+        scale = np.std(support_vectors, axis=0) + 1e-6
+        picks = support_vectors[rng.integers(0, len(support_vectors), size=n_samples)]
+        samples = np.concatenate([
+            support_vectors,
+            picks + rng.normal(size=picks.shape).astype(np.float32) * scale,
+        ]).astype(np.float32)
+
+        labels, proba = head.predict_with_proba(samples)
+        ref_labels = svm_model.predict(samples)
+        ref_proba = svm_model.predict_proba(samples)
+        label_mismatch = int(np.sum(labels != ref_labels))
+        max_proba_diff = float(np.max(np.abs(proba - ref_proba)))
+
+        if label_mismatch or max_proba_diff > atol:
+            logger.error(
+                f"SVMHead tidak cocok dengan svm_model (label berbeda: {label_mismatch}, "
+                f"max |proba|: {max_proba_diff:.2e}). Memakai predict/predict_proba sklearn."
+            )
+            return SklearnSVMHead(svm_model)
+
+        logger.info(f"SVMHead tervalidasi pada {len(samples)} sampel (max |proba - sklearn|: {max_proba_diff:.2e}).")
+        return head
+    except Exception as e:
+        logger.error(f"Gagal membangun SVMHead: {str(e)}. Memakai predict/predict_proba sklearn.", exc_info=True)
+        return SklearnSVMHead(svm_model)
@@ -0,0 +1,338 @@
+# app/machine_learning/worker_pool.py
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.machine_learning import model_loader
+
+from config import (
+    INFERENCE_MAX_BATCH_SIZE,
+    INFERENCE_WORKERS,
+    INFERENCE_WORKER_INTRA_OP_THREADS,
+    INFERENCE_WORKER_INTER_OP_THREADS,
+    INFERENCE_WORKER_RESTART,
+    INFERENCE_WORKER_RESTART_MAX_BACKOFF,
+    INFERENCE_WORKER_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bentuk dan tipe satu gambar yang ditulis ke shared memory (uint8, dinormalisasi di engine)
+INPUT_SHAPE = (128, 128, 3)
+INPUT_DTYPE = np.uint8
+
+
+def _worker_main(worker_id: int, shm_name: str, max_batch_size: int, conn, intra_op_threads: int, inter_op_threads: int):
+    """
+    Entry point proses worker inferensi.
+    Memuat model sekali, lalu menunggu perintah dari proses HTTP. Tensor gambar dibaca
+    langsung dari shared memory; yang dikirim lewat pipe hanya ukuran batch dan hasil klasifikasi.
+    """
+    from app.logging_setup import configure_logging
+    configure_logging()
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+    from app.machine_learning import model_loader, predictor
+
+    # Segmen dimiliki proses induk (resource tracker-nya juga dipakai bersama), worker hanya menempel.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    batch_buffer = np.ndarray((max_batch_size,) + INPUT_SHAPE, dtype=INPUT_DTYPE, buffer=shm.buf)
+
+    try:
+        model_loader.load_models()
+        # Warm-up di setiap worker sebelum dinyatakan siap
+        predictor.run_models(np.zeros((1,) + INPUT_SHAPE, dtype=INPUT_DTYPE))
+        conn.send(("ready", os.getpid()))
+
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message[0] == "stop":
+                break
+
+            batch_size = message[1]
+            try:
+                predictions, probabilities = predictor.run_models(batch_buffer[:batch_size])
+                conn.send(("ok", predictions.tolist(), probabilities.tolist()))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Worker inferensi {worker_id} gagal: {str(e)}", exc_info=True)
+        try:
+            conn.send(("failed", str(e)))
+        except Exception:
+            pass
+    finally:
+        del batch_buffer
+        shm.close()
+
+
+class _WorkerSlot:
+    """Satu proses worker beserta segmen shared memory dan pipe miliknya."""
+
+    def __init__(self, worker_id: int, max_batch_size: int):
+        self.worker_id = worker_id
+        self.max_batch_size = max_batch_size
+        nbytes = int(np.prod((max_batch_size,) + INPUT_SHAPE)) * np.dtype(INPUT_DTYPE).itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.buffer = np.ndarray((max_batch_size,) + INPUT_SHAPE, dtype=INPUT_DTYPE, buffer=self.shm.buf)
+        self.process = None
+        self.conn = None
+        self.pid = None
+        self.restarts = 0
+        self.batches = 0
+
+    def spawn(self, ctx):
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(self.worker_id, self.shm.name, self.max_batch_size, child_conn,
+                  INFERENCE_WORKER_INTRA_OP_THREADS, INFERENCE_WORKER_INTER_OP_THREADS),
+            name=f"inference-worker-{self.worker_id}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def wait_ready(self, timeout: float):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Worker {self.worker_id} tidak siap dalam {timeout} detik.")
+        try:
+            status, detail = self.conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Worker {self.worker_id} berhenti sebelum siap (exitcode={self.process.exitcode}).")
+        if status != "ready":
+            raise RuntimeError(f"Worker {self.worker_id} gagal memuat model: {detail}")
+        self.pid = detail
+
+    def kill(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(("stop",))
+            except Exception:
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+            self.process = None
+
+    def close(self):
+        self.kill()
+        del self.buffer
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferenceWorkerPool:
+    """
+    Pool proses worker inferensi. Masing-masing worker memuat model sendiri
+    (model_loader.load_models) dan menerima batch gambar lewat shared memory.
+    """
+
+    def __init__(self, num_workers: int, max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+                 restart_on_crash: bool = INFERENCE_WORKER_RESTART, timeout: float = INFERENCE_WORKER_TIMEOUT):
+        self.num_workers = num_workers
+        self.max_batch_size = max_batch_size
+        self.restart_on_crash = restart_on_crash
+        self.timeout = timeout
+        self._ctx = mp.get_context("spawn")
+        self._slots = []
+        self._idle = queue.Queue()
+        self._closed = False
+        # worker_id slot yang prosesnya mati dan belum berhasil dijalankan ulang
+        self._dead = set()
+        self._dead_lock = threading.Lock()
+        # True jika status model diubah ke failed oleh pool karena semua worker mati
+        self._degraded = False
+
+    def start(self, load_timeout: float = 300.0):
+        """Menjalankan semua worker dan menunggu sampai model selesai dimuat (blocking)."""
+        logger.info(f"Menjalankan {self.num_workers} worker inferensi...")
+        for worker_id in range(self.num_workers):
+            slot = _WorkerSlot(worker_id, self.max_batch_size)
+            slot.spawn(self._ctx)
+            self._slots.append(slot)
+        for slot in self._slots:
+            slot.wait_ready(load_timeout)
+            self._idle.put(slot)
+            logger.info(f"Worker inferensi {slot.worker_id} siap (pid={slot.pid}).")
+
+    def stop(self):
+        self._closed = True
+        for slot in self._slots:
+            slot.close()
+        self._slots = []
+
+    def ready_workers(self) -> int:
+        return self._idle.qsize()
+
+    def live_workers(self) -> int:
+        return self.num_workers - len(self._dead)
+
+    def run_batch(self, img_batch: np.ndarray):
+        """
+        Menjalankan satu batch di worker yang sedang idle (blocking, dipanggil dari executor CPU).
+        Mengembalikan (predictions, probabilities) seperti predictor.run_models.
+        """
+        if len(img_batch) > self.max_batch_size:
+            raise ValueError(f"Ukuran batch {len(img_batch)} melebihi kapasitas shared memory ({self.max_batch_size}).")
+
+        if not self.live_workers():
+            raise RuntimeError("Semua worker inferensi berhenti.")
+        try:
+            slot = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError("Tidak ada worker inferensi yang tersedia.")
+
+        healthy = False
+        try:
+            batch_size = len(img_batch)
+            np.copyto(slot.buffer[:batch_size], img_batch, casting="same_kind")
+            slot.conn.send(("predict", batch_size))
+            if not slot.conn.poll(self.timeout):
+                raise TimeoutError(f"Worker {slot.worker_id} tidak merespons dalam {self.timeout} detik.")
+            status, *payload = slot.conn.recv()
+            healthy = True
+            if status != "ok":
+                raise RuntimeError(f"Worker {slot.worker_id} gagal memproses batch: {payload[0]}")
+            slot.batches += 1
+            predictions, probabilities = payload
+            return np.asarray(predictions), np.asarray(probabilities)
+        except (EOFError, OSError, TimeoutError) as e:
+            logger.error(f"Worker inferensi {slot.worker_id} bermasalah: {type(e).__name__}: {e}")
+            raise RuntimeError(f"Worker inferensi {slot.worker_id} berhenti saat memproses batch.") from e
+        finally:
+            if healthy:
+                self._idle.put(slot)
+            else:
+                self._handle_crash(slot)
+
+    def _handle_crash(self, slot: _WorkerSlot):
+        slot.kill()
+        self._mark_dead(slot)
+        if self._closed or not self.restart_on_crash:
+            logger.warning(f"Worker inferensi {slot.worker_id} tidak dijalankan ulang.")
+            return
+        threading.Thread(target=self._restart, args=(slot,), daemon=True).start()
+
+    def _mark_dead(self, slot: _WorkerSlot):
+        """Mencatat slot yang mati; jika tidak ada lagi worker hidup, model dinyatakan failed."""
+        with self._dead_lock:
+            self._dead.add(slot.worker_id)
+            if self._closed or self.live_workers() or self._degraded:
+                return
+            self._degraded = True
+        logger.error("Semua worker inferensi berhenti, prediksi tidak bisa dilayani.")
+        model_loader.set_load_state(
+            "failed", model_loader.load_state["progress"], "Semua worker inferensi berhenti",
+            error="Tidak ada worker inferensi yang hidup.",
+        )
+
+    def _mark_alive(self, slot: _WorkerSlot):
+        """Slot kembali hidup; status model dipulihkan jika sebelumnya diubah ke failed oleh pool."""
+        with self._dead_lock:
+            self._dead.discard(slot.worker_id)
+            restored, self._degraded = self._degraded, False
+        self._idle.put(slot)
+        if restored:
+            model_loader.set_load_state("ready", 1.0, "Model siap")
+
+    def _restart(self, slot: _WorkerSlot):
+        """Menjalankan ulang worker yang mati, diulang dengan backoff eksponensial sampai berhasil."""
+        backoff = 1.0
+        attempt = 1
+        while not self._closed:
+            start_time = time.time()
+            try:
+                slot.spawn(self._ctx)
+                slot.wait_ready(300.0)
+            except Exception as e:
+                logger.error(
+                    f"Gagal menjalankan ulang worker inferensi {slot.worker_id} (percobaan {attempt}): {str(e)}; "
+                    f"dicoba lagi dalam {backoff:.0f} detik.",
+                    exc_info=True,
+                )
+                slot.kill()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, INFERENCE_WORKER_RESTART_MAX_BACKOFF)
+                attempt += 1
+                continue
+            if self._closed:
+                slot.kill()
+                return
+            slot.restarts += 1
+            logger.info(f"Worker inferensi {slot.worker_id} dijalankan ulang dalam {time.time() - start_time:.2f} detik (pid={slot.pid}).")
+            self._mark_alive(slot)
+            return
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.num_workers,
+            "idle_workers": self._idle.qsize(),
+            "live_workers": self.live_workers(),
+            "intra_op_threads": INFERENCE_WORKER_INTRA_OP_THREADS,
+            "inter_op_threads": INFERENCE_WORKER_INTER_OP_THREADS,
+            "restart_on_crash": self.restart_on_crash,
+            "per_worker": [
+                {
+                    "worker_id": slot.worker_id,
+                    "pid": slot.pid,
+                    "alive": slot.process is not None and slot.process.is_alive(),
+                    "batches": slot.batches,
+                    "restarts": slot.restarts,
+                }
+                for slot in self._slots
+            ],
+        }
+
+
+pool = None
+
+
+def is_enabled() -> bool:
+    """True jika inferensi dijalankan di proses worker terpisah (INFERENCE_WORKERS > 0)."""
+    return INFERENCE_WORKERS > 0
+
+
+def start_pool():
+    """Membuat dan menjalankan pool worker sesuai konfigurasi (blocking)."""
+    global pool
+    if pool is not None:
+        return pool
+    new_pool = InferenceWorkerPool(INFERENCE_WORKERS)
+    try:
+        new_pool.start()
+    except Exception:
+        new_pool.stop()
+        raise
+    pool = new_pool
+    return pool
+
+
+def stop_pool():
+    global pool
+    if pool is not None:
+        pool.stop()
+        pool = None
+
+
+def get_pool() -> InferenceWorkerPool:
+    if pool is None:
+        raise RuntimeError("Pool worker inferensi belum dijalankan. Panggil start_pool() terlebih dahulu.")
+    return pool
@@ -0,0 +1,210 @@
+# app/metrics.py
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.machine_learning import model_loader
+
+# Format eksposisi teks Prometheus 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket default (detik): dari sub-milidetik (cache, auth) sampai beberapa detik (upload besar, CNN di CPU)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_string(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+class _HistogramChild:
+    """Satu deret histogram dengan label yang sudah terikat; observe() tanpa alokasi."""
+
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # slot terakhir: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_since(self, start: float):
+        """Mencatat durasi sejak start (nilai time.perf_counter())."""
+        self.observe(time.perf_counter() - start)
+
+
+class Histogram:
+    """
+    Histogram Prometheus dengan bucket tetap. Label diikat sekali lewat labels(...) dan anaknya
+    disimpan oleh pemanggil (mis. konstanta modul), sehingga jalur panas hanya menjalankan
+    bisect dan tiga penambahan.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], _HistogramChild] = {}
+
+    def labels(self, *values: str) -> _HistogramChild:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: butuh label {self.labelnames}, diberikan {values}")
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.upper_bounds)
+        return child
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in list(self._children.items()):
+            labels = _label_string(self.labelnames, values)
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            counts = list(child.counts)
+            for upper_bound, n in zip(self.upper_bounds + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format_value(upper_bound)}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge yang nilainya dibaca dari callback saat /metrics di-scrape (tanpa biaya di jalur request)."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Callable[[], Dict[Tuple[str, ...], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for values, value in self.callback().items():
+            labels = _label_string(self.labelnames, values)
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}{suffix} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        lines.append("")
+        return "\n".join(lines).encode("utf-8")
+
+
+registry = MetricsRegistry()
+
+# Tahap pipeline; anak histogram diikat di sini dan dipakai langsung oleh modul pemanggil
+STAGES = ("upload_read", "file_write", "decode", "resize", "cnn", "svm", "db_insert", "auth_lookup")
+
+stage_seconds = registry.register(Histogram(
+    "plant_stage_duration_seconds", "Durasi per tahap pipeline (cnn dan svm per batch).", ["stage"],
+))
+UPLOAD_READ, FILE_WRITE, DECODE, RESIZE, CNN, SVM, DB_INSERT, AUTH_LOOKUP = (
+    stage_seconds.labels(stage) for stage in STAGES
+)
+
+http_request_seconds = registry.register(Histogram(
+    "plant_http_request_duration_seconds", "Latensi request HTTP per route, method dan status.",
+    ["method", "route", "status"],
+))
+
+
+class HTTPMetricsMiddleware:
+    """
+    Middleware ASGI: latensi per (method, template route, status) dan jumlah request yang sedang
+    diproses. Anak histogram di-cache per template path route, jadi request berikutnya ke route
+    yang sama hanya melakukan lookup dict.
+    """
+
+    def __init__(self, app, histogram: Histogram = http_request_seconds):
+        self.app = app
+        self.histogram = histogram
+        # template path (atau None) -> method -> status -> _HistogramChild
+        self._children: Dict[Optional[str], Dict[str, Dict[int, _HistogramChild]]] = {}
+
+    def _child(self, route_path: Optional[str], method: str, status_code: int) -> _HistogramChild:
+        by_method = self._children.get(route_path)
+        if by_method is None:
+            by_method = self._children[route_path] = {}
+        by_status = by_method.get(method)
+        if by_status is None:
+            by_status = by_method[method] = {}
+        child = by_status.get(status_code)
+        if child is None:
+            child = by_status[status_code] = self.histogram.labels(method, route_path or "<unmatched>", str(status_code))
+        return child
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _in_flight -= 1
+            route = scope.get("route")
+            self._child(route.path if route is not None else None, scope["method"], status_code).observe_since(start)
+
+
+# Request yang sedang diproses HTTPMetricsMiddleware (hanya diubah dari event loop)
+_in_flight = 0
+
+registry.register(Gauge(
+    "plant_http_requests_in_flight", "Request HTTP yang sedang diproses.",
+    callback=lambda: {(): _in_flight},
+))
+
+
+def _model_state() -> Dict[Tuple[str, ...], float]:
+    current = model_loader.load_state["state"]
+    return {(state,): 1.0 if state == current else 0.0 for state in model_loader.LOAD_STATES}
+
+
+def _model_loaded() -> Dict[Tuple[str, ...], float]:
+    return {(): 1.0 if model_loader.is_ready() else 0.0}
+
+
+registry.register(Gauge("plant_model_loaded", "1 jika model sudah dimuat dan warm-up selesai.", callback=_model_loaded))
+registry.register(Gauge("plant_model_state", "Status pemuatan model (1 untuk status aktif).", ["state"], callback=_model_state))
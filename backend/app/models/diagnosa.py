@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,Date, String, Enum, Float, ForeignKey, DateTime 
+from sqlalchemy import Column, Integer,Date, String, Enum, Float, ForeignKey, DateTime, Index 
 from sqlalchemy.orm import relationship
 from config import Base
 from enum import Enum as PyEnum
@@ -17,12 +17,17 @@ class Diagnosa(Base):
     id_user =Column(Integer, ForeignKey("users.id_user"))
     tanggal = Column(Date)
     jenis_penyakit = Column(String)
-    image = Column(String)
+    image = Column(String, index=True)
     rekomendasi = Column(String)
     kategori = Column(Enum(KondisiDaun))
     akurasi = Column(Float)
-    create_date = Column(DateTime, default=datetime.datetime.now())
+    create_date = Column(DateTime, default=datetime.datetime.utcnow)
     update_date = Column(DateTime)
 
         # Relationships
     users = relationship("Users", back_populates="diagnosa")
+
+    __table_args__ = (
+        # Histori per user (terbaru dulu) untuk keyset pagination /historiku/
+        Index("ix_diagnosa_user_history", id_user, create_date.desc(), id_diagnosa.desc()),
+    )
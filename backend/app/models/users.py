@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from config import Base
 import datetime # Pastikan ini diimpor
@@ -10,8 +10,14 @@ class Users(Base):
     nama = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False) 
     password = Column(String, nullable=False)
-    image = Column(String, nullable=True, default=None) 
+    image = Column(String, nullable=True, default=None, index=True)
     create_date = Column(DateTime, default=datetime.datetime.utcnow) 
     update_date = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow) 
 
-    diagnosa = relationship("Diagnosa", back_populates="users")
\ No newline at end of file
+    diagnosa = relationship("Diagnosa", back_populates="users")
+
+    __table_args__ = (
+        # Email dan nama unik tanpa membedakan huruf besar/kecil; juga dipakai untuk lookup login
+        Index("ux_users_email_lower", func.lower(email), unique=True),
+        Index("ux_users_nama_lower", func.lower(nama), unique=True),
+    )
\ No newline at end of file
@@ -1,16 +1,21 @@
 # app/repository/diagnosa.py
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, delete, func, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.diagnosa import Diagnosa, KondisiDaun
 from app.schemas.diagnosa import DiagnosaCreate
-from typing import List, Optional
-from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from datetime import date, datetime
+import base64
 import logging
 import time
 
+from app import metrics
+from app.logging_setup import log_timing
+
 logger = logging.getLogger(__name__)
 
 # Fungsi untuk membuat diagnosa baru
-def create_diagnosa(db: Session, diagnosa: DiagnosaCreate) -> Diagnosa:
+async def create_diagnosa(db: AsyncSession, diagnosa: DiagnosaCreate) -> Diagnosa:
     db_diagnosa = Diagnosa(
         id_user=diagnosa.id_user,
         tanggal=diagnosa.tanggal,
@@ -19,35 +24,147 @@ def create_diagnosa(db: Session, diagnosa: DiagnosaCreate) -> Diagnosa:
         rekomendasi=diagnosa.rekomendasi,
         kategori=KondisiDaun(diagnosa.kategori.upper()),
         akurasi=diagnosa.akurasi,
-        create_date=datetime.utcnow()
+        create_date=datetime.utcnow(),
+        update_date=None
     )
     db.add(db_diagnosa)
-    db.commit()
-    db.refresh(db_diagnosa)
+    # Semua kolom sudah terisi dan id didapat dari INSERT, jadi tidak perlu refresh (SELECT ulang)
+    start = time.perf_counter()
+    await db.commit()
+    metrics.DB_INSERT.observe_since(start)
     return db_diagnosa
 
 # Fungsi untuk mendapatkan semua diagnosa (tanpa filter user)
-def get_all_diagnosa(db: Session) -> List[Diagnosa]:
-    return db.query(Diagnosa).all()
+async def get_all_diagnosa(db: AsyncSession) -> List[Diagnosa]:
+    result = await db.execute(select(Diagnosa))
+    return list(result.scalars().all())
+
+# Kolom untuk endpoint daftar: select kolom menghasilkan tuple ringan tanpa identity map ORM.
+# Baris tetap bisa diakses per atribut (row.id_diagnosa, row.image, ...) seperti objek Diagnosa.
+DIAGNOSA_COLUMNS = (
+    Diagnosa.id_diagnosa,
+    Diagnosa.id_user,
+    Diagnosa.tanggal,
+    Diagnosa.jenis_penyakit,
+    Diagnosa.image,
+    Diagnosa.rekomendasi,
+    Diagnosa.kategori,
+    Diagnosa.akurasi,
+    Diagnosa.create_date,
+    Diagnosa.update_date,
+)
+
+# Urutan histori: terbaru dulu, id_diagnosa sebagai pemecah seri (sesuai ix_diagnosa_user_history)
+HISTORY_ORDER = (Diagnosa.create_date.desc(), Diagnosa.id_diagnosa.desc())
+
+# Fungsi untuk menyimpan banyak diagnosa dalam satu INSERT ... RETURNING (endpoint batch)
+# Mengembalikan baris DIAGNOSA_COLUMNS sesuai urutan items
+async def create_diagnosa_bulk(db: AsyncSession, items: List[DiagnosaCreate]) -> List[Row]:
+    if not items:
+        return []
+    now = datetime.utcnow()
+    values = [
+        dict(
+            id_user=item.id_user,
+            tanggal=item.tanggal,
+            jenis_penyakit=item.jenis_penyakit,
+            image=item.image,
+            rekomendasi=item.rekomendasi,
+            kategori=KondisiDaun(item.kategori.upper()),
+            akurasi=item.akurasi,
+            create_date=now,
+            update_date=None,
+        )
+        for item in items
+    ]
+    start = time.perf_counter()
+    result = await db.execute(insert(Diagnosa).returning(*DIAGNOSA_COLUMNS, sort_by_parameter_order=True), values)
+    rows = list(result.all())
+    await db.commit()
+    metrics.DB_INSERT.observe_since(start)
+    return rows
+
+# Stream semua diagnosa (opsional difilter) dalam potongan berukuran chunk_size.
+# Memakai server-side cursor (yield_per), jadi memori tetap datar berapa pun jumlah barisnya.
+async def stream_diagnosa(
+    db: AsyncSession,
+    chunk_size: int,
+    id_user: Optional[int] = None,
+    kategori: Optional[KondisiDaun] = None,
+    jenis_penyakit: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> AsyncIterator[List[Row]]:
+    query = select(*DIAGNOSA_COLUMNS)
+    if id_user is not None:
+        query = query.filter(Diagnosa.id_user == id_user)
+    if kategori is not None:
+        query = query.filter(Diagnosa.kategori == kategori)
+    if jenis_penyakit is not None:
+        query = query.filter(Diagnosa.jenis_penyakit == jenis_penyakit)
+    if date_from is not None:
+        query = query.filter(Diagnosa.tanggal >= date_from)
+    if date_to is not None:
+        query = query.filter(Diagnosa.tanggal <= date_to)
+
+    result = await db.stream(query.order_by(Diagnosa.id_diagnosa).execution_options(yield_per=chunk_size))
+    async for partition in result.partitions():
+        yield partition
 
 # FIX UTAMA: Fungsi untuk mendapatkan diagnosa berdasarkan user_id DENGAN PAGINATION
-def get_diagnosa_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 10) -> List[Diagnosa]: # FIX: Tambahkan parameter skip dan limit
-    start_time = time.time()
-    logger.info(f"Mengambil diagnosa untuk user_id: {user_id} (skip={skip}, limit={limit})")
+async def get_diagnosa_by_user(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 10) -> List[Row]: # FIX: Tambahkan parameter skip dan limit
+    start_time = time.perf_counter()
     # FIX: Terapkan offset dan limit pada query SQLAlchemy
-    result = db.query(Diagnosa).filter(Diagnosa.id_user == user_id).offset(skip).limit(limit).all()
-    logger.info(f"Pengambilan diagnosa untuk user_id {user_id} selesai dalam: {time.time() - start_time:.4f} detik. Ditemukan {len(result)} item.")
+    result = await db.execute(
+        select(*DIAGNOSA_COLUMNS).filter(Diagnosa.id_user == user_id).order_by(*HISTORY_ORDER).offset(skip).limit(limit)
+    )
+    result = list(result.all())
+    log_timing(logger, "get_diagnosa_by_user", start_time, skip=skip, limit=limit, rows=len(result))
     return result
 
+# Keyset pagination: ambil halaman setelah posisi (create_date, id_diagnosa) pada cursor.
+# Memakai index ix_diagnosa_user_history, jadi biayanya tetap berapa pun dalamnya halaman.
+async def get_diagnosa_by_user_after(
+    db: AsyncSession, user_id: int, after: Optional[Tuple[datetime, int]] = None, limit: int = 10
+) -> List[Row]:
+    query = select(*DIAGNOSA_COLUMNS).filter(Diagnosa.id_user == user_id)
+    if after is not None:
+        query = query.filter(tuple_(Diagnosa.create_date, Diagnosa.id_diagnosa) < tuple_(*after))
+    result = await db.execute(query.order_by(*HISTORY_ORDER).limit(limit))
+    return list(result.all())
+
+def encode_history_cursor(diagnosa) -> str:
+    """Cursor opaque untuk halaman berikutnya, berisi posisi baris terakhir."""
+    raw = f"{diagnosa.create_date.isoformat()}|{diagnosa.id_diagnosa}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Kebalikan encode_history_cursor; ValueError jika cursor tidak valid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        create_date, id_diagnosa = raw.split("|")
+        return datetime.fromisoformat(create_date), int(id_diagnosa)
+    except ValueError:  # termasuk binascii.Error dan UnicodeDecodeError
+        raise ValueError("Cursor tidak valid.")
+
 # Fungsi untuk mendapatkan satu diagnosa berdasarkan ID
-def get_diagnosa_by_id(db: Session, diagnosa_id: int) -> Optional[Diagnosa]:
-    return db.query(Diagnosa).filter(Diagnosa.id_diagnosa == diagnosa_id).first()
-
-# Fungsi untuk menghapus diagnosa
-def delete_diagnosa(db: Session, diagnosa_id: int) -> bool:
-    diagnosa = db.query(Diagnosa).filter(Diagnosa.id_diagnosa == diagnosa_id).first()
-    if diagnosa:
-        db.delete(diagnosa)
-        db.commit()
-        return True
-    return False
\ No newline at end of file
+async def get_diagnosa_by_id(db: AsyncSession, diagnosa_id: int) -> Optional[Diagnosa]:
+    result = await db.execute(select(Diagnosa).filter(Diagnosa.id_diagnosa == diagnosa_id))
+    return result.scalars().first()
+
+# Fungsi untuk menghapus diagnosa dalam satu statement (DELETE ... RETURNING)
+# Mengembalikan baris (id_diagnosa, image) yang dihapus, atau None jika tidak ditemukan
+async def delete_diagnosa(db: AsyncSession, diagnosa_id: int):
+    result = await db.execute(
+        delete(Diagnosa)
+        .where(Diagnosa.id_diagnosa == diagnosa_id)
+        .returning(Diagnosa.id_diagnosa, Diagnosa.image)
+    )
+    deleted = result.first()
+    await db.commit()
+    return deleted
+
+# Fungsi untuk menghitung diagnosa yang masih mereferensikan file gambar (reference count blob)
+async def count_diagnosa_by_image(db: AsyncSession, image: str) -> int:
+    result = await db.execute(select(func.count(Diagnosa.id_diagnosa)).filter(Diagnosa.image == image))
+    return result.scalar_one()
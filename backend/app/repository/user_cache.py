@@ -0,0 +1,164 @@
+# app/repository/user_cache.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.models.users import Users
+from config import USER_CACHE_ENABLED, USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = tuple(column.key for column in inspect(Users).column_attrs)
+
+
+class AuthUserCache:
+    """
+    Cache user terautentikasi per subject token (email), agar get_current_user tidak perlu
+    query database di setiap request. Yang disimpan adalah snapshot nilai kolom (bukan objek ORM),
+    sehingga setiap request mendapat instance Users sendiri yang bisa dipasang ke session-nya.
+    LRU dengan batas jumlah entri dan TTL; TTL juga membatasi data basi antar-worker jika
+    invalidasi lewat NOTIFY tidak diaktifkan.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        self.enabled = enabled and ttl_seconds > 0
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # subject -> (expires_at, snapshot)
+        # Naik setiap invalidasi; hasil query yang dimulai sebelum invalidasi tidak disimpan
+        self._generation = 0
+
+        # Statistik
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, subject: str) -> Optional[Users]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(subject)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            del self._entries[subject]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        user = Users(**snapshot)
+        # Ditandai sebagai baris yang sudah ada (detached, tanpa perubahan tertunda)
+        make_transient_to_detached(user)
+        return user
+
+    def put(self, subject: str, user: Users, generation: int):
+        if not self.enabled or generation != self._generation:
+            return
+        snapshot = {name: getattr(user, name) for name in USER_COLUMNS}
+        self._entries[subject] = (time.monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *subjects: str, remote: bool = False):
+        self._generation += 1
+        for subject in subjects:
+            if subject and self._entries.pop(subject, None) is not None:
+                if remote:
+                    self.remote_invalidations += 1
+                else:
+                    self.invalidations += 1
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+user_cache = AuthUserCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS, enabled=USER_CACHE_ENABLED)
+
+
+class UserCacheInvalidationListener:
+    """
+    Invalidasi antar-worker lewat PostgreSQL LISTEN/NOTIFY: UserRepo.update_user mengirim
+    pg_notify(channel, email) dalam transaksi yang sama, dan setiap worker yang mendengarkan
+    menghapus entri tersebut dari cache lokalnya. Koneksi asyncpg terpisah dibuka ulang
+    otomatis jika terputus.
+    """
+
+    def __init__(self, cache: AuthUserCache, dsn: str, channel: str, reconnect_seconds: float = 5.0):
+        self.cache = cache
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.cache.invalidate(payload, remote=True)
+
+    async def _run(self):
+        import asyncpg
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.get_running_loop().create_future()
+                connection.add_termination_listener(lambda _: closed.done() or closed.set_result(None))
+                await connection.add_listener(self.channel, self._on_notify)
+                logger.info(f"Mendengarkan invalidasi cache user di channel '{self.channel}'.")
+                await closed
+                logger.warning("Koneksi LISTEN cache user terputus, menyambung ulang...")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Listener invalidasi cache user gagal: {str(e)}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            # Entri yang mungkin terlewat selama terputus dibuang
+            self.cache.clear()
+            await asyncio.sleep(self.reconnect_seconds)
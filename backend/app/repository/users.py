@@ -1,14 +1,21 @@
-from typing import TypeVar, Generic, Optional, Dict, Any
+from typing import TypeVar, Generic, Optional, Dict, Any, Tuple
 from app.models.users import Users # Pastikan model Users Anda benar (ada kolom 'nama')
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from config import get_db, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from passlib.context import CryptContext
+from config import get_db, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, USER_CACHE_NOTIFY_CHANNEL, BCRYPT_ROUNDS
+from app import metrics
+from app.executors import password_executor
+from app.repository.user_cache import user_cache
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, OAuth2PasswordBearer
 import logging
+import time
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -18,45 +25,135 @@ security = HTTPBearer()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/login")
 
 
+# Index unik -> field yang bentrok (lihat Users.__table_args__ dan constraint email lama)
+UNIQUE_USER_CONSTRAINTS = {
+    "ux_users_email_lower": "email",
+    "users_email_key": "email",
+    "ux_users_nama_lower": "nama",
+}
+
+class DuplicateUserError(ValueError):
+    """Email atau nama sudah dipakai user lain (pelanggaran index unik)."""
+
+    def __init__(self, field: str):
+        super().__init__(f"{field} sudah terdaftar")
+        self.field = field
+
+def _duplicate_field(error: IntegrityError) -> Optional[str]:
+    message = str(error.orig)
+    for constraint, field in UNIQUE_USER_CONSTRAINTS.items():
+        if constraint in message:
+            return field
+    # SQLite melaporkan kolom, bukan nama constraint, untuk UNIQUE biasa
+    if "users.email" in message:
+        return "email"
+    return None
+
+async def _commit_user(db: AsyncSession):
+    # Keunikan dicek oleh index di database dalam statement yang sama (tanpa SELECT terlebih dulu),
+    # sehingga tidak ada celah race antara cek dan INSERT/UPDATE
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        field = _duplicate_field(e)
+        if field is None:
+            raise
+        raise DuplicateUserError(field) from e
+
+
 # User Repository Class
 class UserRepo():
     @staticmethod
-    def insert(db: Session, user_model: Users):
+    async def insert(db: AsyncSession, user_model: Users):
+        """INSERT satu statement; DuplicateUserError jika email/nama sudah dipakai."""
         db.add(user_model)
-        db.commit()
-        db.refresh(user_model)
+        # id dan default kolom sudah terisi setelah INSERT; tanpa refresh (SELECT ulang)
+        await _commit_user(db)
 
     @staticmethod
-    def find_by_id(db: Session, model_class: type[Generic[T]], user_id: int): # FIX: Fungsi find by ID
-        return db.query(model_class).filter(model_class.id_user == user_id).first()
+    async def find_by_id(db: AsyncSession, model_class: type[Generic[T]], user_id: int): # FIX: Fungsi find by ID
+        result = await db.execute(select(model_class).filter(model_class.id_user == user_id))
+        return result.scalars().first()
 
     @staticmethod
-    def find_by_email(db: Session, model_class: type[Generic[T]], email: str):
-        return db.query(model_class).filter(model_class.email == email).first()
+    async def find_by_email(db: AsyncSession, model_class: type[Generic[T]], email: str):
+        result = await db.execute(select(model_class).filter(func.lower(model_class.email) == email.lower()))
+        return result.scalars().first()
     
     @staticmethod
-    def find_by_nama(db: Session, model_class: type[Generic[T]], nama: str):
-        return db.query(model_class).filter(model_class.nama == nama).first()
+    async def find_by_nama(db: AsyncSession, model_class: type[Generic[T]], nama: str):
+        result = await db.execute(select(model_class).filter(func.lower(model_class.nama) == nama.lower()))
+        return result.scalars().first()
 
     @staticmethod
-    def is_email_exist(db: Session, model_class: type[Generic[T]], email: str) -> bool:
-        return db.query(model_class).filter(model_class.email == email).first() is not None
+    async def is_email_exist(db: AsyncSession, model_class: type[Generic[T]], email: str) -> bool:
+        return await UserRepo.find_by_email(db, model_class, email) is not None
 
     @staticmethod
-    def is_nama_exist(db: Session, model_class: type[Generic[T]], nama: str) -> bool:
-        return db.query(model_class).filter(model_class.nama == nama).first() is not None
-    
+    async def is_nama_exist(db: AsyncSession, model_class: type[Generic[T]], nama: str) -> bool:
+        return await UserRepo.find_by_nama(db, model_class, nama) is not None
+
+    @staticmethod
+    async def count_by_image(db: AsyncSession, model_class: type[Generic[T]], image: str) -> int:
+        result = await db.execute(select(func.count()).select_from(model_class).filter(model_class.image == image))
+        return result.scalar_one()
+
     # FIX: Fungsi untuk update user
     @staticmethod
-    def update_user(db: Session, user: Users, update_data: Dict[str, Any]) -> Users:
+    async def update_user(db: AsyncSession, user: Users, update_data: Dict[str, Any]) -> Users:
+        """
+        UPDATE satu statement; DuplicateUserError jika email/nama baru sudah dipakai.
+        Entri cache get_current_user untuk email lama dan baru dihapus (juga di worker lain
+        lewat NOTIFY jika USER_CACHE_NOTIFY_CHANNEL diisi).
+        """
+        subjects = {user.email.lower()}
         for key, value in update_data.items():
             setattr(user, key, value)
+        subjects.add(user.email.lower())
         user.update_date = datetime.utcnow() # Update timestamp
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        if USER_CACHE_NOTIFY_CHANNEL and db.bind.dialect.name == "postgresql":
+            # Dikirim saat transaksi di-commit, jadi worker lain tidak membaca data sebelum UPDATE
+            for subject in subjects:
+                await db.execute(select(func.pg_notify(USER_CACHE_NOTIFY_CHANNEL, subject)))
+        await _commit_user(db)
+        user_cache.invalidate(*subjects)
         return user
 
+    @staticmethod
+    async def update_password(db: AsyncSession, user: Users, hashed: str):
+        """Mengganti hash password (mis. rehash saat login) tanpa mengubah update_date profil."""
+        await db.execute(update(Users).where(Users.id_user == user.id_user).values(password=hashed))
+        await db.commit()
+        user.password = hashed
+        user_cache.invalidate(user.email.lower())
+
+
+# Password Repository Class
+class PasswordRepo():
+    # min_rounds = max_rounds = BCRYPT_ROUNDS: hash dengan cost lain dianggap perlu diperbarui
+    pwd_context = CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
+    @staticmethod
+    async def hash(password: str) -> str:
+        """Hash bcrypt di password_executor (tidak menahan event loop)."""
+        return await password_executor.run(PasswordRepo.pwd_context.hash, password)
+
+    @staticmethod
+    async def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifikasi password di password_executor. Mengembalikan (valid, hash_baru); hash_baru
+        terisi jika password benar tetapi hash lama dibuat dengan cost selain BCRYPT_ROUNDS.
+        """
+        return await password_executor.run(PasswordRepo.pwd_context.verify_and_update, password, hashed)
+
 
 # JWT Repository Class
 class JWTRepo():
@@ -74,7 +171,7 @@ class JWTRepo():
 # Dependency untuk mendapatkan user saat ini dari token JWT
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Users:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -88,9 +185,7 @@ async def get_current_user(
         username_or_email_from_token: str = payload.get("sub")
         expire_timestamp = payload.get("exp")
         
-        logger.info(f"Token dekode sukses. Payload: {payload}")
-        logger.info(f"Subject (nama/email) dari token: {username_or_email_from_token}")
-        logger.info(f"Waktu kedaluwarsa token (Unix timestamp): {expire_timestamp}")
+        logger.debug("Token dekode sukses. Payload: %s", payload)
 
         if username_or_email_from_token is None:
             logger.warning("Subject (nama/email) tidak ditemukan di payload token.")
@@ -102,9 +197,6 @@ async def get_current_user(
         
         token_expiry_datetime = datetime.fromtimestamp(expire_timestamp)
         current_utc_datetime = datetime.utcnow()
-        
-        logger.info(f"Waktu kedaluwarsa token (UTC): {token_expiry_datetime}")
-        logger.info(f"Waktu saat ini (UTC): {current_utc_datetime}")
 
         if token_expiry_datetime < current_utc_datetime:
             logger.warning("Token telah kedaluwarsa.")
@@ -127,11 +219,22 @@ async def get_current_user(
         logger.error(f"Terjadi kesalahan tak terduga saat memvalidasi token: {e}", exc_info=True)
         raise credentials_exception
 
-    user = UserRepo.find_by_email(db, Users, username_or_email_from_token)
+    # User dari cache tidak butuh query; instance-nya detached dan dipasang ke session saat diupdate
+    lookup_start = time.perf_counter()
+    subject = username_or_email_from_token.lower()
+    user = user_cache.get(subject)
+    if user is not None:
+        metrics.AUTH_LOOKUP.observe_since(lookup_start)
+        return user
+
+    generation = user_cache.generation()
+    user = await UserRepo.find_by_email(db, Users, username_or_email_from_token)
     
     if user is None:
         logger.warning(f"User '{username_or_email_from_token}' dari token tidak ditemukan di database.")
         raise credentials_exception
 
-    logger.info(f"User '{user.nama}' berhasil diautentikasi.")
+    user_cache.put(subject, user, generation)
+    metrics.AUTH_LOOKUP.observe_since(lookup_start)
+    logger.info("User '%s' berhasil diautentikasi.", user.nama)
     return user
\ No newline at end of file
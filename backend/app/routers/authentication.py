@@ -1,18 +1,18 @@
 # app/routers/authentication.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.responses import JSONResponse
 from pydantic_core import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from config import get_db, ACCESS_TOKEN_EXPIRE_MINUTES
-from passlib.context import CryptContext
-from app.repository.users import UserRepo, JWTRepo, get_current_user
+from app.storage.blob_store import profile_store
+from app.storage.derivatives import derivative_queue, derivative_urls
+from app.storage.ingest import ingest_upload, upload_openapi
+from app.repository.users import UserRepo, JWTRepo, PasswordRepo, DuplicateUserError, get_current_user
 from app.models.users import Users 
 from app.schemas.users import ResponseSchema, TokenResponse, Register, Login, UserDetailResponse, UserUpdate 
 import logging
 import traceback
 from datetime import timedelta
-import os
-import uuid 
 
 logger = logging.getLogger(__name__)
 
@@ -20,31 +20,30 @@ router = APIRouter(
     tags=["Authentication"], # Tetap pertahankan tags untuk dokumentasi Swagger/OpenAPI
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 IMAGE_BASE_URL = "http://192.168.196.187:8000/uploads" # Ganti dengan IP server Anda
+PROFILE_IMAGE_BASE_URL = f"{IMAGE_BASE_URL}/profile_pictures"
 
 
 @router.post("/register", response_model=ResponseSchema)
-async def register(request: Register, db: Session = Depends(get_db)):
+async def register(request: Register, db: AsyncSession = Depends(get_db)):
     try:
         logger.info(f"Menerima permintaan registrasi untuk email: {request.email}, nama: {request.nama}")
 
-        if UserRepo.is_email_exist(db, Users, request.email):
-            logger.warning(f"Percobaan registrasi dengan email yang sudah terdaftar: {request.email}")
-            return ResponseSchema(code="400", status="Bad Request", message="Email sudah terdaftar").dict(exclude_none=True)
-
-        if UserRepo.is_nama_exist(db, Users, request.nama):
-            logger.warning(f"Percobaan registrasi dengan nama pengguna yang sudah terdaftar: {request.nama}")
-            return ResponseSchema(code="400", status="Bad Request", message="Nama pengguna sudah terdaftar").dict(exclude_none=True)
-
         _user = Users(
             nama = request.nama,
             email = request.email,
-            password = pwd_context.hash(request.password),
+            password = await PasswordRepo.hash(request.password),
         )
 
-        UserRepo.insert(db, _user)
+        # Email/nama yang sudah terdaftar ditolak oleh index unik saat INSERT
+        try:
+            await UserRepo.insert(db, _user)
+        except DuplicateUserError as e:
+            if e.field == "email":
+                logger.warning(f"Percobaan registrasi dengan email yang sudah terdaftar: {request.email}")
+                return ResponseSchema(code="400", status="Bad Request", message="Email sudah terdaftar").dict(exclude_none=True)
+            logger.warning(f"Percobaan registrasi dengan nama pengguna yang sudah terdaftar: {request.nama}")
+            return ResponseSchema(code="400", status="Bad Request", message="Nama pengguna sudah terdaftar").dict(exclude_none=True)
         logger.info(f"User '{request.nama}' berhasil terdaftar dengan ID: {_user.id_user}.")
 
         return ResponseSchema(
@@ -70,20 +69,29 @@ async def register(request: Register, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=ResponseSchema)
-async def login(request: Login, db:Session = Depends(get_db)):
+async def login(request: Login, db:AsyncSession = Depends(get_db)):
     try:
         logger.info(f"Mencoba login untuk email: {request.email}")
 
-        _user = UserRepo.find_by_email(db, Users, request.email)
+        _user = await UserRepo.find_by_email(db, Users, request.email)
 
         if not _user:
             logger.warning(f"Percobaan login gagal: Email '{request.email}' tidak ditemukan.")
             return ResponseSchema(code="404", status="Not Found", message="Email tidak ditemukan").dict(exclude_none=True)
 
-        if not pwd_context.verify(request.password, _user.password):
+        valid, new_hash = await PasswordRepo.verify_and_update(request.password, _user.password)
+        if not valid:
             logger.warning(f"Percobaan login gagal: Password salah untuk email '{request.email}'.")
             return ResponseSchema(code="400", status="Bad Request", message="Invalid Password").dict(exclude_none=True)
 
+        if new_hash:
+            # Cost bcrypt berubah (BCRYPT_ROUNDS): simpan hash baru; kegagalan tidak menggagalkan login
+            try:
+                await UserRepo.update_password(db, _user, new_hash)
+                logger.info(f"Hash password user '{_user.email}' diperbarui ke cost bcrypt yang baru.")
+            except Exception as e:
+                logger.error(f"Gagal memperbarui hash password user '{_user.email}': {e}")
+
         token = JWTRepo.generate_token(data={ 'sub': _user.email }, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
 
         logger.info(f"Login user '{_user.email}' berhasil, token dihasilkan.")
@@ -103,6 +111,7 @@ async def login(request: Login, db:Session = Depends(get_db)):
                 nama=_user.nama,
                 email=_user.email,
                 image=profile_image_full_url,
+                **derivative_urls(PROFILE_IMAGE_BASE_URL, _user.image),
             )
         ).dict(exclude_none=True)
     except Exception as e:
@@ -124,6 +133,7 @@ async def read_users_me(current_user: Users = Depends(get_current_user)):
         nama=current_user.nama,
         email=current_user.email,
         image=profile_image_full_url,
+        **derivative_urls(PROFILE_IMAGE_BASE_URL, current_user.image),
         create_date=current_user.create_date,
         update_date=current_user.update_date
     )
@@ -138,28 +148,21 @@ async def read_users_me(current_user: Users = Depends(get_current_user)):
 @router.put("/me", response_model=ResponseSchema)
 async def update_users_me(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Users = Depends(get_current_user)
 ):
     logger.info(f"User '{current_user.nama}' (ID: {current_user.id_user}) mencoba mengupdate profil.")
 
     update_data = user_update.model_dump(exclude_unset=True)
 
-    if "email" in update_data and update_data["email"] != current_user.email:
-        if UserRepo.is_email_exist(db, Users, update_data["email"]):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email sudah terdaftar."
-            )
-
-    if "nama" in update_data and update_data["nama"] != current_user.nama:
-        if UserRepo.is_nama_exist(db, Users, update_data["nama"]):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Nama pengguna sudah digunakan."
-            )
-
-    updated_user = UserRepo.update_user(db, current_user, update_data)
+    # Email/nama yang sudah dipakai user lain ditolak oleh index unik saat UPDATE
+    try:
+        updated_user = await UserRepo.update_user(db, current_user, update_data)
+    except DuplicateUserError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email sudah terdaftar." if e.field == "email" else "Nama pengguna sudah digunakan."
+        )
 
     return ResponseSchema(
         code="200",
@@ -170,58 +173,61 @@ async def update_users_me(
             nama=updated_user.nama,
             email=updated_user.email,
             image=f"{IMAGE_BASE_URL}/profile_pictures/{updated_user.image}" if updated_user.image else None,
+            **derivative_urls(PROFILE_IMAGE_BASE_URL, updated_user.image),
             create_date=updated_user.create_date,
             update_date=updated_user.update_date
         )
     ).dict(exclude_none=True)
 
-@router.post("/upload_profile_picture", response_model=ResponseSchema)
+@router.post(
+    "/upload_profile_picture",
+    response_model=ResponseSchema,
+    openapi_extra=upload_openapi("file", "File gambar untuk foto profil"),
+)
 async def upload_profile_picture(
-    file: UploadFile = File(..., description="File gambar untuk foto profil"),
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user: Users = Depends(get_current_user)
 ):
     logger.info(f"User '{current_user.nama}' (ID: {current_user.id_user}) mencoba mengunggah foto profil.")
 
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, 
-            detail="File harus berupa gambar (jpg, png, dll)."
-        )
+    # Body dibaca streaming: ukuran & format dicek per chunk, file disimpan content-addressed
+    upload = await ingest_upload(request, profile_store, max_bytes=5 * 1024 * 1024)
+    previous_image = current_user.image
 
-    contents = await file.read() 
-    if len(contents) > 5 * 1024 * 1024: 
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="Ukuran file terlalu besar. Maksimal 5MB."
-        )
-
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"profile_{current_user.id_user}_{uuid.uuid4().hex[:8]}{file_extension}"
-
-    upload_dir = "uploads/profile_pictures" 
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, unique_filename)
+    async def count_references(key: str) -> int:
+        return await UserRepo.count_by_image(db, Users, key)
 
     try:
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        logger.info(f"Foto profil disimpan: {file_path}")
+        logger.info(f"Foto profil disimpan: {upload.path}")
+
+        await UserRepo.update_user(db, current_user, {"image": upload.key})
 
-        UserRepo.update_user(db, current_user, {"image": unique_filename})
+        # Foto lama dihapus jika tidak dipakai user lain
+        if previous_image and previous_image != upload.key:
+            try:
+                await profile_store.release(previous_image, count_references)
+            except Exception as cleanup_e:
+                logger.error(f"Gagal membersihkan foto profil lama {previous_image}: {cleanup_e}")
 
-        full_image_url = f"{IMAGE_BASE_URL}/profile_pictures/{unique_filename}"
+        derivative_queue.submit(profile_store, upload.key)
+        full_image_url = f"{IMAGE_BASE_URL}/profile_pictures/{upload.key}"
 
         return ResponseSchema(
             code="200",
             status="ok",
             message="Foto profil berhasil diunggah.",
-            result={"profile_picture_url": full_image_url}
+            result={
+                "profile_picture_url": full_image_url,
+                **derivative_urls(PROFILE_IMAGE_BASE_URL, upload.key),
+            }
         ).dict(exclude_none=True)
     except Exception as e:
         logger.error(f"Gagal mengunggah atau menyimpan foto profil: {e}", exc_info=True)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        try:
+            await profile_store.release(upload.key, count_references, upload.created_mtime_ns)
+        except Exception as cleanup_e:
+            logger.error(f"Gagal membersihkan file {upload.path}: {cleanup_e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Terjadi kesalahan server saat mengunggah foto profil: {str(e)}"
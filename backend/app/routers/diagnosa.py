@@ -1,41 +1,64 @@
 # app/routers/diagnosa.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status, Response
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from app.machine_learning import model_loader, predictor
+from fastapi import APIRouter, HTTPException, Depends, status, Response, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.machine_learning import model_loader, predictor, worker_pool
 from app.schemas import diagnosa as diagnosa_schema
 from app.repository import diagnosa as diagnosa_repo
 from app.repository.users import get_current_user # Asumsi ini ada dan berfungsi
 from app.models.users import Users # Asumsi ini ada
 from app.models import diagnosa as diagnosa_model # Asumsi ini diimport untuk type hinting atau relasi
-from config import get_db
-import os
+from app.executors import cpu_executor
+from app.storage.blob_store import diagnosa_store
+from app.storage.derivatives import derivative_queue, derivative_urls
+from app.storage.ingest import IngestedUpload, ingest_upload, ingest_uploads, upload_openapi
+from config import get_db, async_session, EXPORT_CHUNK_SIZE, BATCH_PREDICT_MAX_FILES, BATCH_PREDICT_MAX_BYTES
+import asyncio
 import logging
-from datetime import datetime, date
-import uuid
+from datetime import date
 from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/diagnosa", tags=["Diagnosa"])
 
-# Global variable untuk track model loading status
-models_loaded = False
+# Task background pemuatan model (disimpan agar tidak di-garbage-collect)
+model_loading_task = None
 
 async def load_models_on_startup():
-    """Memuat model ML saat aplikasi startup."""
-    global models_loaded
+    """
+    Memuat model ML lalu menjalankan warm-up inferensi.
+    Status dan progresnya dilaporkan lewat model_loader.load_state (endpoint readiness).
+    """
     try:
         logger.info("Memuat model ML...")
-        model_loader.load_models()
-        models_loaded = True
+        if worker_pool.is_enabled():
+            # Model dimuat (dan di-warm-up) di masing-masing proses worker, bukan di proses HTTP
+            model_loader.set_load_state("loading", 0.1, "Menjalankan worker inferensi")
+            await cpu_executor.run(worker_pool.start_pool)
+        else:
+            await cpu_executor.run(model_loader.load_models)
+        await cpu_executor.run(model_loader.get_model_version)
+        predictor.inference_scheduler.start()
+
+        model_loader.set_load_state("warming_up", 0.9, "Menjalankan inferensi warm-up")
+        await cpu_executor.run(predictor.warm_up)
+
+        model_loader.set_load_state("ready", 1.0, "Model siap")
         logger.info("Model berhasil dimuat!")
     except Exception as e:
         logger.error(f"Gagal memuat model: {str(e)}", exc_info=True)
-        models_loaded = False
-        
+        model_loader.set_load_state("failed", model_loader.load_state["progress"], "Gagal memuat model", error=str(e))
+
+def start_model_loading():
+    """Menjadwalkan pemuatan model di background agar aplikasi langsung bisa melayani request."""
+    global model_loading_task
+    if model_loading_task is None or model_loading_task.done():
+        model_loading_task = asyncio.create_task(load_models_on_startup())
+    return model_loading_task
+
 def check_models_loaded():
     """Dependency untuk memastikan model ML sudah dimuat."""
-    if not models_loaded:
+    if not model_loader.is_ready():
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
             detail="Model ML belum dimuat. Silakan coba beberapa saat lagi."
@@ -44,60 +67,58 @@ def check_models_loaded():
 # Base URL untuk gambar yang diunggah - PENTING: Sesuaikan dengan IP/domain server Anda
 IMAGE_BASE_URL = "http://192.168.196.187:8000/uploads" # Ganti dengan IP server Anda
 
-@router.post("/predict", response_model=diagnosa_schema.DiagnosaResponse, status_code=status.HTTP_201_CREATED)
+# Batas item per halaman /historiku/
+HISTORY_MAX_LIMIT = 100
+
+# Ukuran maksimum satu gambar untuk prediksi (juga per gambar pada /predict/batch)
+PREDICT_MAX_BYTES = 10 * 1024 * 1024
+
+@router.post(
+    "/predict",
+    response_model=diagnosa_schema.DiagnosaResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=upload_openapi("file", "File gambar untuk prediksi penyakit daun"),
+)
 async def predict_disease(
-    file: UploadFile = File(..., description="File gambar untuk prediksi penyakit daun"),
-    db: Session = Depends(get_db),
+    request: Request,
+    preprocess: Optional[str] = Query(None, description="Engine preprocessing: fast atau legacy (default dari konfigurasi)"),
+    db: AsyncSession = Depends(get_db),
     current_user: Users = Depends(get_current_user), # Ini membutuhkan user yang terautentikasi
     _: None = Depends(check_models_loaded) # Pastikan model sudah dimuat
 ):
-    file_path = None
+    upload = None
     try:
-        logger.info(f"User '{current_user.nama}' (ID: {current_user.id_user}) mencoba memprediksi gambar.")
+        logger.debug("User '%s' (ID: %s) mencoba memprediksi gambar.", current_user.nama, current_user.id_user)
 
-        if not file.content_type or not file.content_type.startswith('image/'):
+        if preprocess is not None and preprocess not in predictor.PREPROCESS_ENGINES:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, 
-                detail="File harus berupa gambar (jpg, png, dll)."
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Engine preprocessing tidak dikenal. Pilihan: {', '.join(predictor.PREPROCESS_ENGINES)}."
             )
         
-        contents = await file.read() 
+        # Body dibaca streaming: ukuran & format dicek per chunk, file disimpan content-addressed
+        upload = await ingest_upload(request, diagnosa_store, max_bytes=PREDICT_MAX_BYTES)
         
-        if len(contents) > 10 * 1024 * 1024:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Ukuran file terlalu besar. Maksimal 10MB."
-            )
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_id = uuid.uuid4().hex[:8]
-        file_extension = os.path.splitext(file.filename)[1] or '.png'
-        filename = f"diagnosa_{timestamp}_{unique_id}{file_extension}"
-        
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, filename)
-        
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        logger.debug("File gambar disimpan: %s", upload.path)
         
-        logger.info(f"File gambar disimpan: {file_path}")
-        
-        logger.info("Memulai prediksi...")
-        prediction_result = await predictor.predict_image(contents) 
+        logger.debug("Memulai prediksi...")
+        prediction_result = await predictor.predict_image(
+            upload.path, preprocess_engine=preprocess, content_hash=upload.content_hash
+        )
         
         diagnosa_data = diagnosa_schema.DiagnosaCreate(
             id_user=current_user.id_user, # PENTING: ID user dari objek current_user
             tanggal=date.today(),
             jenis_penyakit=prediction_result["nama_penyakit"],
-            image=filename,
+            image=upload.key,
             rekomendasi=prediction_result["rekomendasi"],
             kategori=prediction_result["kategori"].upper(),
             akurasi=prediction_result["akurasi"]
         )
         
-        saved_diagnosis = diagnosa_repo.create_diagnosa(db, diagnosa_data)
-        logger.info(f"Diagnosa berhasil disimpan untuk user ID: {saved_diagnosis.id_user} dengan ID Diagnosa: {saved_diagnosis.id_diagnosa}")
+        saved_diagnosis = await diagnosa_repo.create_diagnosa(db, diagnosa_data)
+        # Rendisi WebP untuk histori dibuat di background, respons tidak menunggu
+        derivative_queue.submit(diagnosa_store, saved_diagnosis.image)
         
         response_image_url = f"{IMAGE_BASE_URL}/{saved_diagnosis.image}"
         
@@ -111,84 +132,258 @@ async def predict_disease(
             kategori=saved_diagnosis.kategori.value,
             akurasi=saved_diagnosis.akurasi,
             create_date=saved_diagnosis.create_date,
-            update_date=saved_diagnosis.update_date
+            update_date=saved_diagnosis.update_date,
+            **derivative_urls(IMAGE_BASE_URL, saved_diagnosis.image)
         )
         
-        logger.info(f"Diagnosa berhasil disimpan dengan ID: {saved_diagnosis.id_diagnosa}")
+        logger.info("Diagnosa %s disimpan untuk user ID %s.", saved_diagnosis.id_diagnosa, saved_diagnosis.id_user)
         return response
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Terjadi kesalahan tak terduga dalam prediksi: {str(e)}", exc_info=True)
-        if file_path and os.path.exists(file_path): 
+        if upload is not None:
             try:
-                os.remove(file_path)
-                logger.info(f"File {file_path} berhasil dibersihkan.")
+                await diagnosa_store.release(
+                    upload.key, lambda key: diagnosa_repo.count_diagnosa_by_image(db, key), upload.created_mtime_ns
+                )
             except Exception as cleanup_e:
-                logger.error(f"Gagal membersihkan file {file_path}: {cleanup_e}")
+                logger.error(f"Gagal membersihkan file {upload.path}: {cleanup_e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f"Terjadi kesalahan internal server: {str(e)}"
         )
 
+@router.post(
+    "/predict/batch",
+    response_model=diagnosa_schema.BatchPredictResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=upload_openapi("files", "File gambar daun (boleh lebih dari satu) atau arsip zip berisi gambar", multiple=True),
+)
+async def predict_disease_batch(
+    request: Request,
+    response: Response,
+    preprocess: Optional[str] = Query(None, description="Engine preprocessing: fast atau legacy (default dari konfigurasi)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Users = Depends(get_current_user),
+    _: None = Depends(check_models_loaded)
+):
+    """
+    Prediksi banyak gambar dalam satu request (field "files", boleh berulang, atau arsip zip).
+    Gambar didecode paralel, diklasifikasikan sebagai batch CNN + SVM, dan semua diagnosa disimpan
+    dengan satu INSERT. Hasil dikembalikan per gambar sesuai urutan upload; gambar yang gagal
+    (bukan gambar, terlalu besar, gagal diproses) dilaporkan di item-nya tanpa menggagalkan yang lain.
+    Status 201 jika minimal satu diagnosa tersimpan, 422 jika semua gagal.
+    """
+    if preprocess is not None and preprocess not in predictor.PREPROCESS_ENGINES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Engine preprocessing tidak dikenal. Pilihan: {', '.join(predictor.PREPROCESS_ENGINES)}."
+        )
+
+    uploads = await ingest_uploads(
+        request, diagnosa_store, max_bytes=PREDICT_MAX_BYTES,
+        max_files=BATCH_PREDICT_MAX_FILES, max_total_bytes=BATCH_PREDICT_MAX_BYTES,
+    )
+    stored = [upload for upload in uploads if isinstance(upload, IngestedUpload)]
+    errors = {}  # index upload -> pesan error
+    saved = {}   # index upload -> baris diagnosa
+
+    async def count_references(key: str) -> int:
+        return await diagnosa_repo.count_diagnosa_by_image(db, key)
+
+    # Blob yang dibuat request ini -> mtime dari commit terakhir ke kunci itu (duplikat dalam batch
+    # memperbarui mtime), supaya bisa dibuang lewat discard_new tanpa menunggu jendela grace
+    created_mtimes = {}
+    for upload in stored:
+        if upload.created or upload.key in created_mtimes:
+            created_mtimes[upload.key] = upload.mtime_ns
+
+    async def discard(keys):
+        for key in keys:
+            try:
+                await diagnosa_store.release(key, count_references, created_mtimes.get(key))
+            except Exception as cleanup_e:
+                logger.error(f"Gagal membersihkan file {key}: {cleanup_e}")
+
+    try:
+        predictions = []
+        if stored:
+            predictions = await predictor.predict_images(
+                [upload.path for upload in stored], [upload.content_hash for upload in stored], preprocess_engine=preprocess
+            )
+        prediction_by_upload = dict(zip(map(id, stored), predictions))
+
+        creates, create_indexes = [], []
+        for index, upload in enumerate(uploads):
+            if not isinstance(upload, IngestedUpload):
+                errors[index] = upload.detail
+                continue
+            prediction = prediction_by_upload[id(upload)]
+            if isinstance(prediction, Exception):
+                errors[index] = str(prediction)
+                continue
+            try:
+                creates.append(diagnosa_schema.DiagnosaCreate(
+                    id_user=current_user.id_user,
+                    tanggal=date.today(),
+                    jenis_penyakit=prediction["nama_penyakit"],
+                    image=upload.key,
+                    rekomendasi=prediction["rekomendasi"],
+                    kategori=prediction["kategori"].upper(),
+                    akurasi=prediction["akurasi"]
+                ))
+                create_indexes.append(index)
+            except ValueError as e:
+                errors[index] = str(e)
+
+        rows = await diagnosa_repo.create_diagnosa_bulk(db, creates)
+        saved = dict(zip(create_indexes, rows))
+    except Exception as e:
+        logger.error(f"Terjadi kesalahan tak terduga dalam prediksi batch: {str(e)}", exc_info=True)
+        await discard({upload.key for upload in stored})
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Terjadi kesalahan internal server: {str(e)}"
+        )
+
+    # Blob yang dibuat request ini tetapi tidak menghasilkan diagnosa dihapus, kecuali sudah direferensikan
+    # diagnosa lain atau upload lain sudah di-dedupe ke file yang sama. Blob lama yang hanya di-dedupe
+    # dibiarkan (penghapusannya mengikuti jendela grace BlobStore.delete).
+    saved_keys = {row.image for row in saved.values()}
+    await discard({upload.key for upload in stored} - saved_keys)
+    for key in saved_keys:
+        derivative_queue.submit(diagnosa_store, key)
+
+    items = []
+    for index, upload in enumerate(uploads):
+        filename = upload.original_filename if isinstance(upload, IngestedUpload) else upload.filename
+        row = saved.get(index)
+        if row is not None:
+            items.append(diagnosa_schema.BatchPredictItem(
+                index=index, filename=filename, status="ok",
+                diagnosa=diagnosa_schema.DiagnosaResponse(**diagnosa_schema.diagnosa_row_dict(row, IMAGE_BASE_URL)),
+            ))
+        else:
+            items.append(diagnosa_schema.BatchPredictItem(index=index, filename=filename, status="error", error=errors.get(index)))
+
+    if not saved:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    logger.info(
+        "Prediksi batch user ID %s: %s diagnosa disimpan, %s gagal.", current_user.id_user, len(saved), len(uploads) - len(saved)
+    )
+    return diagnosa_schema.BatchPredictResponse(
+        total=len(uploads), berhasil=len(saved), gagal=len(uploads) - len(saved), items=items
+    )
+
+EXPORT_FORMATS = ("json", "ndjson")
+
 @router.get("/all/", response_model=List[diagnosa_schema.DiagnosaResponse])
-async def get_all_diagnoses(db: Session = Depends(get_db)):
-    """Mengambil semua record diagnosa dari database (ADMIN ONLY, or for specific use cases)."""
-    diagnoses_from_db = diagnosa_repo.get_all_diagnosa(db) 
-    
-    diagnoses_for_response = []
-    for diag_db_obj in diagnoses_from_db:
-        diagnoses_for_response.append(diagnosa_schema.DiagnosaResponse(
-            id_diagnosa=diag_db_obj.id_diagnosa,
-            id_user=diag_db_obj.id_user,
-            tanggal=diag_db_obj.tanggal,
-            jenis_penyakit=diag_db_obj.jenis_penyakit,
-            image=f"{IMAGE_BASE_URL}/{diag_db_obj.image}", 
-            rekomendasi=diag_db_obj.rekomendasi,
-            kategori=diag_db_obj.kategori.value, 
-            akurasi=diag_db_obj.akurasi,
-            create_date=diag_db_obj.create_date,
-            update_date=diag_db_obj.update_date
-        ))
-    
-    return diagnoses_for_response
+async def get_all_diagnoses(
+    request: Request,
+    export_format: Optional[str] = Query(None, alias="format", description="json (array, default) atau ndjson (satu objek per baris)"),
+    id_user: Optional[int] = Query(None),
+    kategori: Optional[str] = Query(None, description="SEHAT, KERITING atau KUNING"),
+    jenis_penyakit: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None, description="Tanggal diagnosa mulai (inklusif)"),
+    date_to: Optional[date] = Query(None, description="Tanggal diagnosa sampai (inklusif)"),
+):
+    """
+    Mengambil semua record diagnosa dari database (ADMIN ONLY, or for specific use cases).
+    Hasil di-stream per potongan EXPORT_CHUNK_SIZE baris (server-side cursor), sebagai array JSON
+    atau NDJSON (?format=ndjson atau Accept: application/x-ndjson), sehingga memori tetap datar
+    dan byte pertama langsung terkirim.
+    """
+    if export_format is None:
+        export_format = "ndjson" if "application/x-ndjson" in request.headers.get("accept", "") else "json"
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Format tidak dikenal. Pilihan: {', '.join(EXPORT_FORMATS)}."
+        )
+    kategori_filter = None
+    if kategori is not None:
+        try:
+            kategori_filter = diagnosa_model.KondisiDaun(kategori.upper())
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Kategori tidak dikenal.")
+
+    filters = dict(
+        id_user=id_user, kategori=kategori_filter, jenis_penyakit=jenis_penyakit,
+        date_from=date_from, date_to=date_to,
+    )
+    media_type = "application/x-ndjson" if export_format == "ndjson" else "application/json"
+    return StreamingResponse(_stream_diagnoses(export_format, filters), media_type=media_type)
+
+async def _stream_diagnoses(export_format: str, filters: dict):
+    # Session sendiri: dependency get_db sudah ditutup sebelum body StreamingResponse dikirim
+    ndjson = export_format == "ndjson"
+    first = True
+    exported = 0
+    if not ndjson:
+        yield b"["
+    try:
+        async with async_session() as db:
+            async for chunk in diagnosa_repo.stream_diagnosa(db, EXPORT_CHUNK_SIZE, **filters):
+                rows = diagnosa_schema.dump_diagnosa_items(chunk, IMAGE_BASE_URL)
+                exported += len(rows)
+                if ndjson:
+                    yield b"\n".join(rows) + b"\n"
+                else:
+                    yield (b"" if first else b",") + b",".join(rows)
+                first = False
+    except Exception as e:
+        # Status 200 sudah terkirim; respons berhenti di tengah (array JSON tidak ditutup)
+        logger.error(f"Export diagnosa terhenti setelah {exported} baris: {str(e)}", exc_info=True)
+        raise
+    if not ndjson:
+        yield b"]"
+    logger.info(f"Export diagnosa selesai: {exported} baris ({export_format}).")
 
 # FIX UTAMA: Endpoint untuk histori khusus user yang login DENGAN PAGINATION
 @router.get("/historiku/", response_model=List[diagnosa_schema.DiagnosaResponse]) 
 async def get_my_diagnoses(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Users = Depends(get_current_user), # Membutuhkan user terautentikasi
-    skip: int = 0, # FIX: Parameter untuk offset/skip
-    limit: int = 10 # FIX: Parameter untuk limit data per halaman
+    skip: int = Query(0, ge=0), # FIX: Parameter untuk offset/skip (mode lama)
+    limit: int = Query(10, ge=1, le=HISTORY_MAX_LIMIT), # FIX: Parameter untuk limit data per halaman
+    cursor: Optional[str] = Query(None, description="Cursor dari header X-Next-Cursor halaman sebelumnya (keyset pagination)")
 ):
-    """Mengambil record diagnosa untuk user yang sedang login dengan pagination."""
-    logger.info(f"Endpoint /historiku/ diakses oleh User ID: {current_user.id_user}, Nama: {current_user.nama} (skip={skip}, limit={limit})")
-    # FIX: Panggil fungsi repository yang mendapatkan diagnosa berdasarkan id_user dengan skip dan limit
-    diagnoses_from_db = diagnosa_repo.get_diagnosa_by_user(db, current_user.id_user, skip=skip, limit=limit) 
-    
-    diagnoses_for_response = []
-    for diag_db_obj in diagnoses_from_db:
-        diagnoses_for_response.append(diagnosa_schema.DiagnosaResponse(
-            id_diagnosa=diag_db_obj.id_diagnosa,
-            id_user=diag_db_obj.id_user,
-            tanggal=diag_db_obj.tanggal,
-            jenis_penyakit=diag_db_obj.jenis_penyakit,
-            image=f"{IMAGE_BASE_URL}/{diag_db_obj.image}", 
-            rekomendasi=diag_db_obj.rekomendasi,
-            kategori=diag_db_obj.kategori.value, 
-            akurasi=diag_db_obj.akurasi,
-            create_date=diag_db_obj.create_date,
-            update_date=diag_db_obj.update_date
-        ))
+    """
+    Mengambil record diagnosa untuk user yang sedang login, terbaru dulu.
+    Jika masih ada halaman berikutnya, header X-Next-Cursor berisi cursor untuk request berikutnya
+    (?cursor=...); mode skip/limit lama tetap didukung.
+    """
+    logger.debug("Endpoint /historiku/ diakses oleh User ID: %s (skip=%s, limit=%s, cursor=%s)", current_user.id_user, skip, limit, cursor is not None)
+    # Ambil satu baris lebih untuk mengetahui apakah masih ada halaman berikutnya
+    if cursor is not None:
+        try:
+            after = diagnosa_repo.decode_history_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        diagnoses_from_db = await diagnosa_repo.get_diagnosa_by_user_after(db, current_user.id_user, after, limit=limit + 1)
+    else:
+        # FIX: Panggil fungsi repository yang mendapatkan diagnosa berdasarkan id_user dengan skip dan limit
+        diagnoses_from_db = await diagnosa_repo.get_diagnosa_by_user(db, current_user.id_user, skip=skip, limit=limit + 1)
+
+    headers = {}
+    if len(diagnoses_from_db) > limit:
+        diagnoses_from_db = diagnoses_from_db[:limit]
+        headers["X-Next-Cursor"] = diagnosa_repo.encode_history_cursor(diagnoses_from_db[-1])
     
-    return diagnoses_for_response
+    # Jalur cepat: baris kolom -> orjson, tanpa DiagnosaResponse/response_model
+    return Response(
+        content=diagnosa_schema.dump_diagnosa_rows(diagnoses_from_db, IMAGE_BASE_URL),
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.get("/{id_diagnosa}", response_model=diagnosa_schema.DiagnosaResponse)
-async def get_diagnosa_by_id(id_diagnosa: int, db: Session = Depends(get_db)):
+async def get_diagnosa_by_id(id_diagnosa: int, db: AsyncSession = Depends(get_db)):
     """Mengambil satu record diagnosa berdasarkan ID."""
-    diagnosa_from_db = diagnosa_repo.get_diagnosa_by_id(db, id_diagnosa) 
+    diagnosa_from_db = await diagnosa_repo.get_diagnosa_by_id(db, id_diagnosa) 
     
     if not diagnosa_from_db:
         raise HTTPException(status_code=404, detail="Diagnosa tidak ditemukan.")
@@ -203,29 +398,26 @@ async def get_diagnosa_by_id(id_diagnosa: int, db: Session = Depends(get_db)):
         kategori=diagnosa_from_db.kategori.value, 
         akurasi=diagnosa_from_db.akurasi,
         create_date=diagnosa_from_db.create_date,
-        update_date=diagnosa_from_db.update_date
+        update_date=diagnosa_from_db.update_date,
+        **derivative_urls(IMAGE_BASE_URL, diagnosa_from_db.image)
     )
     
     return response_data
 
 @router.delete("/{id_diagnosa}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_diagnosa(id_diagnosa: int, db: Session = Depends(get_db)):
+async def delete_diagnosa(id_diagnosa: int, db: AsyncSession = Depends(get_db)):
     """Menghapus record diagnosa dan file gambar terkait dari server."""
-    diagnosa_to_delete = diagnosa_repo.get_diagnosa_by_id(db, id_diagnosa)
-    if not diagnosa_to_delete:
+    deleted = await diagnosa_repo.delete_diagnosa(db, id_diagnosa)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Diagnosa tidak ditemukan.")
     
-    success = diagnosa_repo.delete_diagnosa(db, id_diagnosa)
-    if not success:
-        raise HTTPException(status_code=500, detail="Gagal menghapus diagnosa dari database.")
+    image_key = deleted.image
 
-    if diagnosa_to_delete.image:
-        file_path = os.path.join("uploads", diagnosa_to_delete.image)
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                logger.info(f"File gambar '{file_path}' berhasil dihapus.")
-            except Exception as cleanup_e:
-                logger.error(f"Gagal membersihkan file {file_path}: {cleanup_e}")
+    # File gambar hanya dihapus jika tidak ada diagnosa lain dengan gambar (isi) yang sama
+    if image_key:
+        try:
+            await diagnosa_store.release(image_key, lambda key: diagnosa_repo.count_diagnosa_by_image(db, key))
+        except Exception as cleanup_e:
+            logger.error(f"Gagal membersihkan file {image_key}: {cleanup_e}")
     
     return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Diagnosa berhasil dihapus."})
\ No newline at end of file
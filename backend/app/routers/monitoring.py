@@ -0,0 +1,70 @@
+# app/routers/monitoring.py
+from fastapi import APIRouter
+from app.machine_learning import predictor, worker_pool
+from app.db_metrics import sql_metrics
+from app.executors import cpu_executor, io_executor, password_executor
+from app.logging_setup import dropped_records
+from app.repository.user_cache import user_cache
+from app.storage.derivatives import derivative_queue
+from config import LOG_FORMAT, LOG_LEVEL, LOG_TIMING_SAMPLE_RATE, async_engine
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/monitoring", tags=["Monitoring"])
+
+
+@router.get("/inference")
+async def inference_stats():
+    """Statistik scheduler inferensi: kedalaman antrian dan ukuran batch yang tercapai."""
+    stats = {"scheduler": predictor.inference_scheduler.stats()}
+    if worker_pool.pool is not None:
+        stats["worker_pool"] = worker_pool.pool.stats()
+    return stats
+
+
+@router.get("/executors")
+async def executor_stats():
+    """Statistik thread pool: pekerjaan menunggu, waktu antri dan waktu eksekusi (cpu, io, bcrypt)."""
+    return {executor.name: executor.stats() for executor in (cpu_executor, io_executor, password_executor)}
+
+
+@router.get("/cache")
+async def prediction_cache_stats():
+    """Statistik cache prediksi: hit, miss, eviction dan permintaan yang digabung."""
+    return predictor.prediction_cache.stats()
+
+
+@router.get("/derivatives")
+async def derivative_stats():
+    """Statistik antrian pembuatan rendisi WebP."""
+    return derivative_queue.stats()
+
+
+
+@router.get("/db")
+async def database_pool_stats():
+    """Statistik pool koneksi database: saturasi, waktu tunggu checkout dan timeout."""
+    return async_engine.pool.stats()
+
+
+@router.get("/sql")
+async def sql_stats():
+    """Statistik query per route: rata-rata jumlah query, waktu DB, statement berulang dan query terlambat."""
+    return sql_metrics.stats()
+
+
+@router.get("/user-cache")
+async def user_cache_stats():
+    """Statistik cache user terautentikasi (get_current_user): hit, miss dan invalidasi."""
+    return user_cache.stats()
+
+
+@router.get("/logging")
+async def logging_stats():
+    """Konfigurasi logging aktif dan jumlah record yang dibuang karena antrian penuh."""
+    return {
+        "level": LOG_LEVEL,
+        "format": LOG_FORMAT,
+        "timing_sample_rate": LOG_TIMING_SAMPLE_RATE,
+        "dropped_records": dropped_records(),
+    }
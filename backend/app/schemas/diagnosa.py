@@ -1,6 +1,9 @@
 from pydantic import BaseModel, validator
 from datetime import date, datetime
-from typing import Optional
+from typing import Iterable, List, Optional
+import orjson
+
+from app.storage.derivatives import derivative_urls
 
 class DiagnosaBase(BaseModel):
     # Base class untuk field umum
@@ -34,7 +37,52 @@ class DiagnosaResponse(DiagnosaBase):
     id_diagnosa: int # ID ini ada saat respons, tidak saat create
     create_date: datetime
     update_date: Optional[datetime] # Optional karena bisa null
+    image_small: Optional[str] = None # URL rendisi WebP kecil (~160px) untuk tile histori
+    image_medium: Optional[str] = None # URL rendisi WebP sedang (~480px)
 
     class Config:
         from_attributes = True # Dulu orm_mode = True
-        # Untuk Date dan DateTime, Pydantic 2.x dengan from_attributes=True sudah handle serialisasi/deserialisasi
\ No newline at end of file
+        # Untuk Date dan DateTime, Pydantic 2.x dengan from_attributes=True sudah handle serialisasi/deserialisasi
+
+class BatchPredictItem(BaseModel):
+    # Hasil per gambar pada /diagnosa/predict/batch; index mengikuti urutan file (isi zip diurutkan di tempatnya)
+    index: int
+    filename: Optional[str] = None
+    status: str # "ok" atau "error"
+    diagnosa: Optional[DiagnosaResponse] = None
+    error: Optional[str] = None
+
+class BatchPredictResponse(BaseModel):
+    total: int
+    berhasil: int
+    gagal: int
+    items: List[BatchPredictItem]
+
+
+# Jalur serialisasi cepat untuk endpoint daftar: baris hasil select kolom (bukan objek ORM)
+# langsung dijadikan JSON dengan orjson, tanpa membuat/memvalidasi DiagnosaResponse.
+# Data berasal dari database sendiri (sudah tervalidasi saat disimpan), jadi validasi dilewati.
+# Urutan key dan format nilai sama dengan DiagnosaResponse.model_dump_json().
+
+def diagnosa_row_dict(row, image_base_url: str) -> dict:
+    return {
+        "id_user": row.id_user,
+        "tanggal": row.tanggal,
+        "jenis_penyakit": row.jenis_penyakit,
+        "image": f"{image_base_url}/{row.image}",
+        "rekomendasi": row.rekomendasi,
+        "kategori": row.kategori.value,
+        "akurasi": row.akurasi,
+        "id_diagnosa": row.id_diagnosa,
+        "create_date": row.create_date,
+        "update_date": row.update_date,
+        **derivative_urls(image_base_url, row.image),
+    }
+
+def dump_diagnosa_rows(rows: Iterable, image_base_url: str) -> bytes:
+    """Array JSON dari baris diagnosa."""
+    return orjson.dumps([diagnosa_row_dict(row, image_base_url) for row in rows])
+
+def dump_diagnosa_items(rows: Iterable, image_base_url: str) -> list:
+    """Satu dokumen JSON (bytes) per baris, untuk streaming array/NDJSON."""
+    return [orjson.dumps(diagnosa_row_dict(row, image_base_url)) for row in rows]
@@ -28,6 +28,8 @@ class TokenResponse(BaseModel):
     nama: str 
     email: EmailStr 
     image: Optional[str] = None # FIX: Tambahkan image (nullable)
+    image_small: Optional[str] = None # Rendisi WebP kecil (~160px)
+    image_medium: Optional[str] = None # Rendisi WebP sedang (~480px)
 
 # FIX: Skema baru untuk detail user (digunakan oleh /me endpoint dan update)
 class UserDetailResponse(BaseModel):
@@ -35,6 +37,8 @@ class UserDetailResponse(BaseModel):
     nama: str
     email: EmailStr
     image: Optional[str] = None # URL foto profil
+    image_small: Optional[str] = None # Rendisi WebP kecil (~160px)
+    image_medium: Optional[str] = None # Rendisi WebP sedang (~480px)
     create_date: datetime
     update_date: datetime
 
@@ -52,7 +56,7 @@ class ResponseSchema(BaseModel, Generic[T]):
     code: str
     status: str
     message: str
-    result: Optional[T]
+    result: Optional[T] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,172 @@
+# app/storage/blob_store.py
+import glob
+import hashlib
+import logging
+import os
+import time
+import uuid
+from typing import NamedTuple, Optional
+
+from app.executors import io_executor
+
+logger = logging.getLogger(__name__)
+
+
+class CommittedBlob(NamedTuple):
+    """Hasil BlobStore.commit(): kunci blob, apakah file baru dibuat, dan mtime (ns) yang diset commit."""
+    key: str
+    created: bool
+    mtime_ns: int
+
+
+class BlobStore:
+    """
+    Penyimpanan file content-addressed: setiap blob disimpan di <root>/ab/cd/<sha256><ext>,
+    dengan ab/cd diambil dari awal hash. File dengan isi yang sama hanya disimpan sekali.
+    Kunci blob (path relatif terhadap root) yang disimpan di kolom image dan dipakai di URL.
+
+    Store tidak menyimpan jumlah referensi sendiri: pemanggil menghitung baris database yang
+    masih mereferensikan kunci (lihat release()), sehingga jumlahnya selalu konsisten dengan data.
+    """
+
+    TMP_DIR = ".tmp"
+
+    def __init__(self, root: str, delete_grace_seconds: float = 60.0):
+        self.root = root
+        # Blob yang baru ditulis/di-dedupe tidak dihapus dalam jendela ini, supaya upload yang
+        # sedang berjalan (file sudah ada, baris belum di-commit) tidak kehilangan file-nya.
+        self.delete_grace_seconds = delete_grace_seconds
+
+    @staticmethod
+    def key_for(content_hash: str, extension: str) -> str:
+        return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension.lower()}"
+
+    @staticmethod
+    def is_key(value: str) -> bool:
+        """True jika value adalah kunci blob (bukan nama file lama di folder datar)."""
+        return value.count("/") == 2
+
+    @staticmethod
+    def derivative_key(key: str, rendition: str) -> str:
+        """Kunci rendisi WebP dari sebuah blob, disimpan di samping aslinya: <stem>_<rendition>.webp."""
+        return f"{os.path.splitext(key)[0]}_{rendition}.webp"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _remove_derivatives(self, key: str):
+        stem = os.path.splitext(self.path_for(key))[0]
+        for path in glob.glob(f"{glob.escape(stem)}_*.webp"):
+            os.remove(path)
+
+    def temp_path(self) -> str:
+        """Path sementara di dalam root (filesystem yang sama), untuk dipindah atomik lewat commit()."""
+        return os.path.join(self.root, self.TMP_DIR, uuid.uuid4().hex)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path_for(key))
+
+    def commit(self, tmp_path: str, content_hash: str, extension: str) -> CommittedBlob:
+        """
+        Memindahkan file sementara ke lokasi content-addressed (blocking).
+        Jika blob dengan isi yang sama sudah ada, file sementara dibuang dan waktu modifikasi
+        blob diperbarui (menahan penghapusan selama delete_grace_seconds).
+        mtime yang diset dikembalikan supaya pemilik upload bisa membuang blob buatannya
+        sendiri lewat discard_new() tanpa menunggu jendela grace.
+        """
+        key = self.key_for(content_hash, extension)
+        path = self.path_for(key)
+        mtime_ns = time.time_ns()
+        if os.path.exists(path):
+            try:
+                os.utime(path, ns=(mtime_ns, mtime_ns))
+            except FileNotFoundError:
+                pass  # terhapus bersamaan, tulis ulang di bawah
+            else:
+                os.remove(tmp_path)
+                logger.debug("Blob %s sudah ada, upload di-dedupe.", key)
+                return CommittedBlob(key, False, mtime_ns)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp_path, path)
+        return CommittedBlob(key, True, mtime_ns)
+
+    def write(self, content: bytes, extension: str) -> str:
+        """Menyimpan konten bytes sebagai blob (blocking). Mengembalikan kuncinya."""
+        tmp_path = self.temp_path()
+        os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        return self.commit(tmp_path, hashlib.sha256(content).hexdigest(), extension).key
+
+    def delete(self, key: str) -> bool:
+        """Menghapus blob jika ada dan sudah melewati jendela grace (blocking)."""
+        path = self.path_for(key)
+        try:
+            if time.time() - os.path.getmtime(path) < self.delete_grace_seconds:
+                logger.info(f"Blob {key} baru saja ditulis, penghapusan dilewati.")
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        self._remove_derivatives(key)
+        logger.info(f"Blob {key} dihapus.")
+        return True
+
+    def discard_new(self, key: str, mtime_ns: int) -> bool:
+        """
+        Menghapus blob yang baru dibuat oleh commit() milik pemanggil, tanpa menunggu jendela grace
+        (blocking). Jika mtime sudah berubah, upload lain sudah di-dedupe ke file yang sama dan
+        blob dibiarkan.
+        """
+        path = self.path_for(key)
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                logger.info(f"Blob {key} dipakai upload lain, tidak dibuang.")
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        self._remove_derivatives(key)
+        logger.info(f"Blob {key} dibuang.")
+        return True
+
+    async def write_async(self, content: bytes, extension: str) -> str:
+        return await io_executor.run(self.write, content, extension)
+
+    async def commit_async(self, tmp_path: str, content_hash: str, extension: str) -> CommittedBlob:
+        return await io_executor.run(self.commit, tmp_path, content_hash, extension)
+
+    async def release(self, key: str, count_references, created_mtime_ns: Optional[int] = None) -> bool:
+        """
+        Menghapus blob jika tidak ada lagi baris yang mereferensikannya.
+        count_references(key) adalah coroutine function yang menghitung referensi di database
+        (dipanggil setelah baris pemilik dihapus/diubah dan di-commit).
+        created_mtime_ns diisi jika blob baru dibuat oleh request yang sama (lihat
+        IngestedUpload.created_mtime_ns): blob dibuang lewat discard_new() tanpa jendela grace.
+        """
+        if not key:
+            return False
+        references = await count_references(key)
+        if references > 0:
+            logger.info(f"Blob {key} masih direferensikan oleh {references} baris, tidak dihapus.")
+            return False
+        if not self.is_key(key):
+            # File lama di folder datar (belum dimigrasi) dimiliki satu baris saja
+            await io_executor.run(self._remove_derivatives, key)
+            return await io_executor.run(_remove_if_exists, self.path_for(key))
+        if created_mtime_ns is not None:
+            return await io_executor.run(self.discard_new, key, created_mtime_ns)
+        return await io_executor.run(self.delete, key)
+
+
+def _remove_if_exists(path: str) -> bool:
+    if os.path.exists(path):
+        os.remove(path)
+        return True
+    return False
+
+
+# Store untuk gambar diagnosa dan foto profil (di-serve lewat mount /uploads)
+diagnosa_store = BlobStore("uploads")
+profile_store = BlobStore(os.path.join("uploads", "profile_pictures"))
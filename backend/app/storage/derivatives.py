@@ -0,0 +1,202 @@
+# app/storage/derivatives.py
+"""
+Rendisi WebP (small & medium) untuk gambar diagnosa dan foto profil.
+Rendisi dibuat di background setelah upload (derivative_queue), dan untuk upload lama
+lewat perintah backfill.
+
+Pemakaian backfill (dari folder backend):
+    python -m app.storage.derivatives                # buat rendisi yang belum ada
+    python -m app.storage.derivatives --overwrite    # buat ulang semua rendisi
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from app.executors import cpu_executor
+from app.storage.blob_store import BlobStore
+from config import (
+    DERIVATIVE_SMALL_SIZE,
+    DERIVATIVE_MEDIUM_SIZE,
+    DERIVATIVE_WEBP_QUALITY,
+    DERIVATIVE_QUEUE_MAX_PENDING,
+    MAX_IMAGE_PIXELS,
+)
+
+logger = logging.getLogger(__name__)
+
+# nama rendisi -> sisi terpanjang (px)
+RENDITIONS = {"small": DERIVATIVE_SMALL_SIZE, "medium": DERIVATIVE_MEDIUM_SIZE}
+
+
+def render_derivatives(store: BlobStore, key: str, overwrite: bool = False) -> int:
+    """
+    Membuat rendisi WebP untuk satu blob (blocking). Gambar asli didecode sekali pada skala
+    terkecil yang cukup untuk rendisi terbesar, diputar sesuai EXIF, lalu diperkecil per rendisi.
+    Mengembalikan jumlah rendisi yang ditulis.
+    """
+    targets = [
+        (size, store.path_for(BlobStore.derivative_key(key, name)))
+        for name, size in RENDITIONS.items()
+    ]
+    if not overwrite:
+        targets = [(size, path) for size, path in targets if not os.path.exists(path)]
+    if not targets:
+        return 0
+
+    largest = max(size for size, _ in targets)
+    with Image.open(store.path_for(key)) as original:
+        width, height = original.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise ValueError(f"Dimensi gambar terlalu besar ({width}x{height}).")
+        original.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        for size, path in sorted(targets, reverse=True):
+            rendition = img.copy()
+            rendition.thumbnail((size, size), reducing_gap=2.0)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            rendition.save(tmp_path, "WEBP", quality=DERIVATIVE_WEBP_QUALITY, method=4)
+            os.replace(tmp_path, path)
+    return len(targets)
+
+
+def derivative_urls(base_url: str, key: Optional[str]) -> dict:
+    """
+    URL rendisi untuk field respons image_small/image_medium.
+    Rendisi dibuat asinkron, jadi klien sebaiknya jatuh ke URL asli jika rendisi belum tersedia.
+    """
+    if not key:
+        return {"image_small": None, "image_medium": None}
+    return {
+        f"image_{name}": f"{base_url}/{BlobStore.derivative_key(key, name)}"
+        for name in RENDITIONS
+    }
+
+
+class DerivativeQueue:
+    """
+    Antrian pembuatan rendisi di luar jalur request. Satu worker asyncio mengambil pekerjaan
+    dan menjalankannya di executor CPU; jika antrian penuh, pekerjaan dibuang (backfill bisa
+    melengkapinya nanti) agar upload tidak pernah tertahan.
+    """
+
+    def __init__(self, max_pending: int = DERIVATIVE_QUEUE_MAX_PENDING, executor=cpu_executor):
+        self.max_pending = max(1, max_pending)
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+
+        # Statistik
+        self.generated = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._worker is not None and not self._worker.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def submit(self, store: BlobStore, key: str) -> bool:
+        """Menjadwalkan pembuatan rendisi untuk key (tidak menunggu hasilnya)."""
+        if self._worker is None or self._worker.done():
+            self.start()
+        try:
+            self._queue.put_nowait((store, key))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Antrian rendisi penuh, rendisi untuk {key} dilewati.")
+            return False
+
+    async def _run(self):
+        while True:
+            store, key = await self._queue.get()
+            try:
+                written = await self.executor.run(render_derivatives, store, key)
+                self.generated += written
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Gagal membuat rendisi untuk {key}: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.max_pending,
+            "renditions": RENDITIONS,
+            "generated": self.generated,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+derivative_queue = DerivativeQueue()
+
+
+def backfill(db, model, store: BlobStore, overwrite: bool, workers: int) -> dict:
+    """Membuat rendisi untuk semua gambar yang direferensikan kolom image pada model."""
+    keys = [key for (key,) in db.query(model.image).filter(model.image.isnot(None)).distinct() if key]
+    stats = {"images": len(keys), "written": 0, "missing": 0, "failed": 0}
+
+    def run(key: str):
+        if not store.exists(key):
+            return "missing", 0
+        try:
+            return "ok", render_derivatives(store, key, overwrite=overwrite)
+        except Exception as e:
+            logger.error(f"{model.__tablename__}: gagal membuat rendisi {key}: {e}")
+            return "failed", 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for status, written in pool.map(run, keys):
+            if status == "ok":
+                stats["written"] += written
+            else:
+                stats[status] += 1
+    return stats
+
+
+def main(argv=None) -> int:
+    from app.models.diagnosa import Diagnosa
+    from app.models.users import Users
+    from app.storage.blob_store import diagnosa_store, profile_store
+    from config import sessionmaker
+
+    parser = argparse.ArgumentParser(description="Backfill rendisi WebP untuk gambar yang sudah diunggah.")
+    parser.add_argument("--overwrite", action="store_true", help="Buat ulang rendisi yang sudah ada.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    db = sessionmaker()
+    try:
+        for model, store in ((Diagnosa, diagnosa_store), (Users, profile_store)):
+            stats = backfill(db, model, store, args.overwrite, args.workers)
+            print(f"[{model.__tablename__}] {stats}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
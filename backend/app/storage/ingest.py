@@ -0,0 +1,598 @@
+# app/storage/ingest.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import zipfile
+from typing import List, Optional, Union
+
+from fastapi import HTTPException, Request, status
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app import metrics
+from app.executors import io_executor
+from app.storage.blob_store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+# Cadangan untuk boundary dan header multipart di luar isi file saat memeriksa Content-Length
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+# Jumlah byte awal yang dibutuhkan untuk mengenali format gambar
+SNIFF_BYTES = 12
+
+# (signature, ekstensi, content type)
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"GIF87a", ".gif", "image/gif"),
+    (b"GIF89a", ".gif", "image/gif"),
+    (b"BM", ".bmp", "image/bmp"),
+)
+
+
+def sniff_image_type(header: bytes):
+    """Mengenali format gambar dari byte awal file. Mengembalikan (ekstensi, content type) atau None."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    for signature, extension, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension, content_type
+    return None
+
+
+def upload_openapi(field_name: str, description: str, multiple: bool = False) -> dict:
+    """Skema requestBody multipart untuk endpoint yang membaca upload lewat ingest_upload/ingest_uploads."""
+    file_schema = {"type": "string", "format": "binary", "description": description}
+    if multiple:
+        file_schema = {"type": "array", "items": file_schema, "description": description}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": [field_name],
+                        "properties": {
+                            field_name: file_schema,
+                        },
+                    }
+                }
+            },
+        }
+    }
+
+
+class IngestedUpload:
+    """Hasil ingest: file sudah tersimpan di BlobStore (kunci dan path) beserta hash SHA-256 isinya."""
+
+    def __init__(self, key: str, path: str, size: int, content_hash: str,
+                 content_type: str, original_filename: Optional[str], created: bool = False, mtime_ns: int = 0):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+        self.content_type = content_type
+        self.original_filename = original_filename
+        # Dari BlobStore.commit(): file baru dibuat oleh upload ini atau di-dedupe, dan mtime yang diset
+        self.created = created
+        self.mtime_ns = mtime_ns
+
+    @property
+    def created_mtime_ns(self) -> Optional[int]:
+        """mtime blob jika dibuat oleh upload ini (untuk BlobStore.release saat request gagal), selain itu None."""
+        return self.mtime_ns if self.created else None
+
+
+class UploadFailure:
+    """File dalam upload batch yang ditolak (bukan gambar, terlalu besar, dll); file lain tetap diproses."""
+
+    def __init__(self, filename: Optional[str], detail: str):
+        self.filename = filename
+        self.detail = detail
+
+
+class _MultipartFileReader:
+    """
+    Membungkus MultipartParser: hanya data dari part dengan nama field_name yang dikumpulkan,
+    dan setiap pemanggilan feed() mengembalikan potongan data file dari chunk tersebut saja.
+    """
+
+    def __init__(self, boundary: bytes, field_name: str):
+        self.field_name = field_name
+        self.found = False
+        self.done = False
+        self.filename = None
+        self._in_target = False
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._pending = []
+        self.parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        self._in_target = not self.found and name == self.field_name
+        if self._in_target:
+            self.found = True
+            filename = options.get(b"filename")
+            self.filename = filename.decode("utf-8", "replace") if filename else None
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_target:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_target:
+            self._in_target = False
+            self.done = True
+
+    def feed(self, chunk: bytes) -> bytes:
+        self.parser.write(chunk)
+        data = b"".join(self._pending)
+        self._pending.clear()
+        return data
+
+
+class _MultipartFilesReader(_MultipartFileReader):
+    """
+    Varian _MultipartFileReader untuk banyak part dengan nama field_name yang sama.
+    feed() mengembalikan daftar event berurutan: ("begin", filename), ("data", bytes), ("end", None).
+    """
+
+    def __init__(self, boundary: bytes, field_name: str):
+        super().__init__(boundary, field_name)
+        self._events = []
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_target = options.get(b"name", b"").decode("latin-1") == self.field_name
+        if self._in_target:
+            self.found = True
+            filename = options.get(b"filename")
+            self._events.append(("begin", filename.decode("utf-8", "replace") if filename else None))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_target:
+            self._events.append(("data", data[start:end]))
+
+    def _on_part_end(self):
+        if self._in_target:
+            self._in_target = False
+            self._events.append(("end", None))
+
+    def feed(self, chunk: bytes) -> list:
+        self.parser.write(chunk)
+        events = self._events
+        self._events = []
+        return events
+
+
+def _open_for_write(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb")
+
+
+def _write_chunk(f, hasher, data: bytes):
+    hasher.update(data)
+    f.write(data)
+
+
+def _discard(f, path: str):
+    if f is not None:
+        f.close()
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def _too_large_detail(max_bytes: int) -> str:
+    return f"Ukuran file terlalu besar. Maksimal {max_bytes // (1024 * 1024)}MB."
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=_too_large_detail(max_bytes)
+    )
+
+
+def _multipart_boundary(request: Request) -> bytes:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request harus berupa multipart/form-data."
+        )
+    return boundary
+
+
+class _WriteTimer:
+    """Menjalankan fungsi blocking di io_executor sambil menjumlahkan waktunya (tahap file_write)."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    async def __call__(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return await io_executor.run(func, *args)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+async def ingest_upload(request: Request, store: BlobStore, max_bytes: int,
+                        field_name: str = "file") -> IngestedUpload:
+    """
+    Membaca body multipart secara streaming dan menulis file field_name ke file sementara
+    di dalam store sambil menghitung SHA-256 isinya, lalu memindahkannya (rename atomik)
+    ke lokasi content-addressed. Upload dengan isi yang sudah ada tidak disimpan dua kali.
+
+    - Content-Length yang melebihi batas ditolak sebelum body dibaca.
+    - Format gambar dikenali dari byte awal; selain gambar ditolak sebelum apa pun ditulis.
+    - Pembacaan dihentikan begitu ukuran file melewati max_bytes.
+    Memori yang dipakai per upload hanya sebesar satu chunk dari server ASGI.
+    Ekstensi file mengikuti format hasil deteksi, bukan nama file dari klien.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise _too_large(max_bytes)
+
+    reader = _MultipartFileReader(_multipart_boundary(request), field_name)
+    hasher = hashlib.sha256()
+    header = b""
+    size = 0
+    f = None
+    path = None
+    image_type = None
+    # Waktu menulis ke disk; sisanya (dari total) adalah waktu membaca & mem-parse body
+    start = time.perf_counter()
+    write = _WriteTimer()
+
+    async def open_target(first_bytes: bytes):
+        nonlocal f, path, image_type
+        image_type = sniff_image_type(first_bytes)
+        if image_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File harus berupa gambar (jpg, png, dll)."
+            )
+        path = store.temp_path()
+        f = await write(_open_for_write, path)
+        await write(_write_chunk, f, hasher, first_bytes)
+
+    try:
+        async for chunk in request.stream():
+            data = reader.feed(chunk)
+            if data:
+                size += len(data)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                if f is not None:
+                    await write(_write_chunk, f, hasher, data)
+                else:
+                    header += data
+                    if len(header) >= SNIFF_BYTES:
+                        await open_target(header)
+                        header = b""
+            if reader.done:
+                break
+
+        if not reader.found or size == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File gambar tidak ditemukan pada field '{field_name}'."
+            )
+        if f is None:
+            await open_target(header)
+        await write(f.close)
+        content_hash = hasher.hexdigest()
+        committed = await write(store.commit, path, content_hash, image_type[0])
+    except BaseException:
+        await io_executor.run(_discard, f, path)
+        raise
+
+    metrics.FILE_WRITE.observe(write.seconds)
+    metrics.UPLOAD_READ.observe(time.perf_counter() - start - write.seconds)
+    logger.debug("Upload disimpan: %s (%s bytes, %s)", committed.key, size, image_type[1])
+    return IngestedUpload(
+        key=committed.key,
+        path=store.path_for(committed.key),
+        size=size,
+        content_hash=content_hash,
+        content_type=image_type[1],
+        original_filename=reader.filename,
+        created=committed.created,
+        mtime_ns=committed.mtime_ns,
+    )
+
+
+# Signature local file header arsip zip
+ZIP_SIGNATURE = b"PK\x03\x04"
+
+# Ukuran potongan saat menyalin entri zip ke file sementara
+ZIP_COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class _StagedUpload:
+    """Gambar yang sudah lengkap di file sementara, menunggu dipindah ke BlobStore."""
+
+    def __init__(self, filename: Optional[str], path: str, size: int, content_hash: str, image_type):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+        self.image_type = image_type
+
+
+def _stage_zip_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, store: BlobStore, max_bytes: int):
+    """Menyalin satu entri zip ke file sementara (blocking). Mengembalikan _StagedUpload atau UploadFailure."""
+    if info.file_size > max_bytes:
+        return UploadFailure(info.filename, _too_large_detail(max_bytes))
+    path = store.temp_path()
+    f = _open_for_write(path)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with archive.open(info) as source:
+            data = source.read(SNIFF_BYTES)
+            image_type = sniff_image_type(data)
+            if image_type is None:
+                _discard(f, path)
+                return UploadFailure(info.filename, "File harus berupa gambar (jpg, png, dll).")
+            while data:
+                size += len(data)
+                # Ukuran di direktori zip bisa dipalsukan, jadi batas dicek lagi saat membaca
+                if size > max_bytes:
+                    _discard(f, path)
+                    return UploadFailure(info.filename, _too_large_detail(max_bytes))
+                _write_chunk(f, hasher, data)
+                data = source.read(ZIP_COPY_CHUNK_BYTES)
+        f.close()
+    except (zipfile.BadZipFile, NotImplementedError, RuntimeError, OSError) as e:
+        # CRC salah, metode kompresi tidak didukung, entri terenkripsi
+        _discard(f, path)
+        return UploadFailure(info.filename, f"Entri zip tidak bisa dibaca: {str(e)}")
+    except BaseException:
+        _discard(f, path)
+        raise
+    return _StagedUpload(info.filename, path, size, hasher.hexdigest(), image_type)
+
+
+def _extract_zip(zip_path: str, archive_name: Optional[str], store: BlobStore, max_bytes: int, max_entries: int) -> list:
+    """
+    Mengekstrak entri gambar dari arsip zip ke file sementara (blocking), paling banyak max_entries.
+    Folder, file tersembunyi dan metadata macOS dilewati; entri di atas batas dilaporkan sebagai satu UploadFailure.
+    """
+    try:
+        archive = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        return [UploadFailure(archive_name, "Arsip zip tidak valid.")]
+
+    entries = []
+    skipped = 0
+    try:
+        with archive:
+            for info in archive.infolist():
+                basename = os.path.basename(info.filename)
+                if info.is_dir() or info.filename.startswith("__MACOSX/") or not basename or basename.startswith("."):
+                    continue
+                if len(entries) >= max_entries:
+                    skipped += 1
+                    continue
+                entries.append(_stage_zip_entry(archive, info, store, max_bytes))
+    except BaseException:
+        for entry in entries:
+            if isinstance(entry, _StagedUpload):
+                _discard(None, entry.path)
+        raise
+    if skipped:
+        entries.append(UploadFailure(archive_name, f"{skipped} file lain dilewati: melebihi batas file per batch."))
+    return entries
+
+
+class _BatchPart:
+    """Satu part file pada upload batch: dikenali dari byte awal, ditulis ke file sementara sambil di-hash."""
+
+    def __init__(self, store: BlobStore, filename: Optional[str], max_bytes: int, max_archive_bytes: int,
+                 write: _WriteTimer, error: Optional[str] = None):
+        self.store = store
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_archive_bytes = max_archive_bytes
+        self.write = write
+        self.error = error
+        self.hasher = hashlib.sha256()
+        self.header = b""
+        self.size = 0
+        self.f = None
+        self.path = None
+        self.image_type = None
+        self.is_zip = False
+
+    def _over_limit(self) -> bool:
+        return self.size > (self.max_archive_bytes if self.is_zip else self.max_bytes)
+
+    async def _open(self, first_bytes: bytes):
+        self.image_type = sniff_image_type(first_bytes)
+        self.is_zip = self.image_type is None and first_bytes.startswith(ZIP_SIGNATURE)
+        if self.image_type is None and not self.is_zip:
+            self.error = "File harus berupa gambar (jpg, png, dll) atau arsip zip."
+            return
+        self.path = self.store.temp_path()
+        self.f = await self.write(_open_for_write, self.path)
+        await self.write(_write_chunk, self.f, self.hasher, first_bytes)
+
+    async def _reject(self, detail: str):
+        self.error = detail
+        await self.discard()
+
+    async def feed(self, data: bytes):
+        if self.error is not None:
+            return
+        self.size += len(data)
+        if self.f is not None:
+            if self._over_limit():
+                await self._reject(_too_large_detail(self.max_archive_bytes if self.is_zip else self.max_bytes))
+                return
+            await self.write(_write_chunk, self.f, self.hasher, data)
+            return
+        self.header += data
+        if len(self.header) >= SNIFF_BYTES:
+            await self._open(self.header)
+            self.header = b""
+            if self.error is None and self._over_limit():
+                await self._reject(_too_large_detail(self.max_archive_bytes if self.is_zip else self.max_bytes))
+
+    async def finish(self, max_entries: int) -> list:
+        """Menutup part; mengembalikan daftar _StagedUpload/UploadFailure (isi zip diekstrak)."""
+        if self.error is None and self.size == 0:
+            self.error = "File kosong."
+        if self.error is None and self.f is None:
+            await self._open(self.header)
+        if self.error is not None:
+            return [UploadFailure(self.filename, self.error)]
+        await self.write(self.f.close)
+        self.f = None
+        if not self.is_zip:
+            return [_StagedUpload(self.filename, self.path, self.size, self.hasher.hexdigest(), self.image_type)]
+        try:
+            return await self.write(_extract_zip, self.path, self.filename, self.store, self.max_bytes, max_entries)
+        finally:
+            await self.discard()
+
+    async def discard(self):
+        await self.write(_discard, self.f, self.path)
+        self.f = None
+        self.path = None
+
+
+def _ingested(store: BlobStore, entry: _StagedUpload, committed) -> IngestedUpload:
+    return IngestedUpload(
+        key=committed.key,
+        path=store.path_for(committed.key),
+        size=entry.size,
+        content_hash=entry.content_hash,
+        content_type=entry.image_type[1],
+        original_filename=entry.filename,
+        created=committed.created,
+        mtime_ns=committed.mtime_ns,
+    )
+
+
+async def _discard_created(store: BlobStore, results: list):
+    """Membuang blob yang dibuat batch yang gagal (mtime dari commit terakhir ke kunci yang sama)."""
+    created_mtimes = {}
+    for result in results:
+        if isinstance(result, IngestedUpload) and (result.created or result.key in created_mtimes):
+            created_mtimes[result.key] = result.mtime_ns
+    for key, mtime_ns in created_mtimes.items():
+        try:
+            await io_executor.run(store.discard_new, key, mtime_ns)
+        except Exception as e:
+            logger.error(f"Gagal membersihkan blob {key}: {e}")
+
+
+async def ingest_uploads(request: Request, store: BlobStore, max_bytes: int, max_files: int,
+                         max_total_bytes: int, field_name: str = "files") -> List[Union[IngestedUpload, UploadFailure]]:
+    """
+    Versi batch dari ingest_upload: semua part bernama field_name dibaca streaming ke file sementara.
+    Part berupa arsip zip diekstrak; setiap gambar di dalamnya diperlakukan seperti satu file.
+
+    Mengembalikan satu entri per file sesuai urutan upload: IngestedUpload, atau UploadFailure untuk file
+    yang ditolak (bukan gambar, melebihi max_bytes, melebihi max_files). File yang ditolak tidak
+    menggagalkan batch. Body yang melebihi max_total_bytes, atau tanpa file sama sekali, ditolak seluruhnya.
+    File baru dipindah ke BlobStore setelah seluruh body terbaca, jadi request yang gagal di tengah
+    tidak meninggalkan blob tanpa pemilik.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_total_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise _too_large(max_total_bytes)
+
+    reader = _MultipartFilesReader(_multipart_boundary(request), field_name)
+    start = time.perf_counter()
+    write = _WriteTimer()
+    entries = []  # _StagedUpload / UploadFailure
+    results = []
+    current = None
+    pending = None  # commit BlobStore yang sedang berjalan
+    received = 0
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_total_bytes + MULTIPART_OVERHEAD_BYTES:
+                raise _too_large(max_total_bytes)
+            for kind, value in reader.feed(chunk):
+                if kind == "begin":
+                    error = None if len(entries) < max_files else f"Melebihi batas {max_files} file per batch."
+                    current = _BatchPart(store, value, max_bytes, max_total_bytes, write, error)
+                elif kind == "data":
+                    await current.feed(value)
+                else:
+                    part, current = current, None
+                    entries.extend(await part.finish(max(0, max_files - len(entries))))
+
+        if current is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body multipart tidak lengkap.")
+        if not reader.found:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File gambar tidak ditemukan pada field '{field_name}'."
+            )
+
+        for entry in entries:
+            if isinstance(entry, UploadFailure):
+                results.append(entry)
+                continue
+            # Di-shield: jika request dibatalkan saat commit berjalan, hasilnya tetap ditunggu di cleanup
+            pending = asyncio.ensure_future(write(store.commit, entry.path, entry.content_hash, entry.image_type[0]))
+            committed = await asyncio.shield(pending)
+            pending = None
+            entry.path = None
+            results.append(_ingested(store, entry, committed))
+    except BaseException:
+        if current is not None:
+            await current.discard()
+        if pending is not None:
+            try:
+                results.append(_ingested(store, entry, await pending))
+                entry.path = None
+            except Exception:
+                pass
+        for entry in entries:
+            if isinstance(entry, _StagedUpload) and entry.path:
+                await io_executor.run(_discard, None, entry.path)
+        await _discard_created(store, results)
+        raise
+
+    metrics.FILE_WRITE.observe(write.seconds)
+    metrics.UPLOAD_READ.observe(time.perf_counter() - start - write.seconds)
+    stored = sum(isinstance(result, IngestedUpload) for result in results)
+    logger.info(f"Upload batch: {stored} file disimpan, {len(results) - stored} ditolak.")
+    return results
@@ -0,0 +1,167 @@
+# app/storage/migrate.py
+"""
+Memindahkan file upload lama (folder datar uploads/ dan uploads/profile_pictures/) ke
+layout BlobStore content-addressed, lalu memperbarui kolom image di database.
+File dengan isi yang sama digabung menjadi satu blob.
+
+Pemakaian (dari folder backend):
+    python -m app.storage.migrate --dry-run   # hanya laporan, tidak ada yang dipindah
+    python -m app.storage.migrate             # migrasi diagnosa + foto profil
+    python -m app.storage.migrate --gc        # hapus blob yang tidak direferensikan lagi
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+
+from app.models.diagnosa import Diagnosa
+from app.models.users import Users
+from app.storage.blob_store import BlobStore, diagnosa_store, profile_store
+from app.storage.ingest import SNIFF_BYTES, sniff_image_type
+from config import sessionmaker
+
+logger = logging.getLogger(__name__)
+
+SHARD_PATTERN = re.compile(r"^[0-9a-f]{2}$")
+
+# Sisa file sementara upload yang gagal dihapus setelah umur ini
+TMP_MAX_AGE_SECONDS = 3600
+
+
+def _hash_file(path: str):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        header = f.read(SNIFF_BYTES)
+        hasher.update(header)
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    image_type = sniff_image_type(header)
+    extension = image_type[0] if image_type else os.path.splitext(path)[1].lower()
+    return hasher.hexdigest(), extension
+
+
+def migrate_model(db, model, store: BlobStore, dry_run: bool, batch_size: int = 200) -> dict:
+    """Memigrasi semua baris model yang kolom image-nya masih berupa nama file lama."""
+    stats = {"files": 0, "rows": 0, "deduplicated": 0, "missing": 0}
+    legacy_names = [
+        name for (name,) in db.query(model.image).filter(model.image.isnot(None)).distinct()
+        if name and not BlobStore.is_key(name)
+    ]
+
+    committed_legacy = []  # file lama yang baru dihapus setelah baris di-commit
+    seen_keys = set()
+    for i, legacy_name in enumerate(legacy_names, start=1):
+        legacy_path = os.path.join(store.root, legacy_name)
+        if not os.path.exists(legacy_path):
+            logger.warning(f"{model.__tablename__}: file {legacy_path} tidak ditemukan, dilewati.")
+            stats["missing"] += 1
+            continue
+
+        content_hash, extension = _hash_file(legacy_path)
+        key = BlobStore.key_for(content_hash, extension)
+        if key in seen_keys or store.exists(key):
+            stats["deduplicated"] += 1
+        seen_keys.add(key)
+        logger.info(f"{model.__tablename__}: {legacy_name} -> {key}")
+        stats["files"] += 1
+
+        if dry_run:
+            stats["rows"] += db.query(model).filter(model.image == legacy_name).count()
+            continue
+        stats["rows"] += db.query(model).filter(model.image == legacy_name).update(
+            {model.image: key}, synchronize_session=False
+        )
+        # Blob dibuat lewat hard link, file lama baru dihapus setelah baris di-commit,
+        # sehingga proses yang terhenti di tengah bisa diulang tanpa kehilangan file.
+        tmp_path = store.temp_path()
+        os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+        os.link(legacy_path, tmp_path)
+        store.commit(tmp_path, content_hash, extension)
+        committed_legacy.append(legacy_path)
+        if i % batch_size == 0:
+            db.commit()
+            _remove_files(committed_legacy)
+
+    if not dry_run:
+        db.commit()
+        _remove_files(committed_legacy)
+    return stats
+
+
+def _remove_files(paths: list):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    paths.clear()
+
+
+def collect_garbage(db, model, store: BlobStore, dry_run: bool) -> dict:
+    """Menghapus blob tanpa referensi di kolom image (mis. upload yang gagal) dan file sementara lama."""
+    stats = {"blobs": 0, "removed": 0, "tmp_removed": 0}
+
+    tmp_dir = os.path.join(store.root, BlobStore.TMP_DIR)
+    if os.path.isdir(tmp_dir):
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            if time.time() - os.path.getmtime(path) > TMP_MAX_AGE_SECONDS:
+                stats["tmp_removed"] += 1
+                if not dry_run:
+                    os.remove(path)
+
+    for first in sorted(os.listdir(store.root)):
+        if not SHARD_PATTERN.match(first) or not os.path.isdir(os.path.join(store.root, first)):
+            continue
+        for second in sorted(os.listdir(os.path.join(store.root, first))):
+            shard_dir = os.path.join(store.root, first, second)
+            if not SHARD_PATTERN.match(second) or not os.path.isdir(shard_dir):
+                continue
+            names = os.listdir(shard_dir)
+            sources = {os.path.splitext(name)[0] for name in names if "_" not in name}
+            for name in names:
+                key = f"{first}/{second}/{name}"
+                if "_" in name:
+                    # Rendisi WebP ikut dihapus bersama blob aslinya; yang yatim dibersihkan di sini
+                    if name.rsplit("_", 1)[0] not in sources:
+                        stats["removed"] += 1
+                        if not dry_run:
+                            os.remove(os.path.join(shard_dir, name))
+                    continue
+                stats["blobs"] += 1
+                if db.query(model).filter(model.image == key).count() > 0:
+                    continue
+                logger.info(f"{model.__tablename__}: blob {key} tidak direferensikan.")
+                if dry_run:
+                    stats["removed"] += 1
+                elif store.delete(key):
+                    stats["removed"] += 1
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Migrasi file upload ke layout BlobStore content-addressed.")
+    parser.add_argument("--dry-run", action="store_true", help="Hanya laporan, tanpa memindah file atau mengubah database.")
+    parser.add_argument("--gc", action="store_true", help="Hapus blob yang tidak direferensikan baris mana pun.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    targets = ((Diagnosa, diagnosa_store), (Users, profile_store))
+    db = sessionmaker()
+    try:
+        for model, store in targets:
+            if args.gc:
+                stats = collect_garbage(db, model, store, args.dry_run)
+            else:
+                stats = migrate_model(db, model, store, args.dry_run, args.batch_size)
+            print(f"[{model.__tablename__}] {stats}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
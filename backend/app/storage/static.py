@@ -0,0 +1,82 @@
+# app/storage/static.py
+import os
+import re
+from email.utils import formatdate
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from config import (
+    UPLOADS_CACHE_MAX_AGE,
+    UPLOADS_DERIVATIVE_MAX_AGE,
+    UPLOADS_OFFLOAD,
+    UPLOADS_ACCEL_PREFIX,
+)
+
+# Nama blob content-addressed: <sha256><ext>; rendisi: <sha256>_<nama>.webp
+_BLOB_NAME = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+_DERIVATIVE_NAME = re.compile(r"_[a-z]+\.webp$")
+
+OFFLOAD_MODES = ("", "x-accel-redirect", "x-sendfile")
+
+
+class UploadStaticFiles(StaticFiles):
+    """
+    StaticFiles untuk /uploads dengan kebijakan cache yang sesuai penamaan file upload.
+
+    - Blob content-addressed memakai hash isinya sebagai ETag kuat; file upload lama juga
+      bernama unik, jadi keduanya dikirim dengan Cache-Control immutable.
+    - Rendisi WebP bisa dibuat ulang (backfill --overwrite), jadi max-age-nya lebih pendek
+      dan divalidasi ulang lewat ETag.
+    - If-None-Match / If-Modified-Since dijawab 304; Range dan If-Range ditangani FileResponse.
+    - Mode offload (UPLOADS_OFFLOAD) hanya mengirim header X-Accel-Redirect / X-Sendfile
+      sehingga isi file dikirim oleh reverse proxy, bukan worker Python.
+    """
+
+    def __init__(self, *args, offload: str = UPLOADS_OFFLOAD, accel_prefix: str = UPLOADS_ACCEL_PREFIX, **kwargs):
+        super().__init__(*args, **kwargs)
+        if offload not in OFFLOAD_MODES:
+            raise ValueError(f"UPLOADS_OFFLOAD tidak dikenal: {offload}")
+        self.offload = offload
+        self.accel_prefix = accel_prefix.rstrip("/")
+
+    @staticmethod
+    def cache_headers(name: str, stat_result: os.stat_result) -> dict:
+        blob = _BLOB_NAME.match(name)
+        if blob:
+            etag = f'"{blob.group(1)}"'
+        else:
+            etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+        if _DERIVATIVE_NAME.search(name):
+            cache_control = f"public, max-age={UPLOADS_DERIVATIVE_MAX_AGE}"
+        else:
+            cache_control = f"public, max-age={UPLOADS_CACHE_MAX_AGE}, immutable"
+        return {"etag": etag, "cache-control": cache_control}
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = self.cache_headers(os.path.basename(full_path), stat_result)
+
+        if self.offload:
+            response = self._offload_response(full_path, stat_result, headers)
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+            response.headers.update(headers)
+
+        if status_code == 200 and self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _offload_response(self, full_path, stat_result: os.stat_result, headers: dict) -> Response:
+        media_type = guess_type(str(full_path))[0] or "application/octet-stream"
+        response = Response(status_code=200, media_type=media_type, headers=headers)
+        if self.offload == "x-accel-redirect":
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            response.headers["x-accel-redirect"] = f"{self.accel_prefix}/{relative}"
+        else:
+            response.headers["x-sendfile"] = os.path.abspath(full_path)
+        response.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        return response
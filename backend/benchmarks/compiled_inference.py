@@ -0,0 +1,70 @@
+# benchmarks/compiled_inference.py
+"""
+Membandingkan overhead per panggilan feature_extractor.predict (jalur lama)
+dengan jalur tf.function terkompilasi (KerasBackend).
+
+Pemakaian (dari folder backend):
+    python -m benchmarks.compiled_inference --iterations 200 --batch-sizes 1,4,16
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.machine_learning import model_loader
+from app.machine_learning.backends import KerasBackend
+from config import KERAS_BATCH_BUCKETS
+
+
+def _time_calls(fn, iterations: int) -> np.ndarray:
+    durations = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations[i] = time.perf_counter() - start
+    return durations * 1000.0
+
+
+def _report(label: str, durations_ms: np.ndarray):
+    print(
+        f"{label:<28} mean {durations_ms.mean():8.3f} ms | p50 {np.percentile(durations_ms, 50):8.3f} ms | "
+        f"p95 {np.percentile(durations_ms, 95):8.3f} ms"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Model.predict vs jalur inferensi terkompilasi.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    args = parser.parse_args(argv)
+
+    _, feature_extractor = model_loader.load_keras_feature_extractor()
+    compiled = KerasBackend(feature_extractor, KERAS_BATCH_BUCKETS)
+    compiled.warm_up()
+
+    rng = np.random.default_rng(0)
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        images = rng.integers(0, 256, size=(batch_size, 128, 128, 3), dtype=np.uint8)
+        normalized = images / 255.0
+
+        def legacy():
+            return feature_extractor.predict(normalized, verbose=0)
+
+        def compiled_path():
+            return compiled.extract(images)
+
+        _time_calls(legacy, args.warmup)
+        _time_calls(compiled_path, args.warmup)
+
+        max_diff = np.max(np.abs(legacy() - compiled_path()))
+        print(f"\nBatch {batch_size} (max |selisih fitur| = {max_diff:.2e})")
+        legacy_ms = _time_calls(legacy, args.iterations)
+        compiled_ms = _time_calls(compiled_path, args.iterations)
+        _report("Model.predict", legacy_ms)
+        _report("tf.function (bucket)", compiled_ms)
+        print(f"{'overhead dihapus per panggilan':<28} {np.median(legacy_ms) - np.median(compiled_ms):8.3f} ms (p50)")
+
+
+if __name__ == "__main__":
+    main()
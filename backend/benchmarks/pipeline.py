@@ -0,0 +1,339 @@
+# benchmarks/pipeline.py
+"""
+Benchmark offline per tahap pipeline prediksi (app/machine_learning/predictor.py):
+- decode dan resize (per engine preprocessing), serta preprocess_image utuh
+- preprocess paralel di beberapa jumlah thread (seperti cpu_executor)
+- cnn (feature_backend.extract) dan svm (svm_head.predict_with_proba) per ukuran batch
+- end_to_end: preprocess satu batch di N thread + run_models, per ukuran batch dan jumlah thread
+
+Input: gambar daun sintetis JPEG/PNG di beberapa resolusi, ditambah gambar contoh di --samples.
+Tahap yang butuh model (cnn, svm, end_to_end) dilewati jika model gagal dimuat, atau dengan --no-models.
+
+Hasil berupa JSON (p50/p95/p99/mean dalam ms dan throughput gambar/detik per skenario).
+Dengan --baseline, hasil dibandingkan terhadap JSON sebelumnya: exit code 1 jika ada skenario
+yang --metric-nya lebih lambat dari baseline melebihi --threshold.
+
+Pemakaian (dari folder backend):
+    python -m benchmarks.pipeline --output baseline.json
+    python -m benchmarks.pipeline --baseline baseline.json --threshold 0.10
+    python -m benchmarks.pipeline --resolutions 640x480,4000x3000 --batch-sizes 1,8 --threads 1,4 --no-models
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from app.machine_learning import model_loader, predictor
+from config import INFERENCE_BACKEND
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+TARGET_SIZE = (128, 128)
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "mean_ms")
+
+
+def _parse_ints(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def _parse_resolutions(value: str):
+    resolutions = []
+    for item in value.split(","):
+        width, height = item.lower().split("x")
+        resolutions.append((int(width), int(height)))
+    return resolutions
+
+
+def _synthetic_leaf(rng, width: int, height: int) -> np.ndarray:
+    """Daun hijau berbentuk elips dengan tulang daun dan noise di atas latar tanah/meja."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    cx, cy = width * rng.uniform(0.4, 0.6), height * rng.uniform(0.4, 0.6)
+    rx, ry = width * rng.uniform(0.3, 0.45), height * rng.uniform(0.2, 0.35)
+    inside = ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2 <= 1.0
+
+    background = np.array(rng.uniform(120, 200, 3), dtype=np.float32)
+    leaf = np.array([rng.uniform(30, 80), rng.uniform(110, 180), rng.uniform(20, 60)], dtype=np.float32)
+    pixels = np.where(inside[..., None], leaf, background)
+
+    # Tulang daun utama dan bercak kekuningan (gejala)
+    vein = inside & (np.abs(y - cy) < max(1.0, height * 0.004))
+    pixels[vein] = leaf * 1.4
+    spots = inside & (rng.random((height, width)) < 0.002)
+    pixels[spots] = (200, 190, 60)
+
+    block = max(1, min(width, height) // 200)
+    noise = rng.normal(0, 10, (height // block + 1, width // block + 1, 3)).repeat(block, 0).repeat(block, 1)
+    return np.clip(pixels + noise[:height, :width], 0, 255).astype(np.uint8)
+
+
+def _synthetic_inputs(resolutions, formats, per_input: int):
+    rng = np.random.default_rng(0)
+    inputs = {}
+    for width, height in resolutions:
+        for fmt in formats:
+            contents = []
+            for _ in range(per_input):
+                buffer = io.BytesIO()
+                image = Image.fromarray(_synthetic_leaf(rng, width, height))
+                if fmt == "jpeg":
+                    image.save(buffer, format="JPEG", quality=90)
+                else:
+                    image.save(buffer, format="PNG", compress_level=6)
+                contents.append(buffer.getvalue())
+            inputs[f"{fmt}-{width}x{height}"] = contents
+    return inputs
+
+
+def _load_samples(samples_dir: str, limit: int):
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(samples_dir, pattern)))
+    contents = []
+    for path in sorted(paths)[:limit]:
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    return contents
+
+
+def _summary(durations_s, items_per_call: int = 1, wall_seconds: float = None) -> dict:
+    durations_ms = np.asarray(durations_s) * 1000.0
+    wall_seconds = wall_seconds if wall_seconds is not None else float(np.sum(durations_s))
+    return {
+        "samples": int(len(durations_ms)),
+        "p50_ms": float(np.percentile(durations_ms, 50)),
+        "p95_ms": float(np.percentile(durations_ms, 95)),
+        "p99_ms": float(np.percentile(durations_ms, 99)),
+        "mean_ms": float(durations_ms.mean()),
+        "throughput_per_s": (len(durations_ms) * items_per_call / wall_seconds) if wall_seconds > 0 else 0.0,
+    }
+
+
+def _time_each(fn, args_list, iterations: int, warmup: int):
+    """Memanggil fn(arg) untuk setiap arg, warmup putaran pertama tidak dihitung."""
+    for _ in range(warmup):
+        for arg in args_list:
+            fn(arg)
+    durations = []
+    for _ in range(iterations):
+        for arg in args_list:
+            start = time.perf_counter()
+            fn(arg)
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _decode(content: bytes, engine: str):
+    with Image.open(io.BytesIO(content)) as original:
+        if engine == "fast":
+            return predictor._decode_fast(original, TARGET_SIZE)
+        return predictor._decode_legacy(original, TARGET_SIZE)
+
+
+def bench_preprocess(inputs: dict, engines, iterations: int, warmup: int) -> dict:
+    results = {}
+    for label, contents in inputs.items():
+        for engine in engines:
+            decoded = [_decode(content, engine) for content in contents]
+            out = np.empty((1, TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+            resize_options = predictor.RESIZE_OPTIONS[engine]
+
+            results[f"decode/{label}/{engine}"] = _summary(
+                _time_each(lambda c: _decode(c, engine), contents, iterations, warmup))
+            results[f"resize/{label}/{engine}"] = _summary(
+                _time_each(lambda img: img.resize(TARGET_SIZE, **resize_options), decoded, iterations, warmup))
+            results[f"preprocess/{label}/{engine}"] = _summary(
+                _time_each(lambda c: predictor.preprocess_image(c, engine=engine, out=out), contents, iterations, warmup))
+    return results
+
+
+def _preprocess_batch(pool, contents, engine: str) -> np.ndarray:
+    batch = np.empty((len(contents), TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+    list(pool.map(lambda i: predictor.preprocess_image(contents[i], engine=engine, out=batch[i]), range(len(contents))))
+    return batch
+
+
+def _time_batches(fn, contents, batch_size: int, iterations: int, warmup: int):
+    """Memotong contents (diulang secara siklis) menjadi batch penuh berukuran batch_size dan menjalankan fn per batch."""
+    n_batches = max(1, -(-len(contents) // batch_size))
+    batches = [
+        [contents[(k * batch_size + j) % len(contents)] for j in range(batch_size)]
+        for k in range(n_batches)
+    ]
+    for _ in range(warmup):
+        fn(batches[0])
+    durations = []
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        for batch in batches:
+            start = time.perf_counter()
+            fn(batch)
+            durations.append(time.perf_counter() - start)
+    return durations, time.perf_counter() - wall_start
+
+
+def bench_parallel(contents, engine: str, batch_sizes, thread_counts, iterations: int, warmup: int,
+                   with_models: bool) -> dict:
+    results = {}
+    for threads in thread_counts:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bench") as pool:
+            for batch_size in batch_sizes:
+                durations, wall = _time_batches(
+                    lambda batch: _preprocess_batch(pool, batch, engine), contents, batch_size, iterations, warmup)
+                results[f"preprocess_parallel/batch={batch_size}/threads={threads}"] = _summary(durations, batch_size, wall)
+
+                if with_models:
+                    def end_to_end(batch):
+                        return predictor.run_models(_preprocess_batch(pool, batch, engine))
+
+                    durations, wall = _time_batches(end_to_end, contents, batch_size, iterations, warmup)
+                    results[f"end_to_end/batch={batch_size}/threads={threads}"] = _summary(durations, batch_size, wall)
+    return results
+
+
+def bench_models(batch_sizes, iterations: int, warmup: int) -> dict:
+    feature_backend, svm_head = model_loader.get_models()
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in batch_sizes:
+        images = rng.integers(0, 256, size=(batch_size, TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+        features = feature_backend.extract(images)
+        if features.ndim > 2:
+            features = features.reshape(features.shape[0], -1)
+
+        durations = _time_each(feature_backend.extract, [images], iterations, warmup)
+        results[f"cnn/batch={batch_size}"] = _summary(durations, batch_size)
+        durations = _time_each(svm_head.predict_with_proba, [features], iterations, warmup)
+        results[f"svm/batch={batch_size}"] = _summary(durations, batch_size)
+    return results
+
+
+def compare(results: dict, baseline: dict, metric: str, threshold: float, min_delta_ms: float) -> dict:
+    """Membandingkan metric per skenario; regresi jika lebih lambat > threshold (relatif) dan > min_delta_ms."""
+    regressions, improvements, missing = [], [], []
+    for name, base in baseline.get("results", {}).items():
+        current = results.get(name)
+        if current is None:
+            missing.append(name)
+            continue
+        before, after = base[metric], current[metric]
+        change = (after - before) / before if before > 0 else 0.0
+        entry = {"scenario": name, "baseline": before, "current": after, "change": change}
+        if change > threshold and after - before > min_delta_ms:
+            regressions.append(entry)
+        elif change < -threshold and before - after > min_delta_ms:
+            improvements.append(entry)
+    return {
+        "metric": metric,
+        "threshold": threshold,
+        "regressions": sorted(regressions, key=lambda e: -e["change"]),
+        "improvements": sorted(improvements, key=lambda e: e["change"]),
+        "missing": missing,
+    }
+
+
+def _print_table(results: dict, out):
+    for name, r in results.items():
+        print(
+            f"{name:<48} p50 {r['p50_ms']:9.3f} ms | p95 {r['p95_ms']:9.3f} ms | p99 {r['p99_ms']:9.3f} ms | "
+            f"{r['throughput_per_s']:9.1f} gambar/s",
+            file=out,
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark per tahap pipeline prediksi dengan perbandingan baseline.")
+    parser.add_argument("--resolutions", default="640x480,1920x1080,4000x3000")
+    parser.add_argument("--formats", default="jpeg,png")
+    parser.add_argument("--per-input", type=int, default=4, help="Jumlah gambar sintetis per resolusi/format.")
+    parser.add_argument("--samples", default="uploads", help="Folder gambar contoh (dilewati jika tidak ada).")
+    parser.add_argument("--limit", type=int, default=16)
+    parser.add_argument("--engines", default=",".join(predictor.PREPROCESS_ENGINES))
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    parser.add_argument("--threads", default="1,2,4")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--no-models", action="store_true", help="Lewati tahap cnn, svm dan end_to_end.")
+    parser.add_argument("--output", default=None, help="Tulis JSON ke file (default: stdout).")
+    parser.add_argument("--baseline", default=None, help="JSON hasil sebelumnya untuk dibandingkan.")
+    parser.add_argument("--metric", default="p50_ms", choices=METRICS)
+    parser.add_argument("--threshold", type=float, default=0.10, help="Batas perlambatan relatif (0.10 = 10%%).")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Selisih absolut minimum agar dihitung regresi.")
+    args = parser.parse_args(argv)
+
+    engines = [e for e in args.engines.split(",") if e]
+    batch_sizes = _parse_ints(args.batch_sizes)
+    thread_counts = _parse_ints(args.threads)
+
+    inputs = _synthetic_inputs(_parse_resolutions(args.resolutions), args.formats.split(","), args.per_input)
+    if os.path.isdir(args.samples):
+        samples = _load_samples(args.samples, args.limit)
+        if samples:
+            inputs["samples"] = samples
+    print(f"Input: {', '.join(f'{k} ({len(v)})' for k, v in inputs.items())}", file=sys.stderr)
+
+    models_error = None
+    with_models = not args.no_models
+    if with_models:
+        try:
+            model_loader.load_models()
+        except Exception as e:
+            with_models = False
+            models_error = str(e)
+            print(f"Model tidak dimuat, tahap cnn/svm/end_to_end dilewati: {e}", file=sys.stderr)
+
+    results = bench_preprocess(inputs, engines, args.iterations, args.warmup)
+    # Skenario paralel & end_to_end memakai campuran semua input dengan engine pertama
+    mixed = [content for contents in inputs.values() for content in contents]
+    results.update(bench_parallel(mixed, engines[0], batch_sizes, thread_counts, args.iterations, args.warmup, with_models))
+    if with_models:
+        results.update(bench_models(batch_sizes, args.iterations, args.warmup))
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "inference_backend": INFERENCE_BACKEND if with_models else None,
+            "models_error": models_error,
+            "engines": engines,
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+    _print_table(results, sys.stderr)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline, args.metric, args.threshold, args.min_delta_ms)
+        for entry in report["comparison"]["regressions"]:
+            print(
+                f"REGRESI {entry['scenario']}: {args.metric} {entry['baseline']:.3f} -> {entry['current']:.3f} ms "
+                f"({entry['change'] * 100:+.1f}%)",
+                file=sys.stderr,
+            )
+        if report["comparison"]["regressions"]:
+            exit_code = 1
+        else:
+            print(f"Tidak ada regresi di atas {args.threshold * 100:.0f}% ({args.metric}).", file=sys.stderr)
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# benchmarks/preprocess.py
+"""
+Membandingkan engine preprocessing "legacy" (decode penuh lalu resize) dengan "fast"
+(decode JPEG skala kecil lewat draft) dari sisi waktu, ukuran buffer decode, selisih piksel,
+dan (opsional) kecocokan hasil klasifikasi.
+
+Pemakaian (dari folder backend):
+    python -m benchmarks.preprocess                                  # gambar sintetis 12MP
+    python -m benchmarks.preprocess --samples uploads --limit 100
+    python -m benchmarks.preprocess --samples uploads --compare      # + kecocokan label CNN+SVM
+
+Dengan --compare, exit code 1 jika kecocokan label di bawah --min-agreement.
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.machine_learning import predictor
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+def _synthetic_jpegs(count: int, size=(4000, 3000)):
+    """Foto sintetis berukuran kamera ponsel (gradien + noise agar tidak terlalu mudah dikompresi)."""
+    rng = np.random.default_rng(0)
+    width, height = size
+    images = []
+    for _ in range(count):
+        x = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None, None]
+        base = (x * rng.uniform(0.2, 1.0, 3) + y * rng.uniform(0.2, 1.0, 3)) / 2
+        noise = rng.normal(0, 12, (height // 8, width // 8, 3)).repeat(8, 0).repeat(8, 1)
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def _load_samples(samples_dir: str, limit: int):
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(samples_dir, "**", pattern), recursive=True))
+    contents = []
+    for path in sorted(paths)[:limit]:
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    return contents
+
+
+def _decoded_bytes(content: bytes, engine: str) -> int:
+    """Ukuran buffer piksel yang benar-benar didecode (alokasi terbesar saat preprocessing)."""
+    img = Image.open(io.BytesIO(content))
+    if engine == "fast":
+        img.draft("RGB", (128, 128))
+    width, height = img.size
+    return width * height * len(img.getbands())
+
+
+def _run_engine(contents, engine: str, iterations: int):
+    out = np.empty((len(contents), 128, 128, 3), dtype=np.uint8)
+    durations = []
+    for _ in range(iterations):
+        for i, content in enumerate(contents):
+            start = time.perf_counter()
+            predictor.preprocess_image(content, engine=engine, out=out[i])
+            durations.append(time.perf_counter() - start)
+    return out, np.asarray(durations) * 1000.0
+
+
+def _classify(batch: np.ndarray):
+    labels = []
+    for start in range(0, len(batch), 16):
+        predictions, _ = predictor.run_models(batch[start:start + 16])
+        labels.extend(predictions.tolist())
+    return np.asarray(labels)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark engine preprocessing legacy vs fast.")
+    parser.add_argument("--samples", default=None, help="Folder gambar; default gambar JPEG sintetis 4000x3000.")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--synthetic", type=int, default=8, help="Jumlah gambar sintetis jika --samples tidak diisi.")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--compare", action="store_true", help="Muat model dan bandingkan label kedua engine.")
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    args = parser.parse_args(argv)
+
+    contents = _load_samples(args.samples, args.limit) if args.samples else _synthetic_jpegs(args.synthetic)
+    if not contents:
+        print(f"Tidak ada gambar di: {args.samples}")
+        return 1
+    print(f"{len(contents)} gambar, rata-rata {np.mean([len(c) for c in contents]) / 1024:.0f} KB\n")
+
+    outputs = {}
+    for engine in ("legacy", "fast"):
+        outputs[engine], durations_ms = _run_engine(contents, engine, args.iterations)
+        decoded_mb = np.mean([_decoded_bytes(c, engine) for c in contents]) / (1024 * 1024)
+        print(
+            f"{engine:<8} mean {durations_ms.mean():8.2f} ms | p50 {np.percentile(durations_ms, 50):8.2f} ms | "
+            f"p95 {np.percentile(durations_ms, 95):8.2f} ms | buffer decode {decoded_mb:7.2f} MB"
+        )
+
+    diff = np.abs(outputs["fast"].astype(np.int16) - outputs["legacy"].astype(np.int16))
+    print(f"\nselisih piksel fast vs legacy: mean {diff.mean():.2f} | max {diff.max()}")
+
+    if not args.compare:
+        return 0
+
+    from app.machine_learning import model_loader
+    model_loader.load_models()
+    legacy_labels = _classify(outputs["legacy"])
+    fast_labels = _classify(outputs["fast"])
+    agreement = float(np.mean(legacy_labels == fast_labels))
+    print(f"kecocokan label fast vs legacy: {agreement * 100:.2f}% ({len(contents)} gambar)")
+    if agreement < args.min_agreement:
+        print(f"GAGAL: kecocokan di bawah {args.min_agreement * 100:.2f}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# benchmarks/serialization.py
+"""
+Membandingkan biaya per baris endpoint daftar diagnosa:
+- jalur lama: query objek ORM -> DiagnosaResponse per baris -> validasi response_model
+  -> jsonable dict -> json.dumps (seperti FastAPI + JSONResponse)
+- jalur cepat: select kolom -> dict -> orjson (schemas.diagnosa.dump_diagnosa_rows)
+
+Data dibuat di SQLite in-memory, jadi angka mencakup fetch + serialisasi tanpa latensi jaringan.
+Hasil kedua jalur dicek identik (setelah di-parse) sebelum waktu dilaporkan.
+
+Pemakaian (dari folder backend):
+    python -m benchmarks.serialization --rows 1000 --iterations 50
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+from typing import List
+
+import numpy as np
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.models.diagnosa import Diagnosa, KondisiDaun
+from app.models.users import Users
+from app.repository.diagnosa import DIAGNOSA_COLUMNS
+from app.schemas import diagnosa as diagnosa_schema
+from app.storage.derivatives import derivative_urls
+from config import Base
+
+IMAGE_BASE_URL = "http://localhost:8000/uploads"
+
+
+def _seed(engine, rows: int):
+    Base.metadata.create_all(engine)
+    start = datetime.datetime(2026, 1, 1)
+    with Session(engine) as db:
+        db.add(Users(id_user=1, nama="bench", email="bench@example.com", password="x"))
+        db.add_all([
+            Diagnosa(
+                id_user=1,
+                tanggal=(start + datetime.timedelta(days=i % 365)).date(),
+                jenis_penyakit="Keriting Daun",
+                image=f"{i % 256:02x}/ab/{i:064x}.jpg",
+                rekomendasi="Pangkas daun yang terinfeksi dan semprot insektisida nabati. " * 3,
+                kategori=KondisiDaun.KERITING if i % 2 else KondisiDaun.SEHAT,
+                akurasi=87.5 + (i % 10),
+                create_date=start + datetime.timedelta(seconds=i, microseconds=i % 1000),
+                update_date=None if i % 3 else start,
+            )
+            for i in range(rows)
+        ])
+        db.commit()
+
+
+def _legacy(engine) -> bytes:
+    adapter = TypeAdapter(List[diagnosa_schema.DiagnosaResponse])
+    with Session(engine) as db:
+        objects = db.execute(select(Diagnosa).order_by(Diagnosa.id_diagnosa)).scalars().all()
+        responses = [
+            diagnosa_schema.DiagnosaResponse(
+                id_diagnosa=obj.id_diagnosa,
+                id_user=obj.id_user,
+                tanggal=obj.tanggal,
+                jenis_penyakit=obj.jenis_penyakit,
+                image=f"{IMAGE_BASE_URL}/{obj.image}",
+                rekomendasi=obj.rekomendasi,
+                kategori=obj.kategori.value,
+                akurasi=obj.akurasi,
+                create_date=obj.create_date,
+                update_date=obj.update_date,
+                **derivative_urls(IMAGE_BASE_URL, obj.image)
+            )
+            for obj in objects
+        ]
+        # FastAPI: validasi terhadap response_model, dump mode json, lalu JSONResponse.render
+        validated = adapter.validate_python(responses, from_attributes=True)
+        content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fast(engine) -> bytes:
+    with engine.connect() as conn:
+        rows = conn.execute(select(*DIAGNOSA_COLUMNS).order_by(Diagnosa.id_diagnosa)).all()
+    return diagnosa_schema.dump_diagnosa_rows(rows, IMAGE_BASE_URL)
+
+
+def _time(fn, engine, iterations: int) -> np.ndarray:
+    durations = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(engine)
+        durations[i] = time.perf_counter() - start
+    return durations * 1000.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark serialisasi endpoint daftar diagnosa.")
+    parser.add_argument("--rows", type=int, default=1000, help="Jumlah baris per halaman.")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://")
+    _seed(engine, args.rows)
+
+    legacy_body, fast_body = _legacy(engine), _fast(engine)
+    if json.loads(legacy_body) != json.loads(fast_body):
+        print("GAGAL: keluaran jalur cepat berbeda dengan jalur lama")
+        return 1
+    print(f"{args.rows} baris, {len(fast_body) / 1024:.0f} KB per respons (keluaran identik)\n")
+
+    results = {}
+    for label, fn in (("legacy (ORM + pydantic)", _legacy), ("fast (kolom + orjson)", _fast)):
+        durations_ms = _time(fn, engine, args.iterations)
+        results[label] = durations_ms
+        per_row_us = durations_ms.mean() * 1000.0 / args.rows
+        print(
+            f"{label:<24} mean {durations_ms.mean():8.2f} ms | p50 {np.percentile(durations_ms, 50):8.2f} ms | "
+            f"p95 {np.percentile(durations_ms, 95):8.2f} ms | per baris {per_row_us:6.2f} us"
+        )
+
+    legacy_ms, fast_ms = (d.mean() for d in results.values())
+    print(f"\npercepatan: {legacy_ms / fast_ms:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
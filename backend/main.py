@@ -1,7 +1,9 @@
 # main.py
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from config import engine
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.engine import make_url
+from config import async_engine, DATABASE_URL, DB_INIT_MAX_BACKOFF, METRICS_ENABLED, SQL_INSTRUMENTATION, USER_CACHE_NOTIFY_CHANNEL
+import asyncio
 import logging
 import os
 
@@ -12,21 +14,23 @@ import app.models.diagnosa as diagnosa_table
 # Import routers
 import app.routers.authentication as user_routers
 import app.routers.diagnosa as diagnosa_routers
+import app.routers.monitoring as monitoring_routers
+from app.machine_learning import predictor, worker_pool, model_loader
+from app.db_metrics import SQLInstrumentationMiddleware, sql_metrics
+from app import metrics
+from app.repository.user_cache import UserCacheInvalidationListener, user_cache
+from app.executors import shutdown_executors
+from app.logging_setup import configure_logging, shutdown_logging
+from app.storage.derivatives import derivative_queue
+from app.storage.static import UploadStaticFiles
 
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Setup logging: antrian + thread penulis (lihat app/logging_setup.py)
+configure_logging()
 # Gunakan logger dari logging, bukan dari venv
 logger = logging.getLogger(__name__)
 
 
-# Create tables
-user_table.Base.metadata.create_all(bind=engine)
-diagnosa_table.Base.metadata.create_all(bind=engine)
-
 # Create FastAPI app
 app = FastAPI(
     title="Plant Disease Detection API",
@@ -34,20 +38,88 @@ app = FastAPI(
     version="1.0.0"
 )
 
+if SQL_INSTRUMENTATION:
+    # Jumlah query, waktu DB dan statement berulang per route: GET /api/v1/monitoring/sql
+    sql_metrics.install(async_engine)
+    app.add_middleware(SQLInstrumentationMiddleware, metrics=sql_metrics)
+
+if METRICS_ENABLED:
+    # Dipasang setelah middleware lain supaya menjadi lapisan terluar (mencakup seluruh request)
+    app.add_middleware(metrics.HTTPMetricsMiddleware)
+
+# Invalidasi cache user antar-worker (opsional, hanya PostgreSQL)
+user_cache_listener = None
+if USER_CACHE_NOTIFY_CHANNEL and DATABASE_URL.startswith("postgresql"):
+    # asyncpg menerima DSN libpq biasa (tanpa nama driver SQLAlchemy)
+    listen_dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    user_cache_listener = UserCacheInvalidationListener(user_cache, listen_dsn, USER_CACHE_NOTIFY_CHANNEL)
+
+# Status inisialisasi database untuk endpoint readiness
+database_state = {"ready": False, "attempts": 0, "last_error": None}
+
+async def init_database():
+    """
+    Membuat tabel (jika belum ada) tanpa menahan startup aplikasi.
+    Diulang dengan backoff eksponensial (maksimal DB_INIT_MAX_BACKOFF detik) sampai berhasil,
+    sehingga pod yang start sebelum database bisa dijangkau tetap menjadi ready.
+    """
+    backoff = 1.0
+    while True:
+        database_state["attempts"] += 1
+        try:
+            # users dan diagnosa memakai Base yang sama dari config
+            async with async_engine.begin() as conn:
+                await conn.run_sync(user_table.Base.metadata.create_all)
+        except Exception as e:
+            database_state["last_error"] = f"{type(e).__name__}: {e}"
+            logger.error(
+                f"Gagal menyiapkan tabel database (percobaan {database_state['attempts']}): {str(e)}; "
+                f"dicoba lagi dalam {backoff:.0f} detik.",
+                exc_info=database_state["attempts"] == 1,  # traceback cukup sekali
+            )
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, DB_INIT_MAX_BACKOFF)
+            continue
+        database_state.update(ready=True, last_error=None)
+        logger.info("Tabel database siap.")
+        return
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Memulai aplikasi...")
-    await diagnosa_routers.load_models_on_startup() # Memuat model ML di startup
+    # Database dan model ML disiapkan di background; endpoint auth dan health langsung aktif
+    app.state.init_database_task = asyncio.create_task(init_database())
+    if user_cache_listener is not None:
+        user_cache_listener.start()
+    diagnosa_routers.start_model_loading()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Menghentikan aplikasi...")
+    app.state.init_database_task.cancel()
+    try:
+        await app.state.init_database_task
+    except asyncio.CancelledError:
+        pass
+    await predictor.inference_scheduler.stop()
+    await derivative_queue.stop()
+    if user_cache_listener is not None:
+        await user_cache_listener.stop()
+    worker_pool.stop_pool()
+    shutdown_executors()
+    await async_engine.dispose()
+    shutdown_logging()
 
 # Create uploads directory
 os.makedirs("uploads", exist_ok=True)
 
 # Mount static files untuk serve uploaded images
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadStaticFiles(directory="uploads"), name="uploads")
 
 # Include routers
 app.include_router(user_routers.router, prefix="/api/v1", tags=["Users"])
 app.include_router(diagnosa_routers.router, prefix="/api/v1", tags=["Diagnosa"])
+app.include_router(monitoring_routers.router, prefix="/api/v1", tags=["Monitoring"])
 
 @app.get("/")
 async def root():
@@ -55,4 +127,29 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        """Metrik format Prometheus untuk proses ini (scrape per worker)."""
+        return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: proses hidup dan event loop merespons."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: hijau hanya setelah database siap dan model selesai warm-up."""
+    ready = database_state["ready"] and model_loader.is_ready()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "database": database_state["ready"],
+            "database_init": dict(database_state),
+            "model": dict(model_loader.load_state),
+        },
+    )
\ No newline at end of file